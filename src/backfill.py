@@ -0,0 +1,141 @@
+import datetime
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.fronmod.fronmod_config import FronmodDelivery
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.mobu_capture import MobuCaptureReader
+from src.replay import Replay, ReplayState
+from src.runner import Runner
+from src.runner_config import RunnerConfKey
+
+_logger = logging.getLogger(__name__)
+
+
+BackfillTask = namedtuple('BackfillTask', ['path', 'state', 'runner_config', 'fronmod_config', 'tick_gap'])
+"""Replay of a single capture file; `state`: end state of the preceding files (handover)"""
+
+BackfillResult = namedtuple('BackfillResult', ['path', 'ticks', 'rows'])
+"""`rows`: published values by delivery name"""
+
+
+def scan_backfill_file(path: str, tick_gap: float) -> ReplayState:
+    """Worker process: end state of a single capture file."""
+    return Replay([path], tick_gap=tick_gap).get_end_state()
+
+
+def run_backfill_task(task: BackfillTask) -> BackfillResult:
+    """Worker process: replays one capture file (as fast as possible)."""
+    rows = {delivery.value: [] for delivery in FronmodDelivery}
+
+    def add_row(delivery_name, values):
+        rows[delivery_name].append(values)
+
+    runner_config = dict(task.runner_config or {})
+    runner_config.update({
+        RunnerConfKey.TOPIC_QUICK: FronmodDelivery.QUICK.value,
+        RunnerConfKey.TOPIC_MEDIUM: FronmodDelivery.MEDIUM.value,
+        RunnerConfKey.TOPIC_SLOW: FronmodDelivery.SLOW.value,
+        RunnerConfKey.CHANGES_ONLY: False,  # rows of all values
+        RunnerConfKey.DELTA_QUICK: False,
+    })
+    replay = Replay(
+        [task.path], runner_config, task.fronmod_config, output=add_row, tick_gap=task.tick_gap,
+        state=task.state, flush=True, serialize=False,
+    )
+    stats = replay.run()
+    return BackfillResult(task.path, stats.ticks, rows)
+
+
+class Backfill:
+    """
+    Re-derives the published values of many capture files, one file per worker process. The files get ordered by
+    their start time.
+
+    Two parallel passes: first the end state of each file gets scanned (last captured registers and cycle), which
+    get accumulated to the start state of each file (e.g. static scale factors are captured once after the start of
+    the service). Then each worker replays its file, warmed up with the start state (register image, eflow state), so
+    the energy flows stay continuous over file boundaries. The final values of each file get flushed, so no energy
+    is lost.
+
+    The results get written as columns to a numpy `.npz` file: `<delivery>.<item>` (e.g. "medium.eflowInvAcOut"),
+    numbers as float (NaN: no value), texts as strings, plus "<delivery>.time" (epoch seconds).
+    """
+
+    def __init__(self, paths: List[str], runner_config: Optional[dict] = None, fronmod_config: Optional[dict] = None,
+                 workers: Optional[int] = None, tick_gap: float = Replay.DEFAULT_TICK_GAP):
+        self._paths = self.sort_paths(paths)
+        self._runner_config = runner_config or {}
+        self._fronmod_config = fronmod_config
+        self._workers = workers or os.cpu_count() or 1
+        self._tick_gap = tick_gap
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self._paths)
+
+    @classmethod
+    def sort_paths(cls, paths: List[str]) -> List[str]:
+        """:return: capture files by start time; other files are skipped"""
+        starts = {}
+        for path in paths:
+            try:
+                starts[path] = MobuCaptureReader(path).read_header()
+            except (FronmodException, OSError) as ex:
+                _logger.warning("skipped %s (%s)", path, ex)
+        return sorted(starts, key=lambda path: (starts[path], path))
+
+    @classmethod
+    def find_paths(cls, directory: str) -> List[str]:
+        return [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if os.path.isfile(os.path.join(directory, name))
+        ]
+
+    def run(self) -> Dict[str, np.ndarray]:
+        """:return: columns (see `save`)"""
+        rows = {delivery.value: [] for delivery in FronmodDelivery}
+        with ProcessPoolExecutor(max_workers=min(self._workers, max(len(self._paths), 1))) as executor:
+            end_states = list(executor.map(scan_backfill_file, self._paths, [self._tick_gap] * len(self._paths)))
+
+            tasks = []
+            state = None
+            for path, end_state in zip(self._paths, end_states):
+                tasks.append(BackfillTask(path, state, self._runner_config, self._fronmod_config, self._tick_gap))
+                state = Replay.merge_end_states(state, end_state)
+
+            for result in executor.map(run_backfill_task, tasks):  # in file order
+                _logger.info("backfilled %s (%d ticks)", result.path, result.ticks)
+                for delivery_name, delivery_rows in result.rows.items():
+                    rows[delivery_name].extend(delivery_rows)
+
+        columns = {}
+        for delivery_name, delivery_rows in rows.items():
+            columns.update(self.get_columns(delivery_name, delivery_rows))
+        return columns
+
+    @classmethod
+    def get_columns(cls, delivery_name: str, rows: List[dict]) -> Dict[str, np.ndarray]:
+        names = sorted(set(name for row in rows for name in row))
+        columns = {
+            f"{delivery_name}.time": np.array(
+                [datetime.datetime.fromisoformat(row[Runner.JSON_TIMESTAMP]).timestamp() for row in rows], dtype=np.float64
+            )
+        }
+        for name in names:
+            values = [row.get(name) for row in rows]
+            if all(value is None or isinstance(value, (int, float)) for value in values):
+                column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                column = np.array(["" if value is None else str(value) for value in values], dtype=np.str_)
+            columns[f"{delivery_name}.{name}"] = column
+        return columns
+
+    @classmethod
+    def save(cls, columns: Dict[str, np.ndarray], output_path: str):
+        np.savez_compressed(output_path, **columns)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import logging
+import os
+import sys
+
+import click
+
+from src.app_config import AppConfig
+from src.app_logging import AppLogging, LOGGING_CHOICES
+from src.backfill import Backfill
+from src.replay import Replay
+
+
+_logger = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument("captures", nargs=-1, required=True)
+@click.option(
+    "--output",
+    required=True,
+    help="Output file (numpy .npz, columns '<delivery>.<item>')",
+)
+@click.option(
+    "--config-file",
+    help="Config file (runner and modbus settings); default: defaults",
+)
+@click.option(
+    "--workers",
+    type=int,
+    help="Worker processes; default: CPU count",
+)
+@click.option(
+    "--tick-gap",
+    type=float,
+    default=Replay.DEFAULT_TICK_GAP,
+    help="Pause (seconds) between the captured reads, which starts a new cycle",
+    show_default=True,
+)
+@click.option(
+    "--log-level",
+    help="Log level",
+    type=click.Choice(LOGGING_CHOICES, case_sensitive=False),
+)
+def _main(captures, output, config_file, workers, tick_gap, log_level):
+    """
+    Re-derives the published values of capture files or directories (one file per worker process).
+    """
+    try:
+        AppLogging.configure({}, None, log_level, True, False)
+
+        runner_config, fronmod_config = {}, None
+        if config_file:
+            app_config = AppConfig(config_file)
+            runner_config, fronmod_config = app_config.get_runner_config(), app_config.get_fronmod_config()
+
+        paths = []
+        for capture in captures:
+            paths.extend(Backfill.find_paths(capture) if os.path.isdir(capture) else [capture])
+
+        backfill = Backfill(paths, runner_config, fronmod_config, workers=workers, tick_gap=tick_gap)
+        if not backfill.paths:
+            raise FileNotFoundError(f"no capture files ({', '.join(captures)})!")
+
+        Backfill.save(backfill.run(), output)
+
+    except KeyboardInterrupt:
+        pass
+
+    except Exception as ex:
+        _logger.exception(ex)
+        sys.exit(1)  # a simple return is not understood by click
+
+
+if __name__ == '__main__':
+    _main()  # exit codes must be handled by click!
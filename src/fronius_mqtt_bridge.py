@@ -7,10 +7,12 @@ import click
 
 from src.app_config import AppConfig
 from src.app_logging import AppLogging, LOGGING_CHOICES
+from src.fronmod.fronmod_config import FronmodConfKey
 from src.fronmod.fronmod_processor import FronmodProcessor
 from src.fronmod.fronmod_reader import FronmodReader
 from src.mqtt_client import MqttClient
 from src.runner import Runner
+from src.utils.clock import Clock
 
 
 _logger = logging.getLogger(__name__)
@@ -85,11 +87,14 @@ def run_service(config_file, log_file, log_level, print_logs, systemd_mode):
         mqtt_config = app_config.get_mqtt_config()
         fronmod_config = app_config.get_fronmod_config()
 
+        clock = Clock()
         mqtt_client = MqttClient(mqtt_config)
-        fronmod_reader = FronmodReader(fronmod_config)
-        fronmod_processor = FronmodProcessor(fronmod_reader)
+        fronmod_reader = FronmodReader(fronmod_config, clock=clock)
+        fronmod_processor = FronmodProcessor(
+            fronmod_reader, clock=clock, state_texts=fronmod_config.get(FronmodConfKey.STATE_TEXTS)
+        )
 
-        runner = Runner(runner_config, mqtt_client, fronmod_processor)
+        runner = Runner(runner_config, mqtt_client, fronmod_processor, clock=clock)
         runner.run()
 
     finally:
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import logging
+import sys
+
+import click
+
+from src.app_config import AppConfig
+from src.app_logging import AppLogging, LOGGING_CHOICES
+from src.fronmod.mobu_capture import MobuCaptureReader
+from src.replay import Replay
+
+
+_logger = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument("capture_files", nargs=-1, required=True)
+@click.option(
+    "--config-file",
+    help="Config file (runner and modbus settings); default: defaults",
+)
+@click.option(
+    "--speed",
+    type=float,
+    default=0,
+    help="Replay speed: 1 == real time, N == N times faster, 0 == as fast as possible",
+    show_default=True,
+)
+@click.option(
+    "--tick-gap",
+    type=float,
+    default=Replay.DEFAULT_TICK_GAP,
+    help="Pause (seconds) between the captured reads, which starts a new cycle",
+    show_default=True,
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    help="Writes the messages to a file ('-' == stdout): <topic> <payload>",
+)
+@click.option(
+    "--log-level",
+    help="Log level",
+    type=click.Choice(LOGGING_CHOICES, case_sensitive=False),
+)
+def _main(capture_files, config_file, speed, tick_gap, output, log_level):
+    """
+    Replays capture files (including rotated files: <file>.N) through the processing and reports the throughput.
+    """
+    try:
+        AppLogging.configure({}, None, log_level, True, False)
+
+        runner_config, fronmod_config = {}, None
+        if config_file:
+            app_config = AppConfig(config_file)
+            runner_config, fronmod_config = app_config.get_runner_config(), app_config.get_fronmod_config()
+
+        paths = [path for capture_file in capture_files for path in MobuCaptureReader.get_rotated_paths(capture_file)]
+        if not paths:
+            raise FileNotFoundError(f"no capture files ({', '.join(capture_files)})!")
+
+        def write_message(topic, payload):
+            if isinstance(payload, bytes):
+                payload = payload.hex()  # binary payload formats
+            output.write(f"{topic} {payload}\n")
+
+        replay = Replay(
+            paths, runner_config, fronmod_config, speed=speed or None, tick_gap=tick_gap,
+            output=write_message if output else None,
+        )
+        print(replay.run())
+
+    except KeyboardInterrupt:
+        pass
+
+    except Exception as ex:
+        _logger.exception(ex)
+        sys.exit(1)  # a simple return is not understood by click
+
+
+if __name__ == '__main__':
+    _main()  # exit codes must be handled by click!
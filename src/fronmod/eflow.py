@@ -1,10 +1,12 @@
-import copy
-import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from src.utils.clock import Clock
 
 
 class EflowAggregate:
 
+    __slots__ = ('item_name', 'value_agg')
+
     def __init__(self, item_name: str):
         self.item_name = item_name
         self.value_agg = 0
@@ -16,8 +18,12 @@ class EflowAggregate:
 class EflowChannel:
     MIN_NULL = 1e-9
 
-    def __init__(self, source_name: str, agg_plus: Optional[EflowAggregate], agg_minus: Optional[EflowAggregate]):
+    __slots__ = ('source_name', '_clock', 'last_time', 'last_value', 'plus', 'minus')
+
+    def __init__(self, source_name: str, agg_plus: Optional[EflowAggregate], agg_minus: Optional[EflowAggregate],
+                 clock: Optional[Clock] = None):
         self.source_name = source_name
+        self._clock = clock or Clock()
         self.last_time = None
         self.last_value = None
 
@@ -27,9 +33,9 @@ class EflowChannel:
     def __repr__(self) -> str:
         return '{}({},+{},-{})'.format(self.__class__.__name__, self.source_name, self.plus, self.minus)
 
-    def get_current_time(self):
-        # overwrite and mock time calculation
-        return datetime.datetime.now()
+    def get_current_time(self) -> float:
+        """:return: monotonic seconds (overwrite and mock time calculation)"""
+        return self._clock.monotonic()
 
     def push_value(self, value_curr):
         curr_time = self.get_current_time()
@@ -50,7 +56,7 @@ class EflowChannel:
     def calc(self, curr_time, curr_value):
         last_bias = self.get_bias(self.last_value)
         curr_bias = self.get_bias(curr_value)
-        elapsed_time = (curr_time - self.last_time).total_seconds()
+        elapsed_time = curr_time - self.last_time
         factor_full = elapsed_time / 60.0 / 60.0
 
         if factor_full > 0:
@@ -67,19 +73,27 @@ class EflowChannel:
                 value_agg = (self.last_value + curr_value) / 2 * factor_full
                 self._add_value(value_agg)
 
-    def get_aggregates_and_reset(self):
+    def get_aggregates_and_reset(self) -> List[EflowAggregate]:
+        """:return: snapshots of the aggregates (before reset)"""
         aggregates = []
-
-        def add_aggregate(agg: EflowAggregate):
+        for agg in (self.plus, self.minus):
             if agg:
-                aggregates.append(copy.deepcopy(agg))
+                snapshot = EflowAggregate(agg.item_name)
+                snapshot.value_agg = agg.value_agg
+                aggregates.append(snapshot)
                 agg.value_agg = 0
-
-        add_aggregate(self.plus)
-        add_aggregate(self.minus)
-
         return aggregates
 
+    def pop_aggregates(self) -> List[Tuple[str, float]]:
+        """:return: (item name, value) of the aggregates, which are not 0; resets all aggregates"""
+        values = []
+        for agg in (self.plus, self.minus):
+            if agg:
+                if agg.value_agg != 0:
+                    values.append((agg.item_name, agg.value_agg))
+                agg.value_agg = 0
+        return values
+
     @classmethod
     def get_bias(cls, value):
         if abs(value) < cls.MIN_NULL:
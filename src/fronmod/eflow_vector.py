@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.fronmod.eflow import EflowChannel
+
+
+class EflowVector:
+    """
+    Offline (re)computation of energy flows over columnar samples, with the semantics of `EflowChannel`: trapezoids
+    between consecutive samples, split at zero crossings, positive parts to "plus", others to "minus" (Wh for W and
+    seconds).
+
+    A segment is skipped if its duration is not positive or if one of its values is NaN (the channel gets no value).
+    Requires numpy (optional dependency).
+    """
+
+    MIN_NULL = EflowChannel.MIN_NULL
+
+    @classmethod
+    def get_bias(cls, values: np.ndarray) -> np.ndarray:
+        return np.where(np.abs(values) < cls.MIN_NULL, 0, np.where(values >= 0, 1, -1))
+
+    @classmethod
+    def get_segments(cls, times, values) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param times: monotonic seconds (sorted)
+        :param values: power (NaN: no value)
+        :return: plus and minus energy of each segment (between sample i and i + 1)
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if times.shape != values.shape or times.ndim != 1:
+            raise ValueError("times and values must be 1-dimensional arrays of the same length!")
+        if len(times) < 2:
+            return np.zeros(0), np.zeros(0)
+
+        last_values, curr_values = values[:-1], values[1:]
+        factor_full = np.diff(times) / 60.0 / 60.0
+        valid = (factor_full > 0) & np.isfinite(last_values) & np.isfinite(curr_values)
+
+        last_bias = cls.get_bias(last_values)
+        curr_bias = cls.get_bias(curr_values)
+        crossing = valid & (last_bias + curr_bias == 0) & (last_bias != curr_bias)
+
+        # same operations (and order) as `EflowChannel.calc`
+        abs_last_values = np.abs(last_values)
+        ratio = np.divide(np.abs(curr_values), abs_last_values, out=np.zeros_like(values[1:]), where=crossing)
+        factor_last = factor_full * (1.0 / (1 + ratio))
+        factor_curr = factor_full - factor_last
+
+        agg_first = np.where(crossing, last_values * factor_last / 2.0, (last_values + curr_values) / 2 * factor_full)
+        agg_second = np.where(crossing, curr_values * factor_curr / 2.0, 0.0)
+        agg_first = np.where(valid, agg_first, 0.0)
+        agg_second = np.where(valid, agg_second, 0.0)
+
+        plus = np.where(agg_first > 0, agg_first, 0.0) + np.where(agg_second > 0, agg_second, 0.0)
+        minus = np.where(agg_first > 0, 0.0, agg_first) + np.where(agg_second > 0, 0.0, agg_second)
+        return plus, minus
+
+    @classmethod
+    def integrate(cls, times, values, edges: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param edges: window boundaries (sorted); a segment belongs to the window of its end time
+            (`edges[i] < end <= edges[i + 1]`), as aggregates get published after pushing the value of the cycle.
+            Segments outside all windows are dropped. None: one window over all samples.
+        :return: plus and minus energy per window
+        """
+        plus, minus = cls.get_segments(times, values)
+        if edges is None:
+            return np.array([plus.sum()]), np.array([minus.sum()])
+
+        edges = np.asarray(edges, dtype=np.float64)
+        window_count = max(len(edges) - 1, 0)
+        end_times = np.asarray(times, dtype=np.float64)[1:]
+        windows = np.searchsorted(edges, end_times, side="left") - 1
+        inside = (windows >= 0) & (windows < window_count)
+
+        return (
+            np.bincount(windows[inside], weights=plus[inside], minlength=window_count),
+            np.bincount(windows[inside], weights=minus[inside], minlength=window_count),
+        )
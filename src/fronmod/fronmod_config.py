@@ -1,7 +1,9 @@
+import sys
 from enum import Enum
-from typing import List, Set
+from typing import Dict, List, Optional, Set
 
-from .mobu import MobuBatch, MobuFlag, MobuItem
+from .mobu import MobuBatch, MobuCache, MobuFlag, MobuItem
+from .mobu_program import MobuFormula
 from pymodbus.constants import Endian
 
 
@@ -9,18 +11,100 @@ class FronmodConfKey:
     HOST = "host"
     PORT = "port"
 
+    CLIENT = "client"
+    COALESCE_GAP = "coalesce_gap"
+    PIPELINE_DEPTH = "pipeline_depth"
+    SPARSE_READS = "sparse_reads"
+    READ_COST_AUTO = "read_cost_auto"
+    READ_COST_REGISTER = "read_cost_register"
+    READ_COST_REQUEST = "read_cost_request"
+
+    CAPTURE_FILE = "capture_file"
+    CAPTURE_MAX_BYTES = "capture_max_bytes"
+    CAPTURE_BACKUPS = "capture_backups"
+
+    STATE_TEXTS = "state_texts"
+
 
 FRONMOD_JSONSCHEMA = {
     "type": "object",
     "properties": {
         FronmodConfKey.HOST: {"type": "string", "minLength": 1},
         FronmodConfKey.PORT: {"type": "integer"},
+        FronmodConfKey.CLIENT: {
+            "type": "string",
+            "enum": ["pymodbus", "asyncio"],
+            "description": "Modbus TCP client: 'pymodbus' (sync, worker thread) or built-in 'asyncio' (reads only). "
+                           "Default: pymodbus"
+        },
+        FronmodConfKey.COALESCE_GAP: {
+            "type": "integer",
+            "minimum": 0,
+            "description": "Max. unused registers between batches of a unit, which are still read by one request."
+        },
+        FronmodConfKey.PIPELINE_DEPTH: {
+            "type": "integer",
+            "minimum": 1,
+            "description": "Max. read requests in flight (pipelined across unit ids). Default: 1 (no pipelining)"
+        },
+        FronmodConfKey.SPARSE_READS: {
+            "type": "boolean",
+            "description": "Read only registers used by items; split into sub-ranges, if cheaper by cost model. Default: False"
+        },
+        FronmodConfKey.READ_COST_AUTO: {
+            "type": "boolean",
+            "description": "Learn the cost model from measured read latencies (per unit); "
+                           "used for coalescing and sparse reads. Default: False"
+        },
+        FronmodConfKey.READ_COST_REQUEST: {
+            "type": "number",
+            "minimum": 0,
+            "description": "Cost model: estimated time (ms) per request (initial value, if learned)."
+        },
+        FronmodConfKey.READ_COST_REGISTER: {
+            "type": "number",
+            "minimum": 0,
+            "description": "Cost model: estimated time (ms) per register (initial value, if learned)."
+        },
+        FronmodConfKey.CAPTURE_FILE: {
+            "type": "string",
+            "minLength": 1,
+            "description": "Binary capture file, which records all raw register responses. Default: no capture"
+        },
+        FronmodConfKey.CAPTURE_MAX_BYTES: {
+            "type": "integer",
+            "minimum": 1024,
+            "description": "Capture file size, which triggers a rotation. Default: 10 MiB"
+        },
+        FronmodConfKey.CAPTURE_BACKUPS: {
+            "type": "integer",
+            "minimum": 0,
+            "description": "Number of rotated capture files to keep. Default: 3"
+        },
+        FronmodConfKey.STATE_TEXTS: {
+            "type": "object",
+            "properties": {
+                table: {
+                    "type": "object",
+                    "patternProperties": {"^-?[0-9]+$": {"type": "string"}},
+                    "additionalProperties": False,
+                } for table in ["inverter_sunspec", "inverter_fronius", "battery", "mppt"]
+            },
+            "additionalProperties": False,
+            "description": "State texts (e.g. localized) by table and code, replacing the defaults: "
+                           "'(<code>) <text>'"
+        },
     },
     "additionalProperties": False,
     "required": [FronmodConfKey.HOST, FronmodConfKey.PORT],
 }
 
 
+class FronmodClient:
+    PYMODBUS = "pymodbus"
+    ASYNCIO = "asyncio"
+
+
 class FronmodDelivery(Enum):
     QUICK = "quick"
     MEDIUM = "medium"
@@ -99,10 +183,99 @@ class FronmodItem:
         return items
 
 
+class FronmodStateTable:
+    """State texts of a model: code => "(<code>) <label>", precomputed (interned) for the lookup per tick."""
+
+    UNKNOWN = "?"
+
+    def __init__(self, labels: Dict[int, str]):
+        self.labels = dict(labels)
+        self._texts = {code: sys.intern(f"({code}) {label}") for code, label in self.labels.items()}
+
+    def format(self, code: Optional[int]) -> Optional[str]:
+        if code is None:
+            return None
+
+        text = self._texts.get(code)
+        if text is None:
+            text = sys.intern(f"({code}) {self.UNKNOWN}")
+            self._texts[code] = text  # register codes are 16 bit
+        return text
+
+    def override(self, labels: Optional[Dict]) -> "FronmodStateTable":
+        """:param labels: code (int or string, as in JSON) => label; replaces or adds to the labels"""
+        if not labels:
+            return self
+        return FronmodStateTable({**self.labels, **{int(code): label for code, label in labels.items()}})
+
+
+class FronmodStateTexts:
+    """State text tables of all models, optionally overridden by config (`FronmodConfKey.STATE_TEXTS`)."""
+
+    INVERTER_SUNSPEC = "inverter_sunspec"
+    INVERTER_FRONIUS = "inverter_fronius"
+    BATTERY = "battery"
+    MPPT = "mppt"
+
+    # former: pv_state_inv_sunspec.map
+    INVERTER_SUNSPEC_LABELS = {
+        1: "OFF",
+        2: "AUTO-SHUTDOWN",
+        3: "RUN-UP",
+        4: "NORMAL",
+        5: "POWER REDUCTION",
+        6: "SWITCH-OFF",
+        7: "ERROR",
+        8: "STANDBY",
+    }
+
+    # former: pv_state_inv_fronius.map
+    INVERTER_FRONIUS_LABELS = {
+        **INVERTER_SUNSPEC_LABELS,
+        9: "NO SOLARNET COMMUNICATION",
+        10: "NO COMMUNICATION",
+        11: "OVER-CURRENT SOLARNET SOCKET",
+        12: "UPDATE",
+        13: "AFCI EVENT (ARC)",
+    }
+
+    # former: pv_state_batt.map
+    BATTERY_LABELS = {
+        1: "OFF",
+        2: "EMPTY",
+        3: "DISCHARGE",
+        4: "CHARGING",
+        5: "FULL",
+        6: "HOLDING",
+        7: "TESTING",
+    }
+
+    # former: pv_state_mppt.map
+    MPPT_LABELS = {
+        1: "OFF",
+        2: "IN OPERATION (NO FEED-IN)",
+        3: "RUN-UP",
+        4: "NORMAL",
+        5: "POWER REDUCTION",
+        6: "SWITCH-OFF",
+        7: "ERROR",
+        8: "STANDBY",
+        65535: "(0xFFFF) ?",
+    }
+
+    def __init__(self, overrides: Optional[Dict[str, Dict]] = None):
+        """:param overrides: table name => code => label"""
+        overrides = overrides or {}
+        self.inverter_sunspec = FronmodStateTable(self.INVERTER_SUNSPEC_LABELS).override(overrides.get(self.INVERTER_SUNSPEC))
+        self.inverter_fronius = FronmodStateTable(self.INVERTER_FRONIUS_LABELS).override(overrides.get(self.INVERTER_FRONIUS))
+        self.battery = FronmodStateTable(self.BATTERY_LABELS).override(overrides.get(self.BATTERY))
+        self.mppt = FronmodStateTable(self.MPPT_LABELS).override(overrides.get(self.MPPT))
+
+
 class FronmodConfig:
     BYTEORDER = Endian.Big
 
-    TICK_COUNTER = 4
+    STATE_TEXTS = FronmodStateTexts()  # defaults
 
     # Common & Inverter Model (ab Seite 29)
     INVERTER_START = 40070  # start pos
@@ -133,7 +306,7 @@ class FronmodConfig:
         # fronius: 9 9 1 R 0x03 ChaState uint16 % AhrRtg ChaState_SF
         MobuItem(9, MobuFlag.UINT16, FronmodItem.RAW_BAT_FILL_LEVEL),
         # fronius: 23 23 1 R 0x03 0x06 0x10 ChaState_SF sunssf Scale factor for available energy percent.
-        MobuItem(23, MobuFlag.INT16, FronmodItem.RAW_BAT_FILL_LEVEL_SF),
+        MobuItem(23, MobuFlag.INT16, FronmodItem.RAW_BAT_FILL_LEVEL_SF, cache=MobuCache.STATIC),
         # openhab: Number valPvBatFillState "Batterie-Ladung [%.0f %%]" <battery> (gRawPvMod, gPers5Minutes)
         MobuItem(None, MobuFlag.Q_SLOW, FronmodItem.BAT_FILL_LEVEL),
         # Number valPvBatState "Batterie-Status [MAP(pv_state_batt.map):%s]"
@@ -148,10 +321,10 @@ class FronmodConfig:
     MPPT_BATCH = MobuBatch(1, "mppt", MPPT_START, 48, [
         # fronius: 4 4 1 R 0x03 DCV_SF sunssf Voltage Scale Factor
         # openhab: Number rawPvMpptVoltageSfBase   "rawPvMpptVoltageSfBase [%d]" {modbus="<[mppt:3:valueType=int16]"}
-        MobuItem(4, MobuFlag.INT16, FronmodItem.RAW_MPPT_VOLTAGE_SF),
+        MobuItem(4, MobuFlag.INT16, FronmodItem.RAW_MPPT_VOLTAGE_SF, cache=MobuCache.STATIC),
         # fronius: 5 5 1 R 0x03 DCW_SF sunssf Power Scale Factor
         # openhab: Number rawPvMpptPowerSfBase     "rawPvMpptPowerSfBase [%d]" {modbus="<[mppt:4:valueType=int16]"}
-        MobuItem(5, MobuFlag.INT16, FronmodItem.RAW_MPPT_POWER_SF),
+        MobuItem(5, MobuFlag.INT16, FronmodItem.RAW_MPPT_POWER_SF, cache=MobuCache.STATIC),
         # fronius: 21 21 1 R 0x03 1_DCV uint16 V DCV_SF DC Voltage
         # Number rawPvMpptModVoltage "rawPvMpptModVoltage [%d]"   {modbus="<[mppt:20:valueType=uint16]"}
         MobuItem(21, MobuFlag.UINT16, FronmodItem.RAW_MPPT_MOD_VOLTAGE),
@@ -195,6 +368,96 @@ class FronmodConfig:
         MobuItem(None, MobuFlag.Q_QUICK, FronmodItem.SELF_CONSUMPTION),
     ])
 
+    # item => value, which triggers a log of the last read registers
+    REGISTER_LOG_LIMITS = {
+        FronmodItem.MPPT_MOD_POWER: 5500,
+        FronmodItem.MPPT_BAT_POWER: 3300,
+    }
+
+    @classmethod
+    def get_batches(cls) -> List[MobuBatch]:
+        return [cls.INVERTER_BATCH, cls.MPPT_BATCH, cls.STORAGE_BATCH, cls.METER_BATCH]
+
+    @classmethod
+    def get_formulas(cls, state_texts: Optional[FronmodStateTexts] = None) -> Dict[str, List[MobuFormula]]:
+        """:return: derived items by batch name, evaluated in list order (see `MobuProgram`)"""
+        state_texts = state_texts or cls.STATE_TEXTS
+        return {
+            cls.INVERTER_BATCH.name: [
+                MobuFormula(FronmodItem.INV_STATE_TEXT, state_texts.inverter_sunspec.format, [FronmodItem.INV_STATE_CODE]),
+                MobuFormula(FronmodItem.SELF_CONSUMPTION, cls.calc_self_consumption,
+                            [FronmodItem.INV_AC_POWER, FronmodItem.MET_AC_POWER]),
+                MobuFormula(FronmodItem.INV_EFFICIENCY, cls.calc_inv_efficiency,
+                            [FronmodItem.INV_AC_POWER, FronmodItem.INV_DC_POWER]),
+            ],
+            cls.STORAGE_BATCH.name: [
+                MobuFormula(FronmodItem.BAT_FILL_LEVEL, cls.scale,
+                            [FronmodItem.RAW_BAT_FILL_LEVEL, FronmodItem.RAW_BAT_FILL_LEVEL_SF]),
+                MobuFormula(FronmodItem.BAT_STATE_TEXT, state_texts.battery.format, [FronmodItem.BAT_STATE_CODE]),
+            ],
+            cls.MPPT_BATCH.name: [
+                MobuFormula(FronmodItem.MPPT_MOD_VOLTAGE, cls.scale,
+                            [FronmodItem.RAW_MPPT_MOD_VOLTAGE, FronmodItem.RAW_MPPT_VOLTAGE_SF]),
+                MobuFormula(FronmodItem.MPPT_MOD_POWER, cls.scale,
+                            [FronmodItem.RAW_MPPT_MOD_POWER, FronmodItem.RAW_MPPT_POWER_SF]),
+                MobuFormula(FronmodItem.RAW2_MPPT_BAT_POWER, cls.scale,
+                            [FronmodItem.RAW_MPPT_BAT_POWER, FronmodItem.RAW_MPPT_POWER_SF]),
+                MobuFormula(FronmodItem.MPPT_BAT_STATE_TEXT, state_texts.mppt.format, [FronmodItem.MPPT_BAT_STATE_CODE]),
+                MobuFormula(FronmodItem.MPPT_MOD_STATE_TEXT, state_texts.mppt.format, [FronmodItem.MPPT_MOD_STATE_CODE]),
+                MobuFormula(FronmodItem.MPPT_BAT_POWER, cls.calc_bat_power,
+                            [FronmodItem.RAW2_MPPT_BAT_POWER, FronmodItem.MPPT_MOD_POWER, FronmodItem.INV_DC_POWER]),
+            ],
+            cls.METER_BATCH.name: [
+                MobuFormula(FronmodItem.SELF_CONSUMPTION, cls.calc_self_consumption,
+                            [FronmodItem.INV_AC_POWER, FronmodItem.MET_AC_POWER]),
+            ],
+        }
+
+    @classmethod
+    def convert_scale_factor(cls, sunssf: Optional[int]):
+        if sunssf is None:
+            raise ValueError()
+        sunssf = round(sunssf)
+        if sunssf > 10 or sunssf < -10:
+            raise ValueError()
+
+        return pow(10, sunssf)
+
+    @classmethod
+    def scale(cls, value, sunssf: Optional[int]):
+        if value is None:
+            raise ValueError()
+        return value * cls.convert_scale_factor(sunssf)
+
+    @classmethod
+    def calc_self_consumption(cls, inv_ac_power, met_ac_power):
+        """:return: kW"""
+        if inv_ac_power is None or met_ac_power is None:
+            return None
+        return -0.001 * (inv_ac_power + met_ac_power)
+
+    @classmethod
+    def calc_inv_efficiency(cls, inv_ac_power, inv_dc_power):
+        if inv_ac_power is None or inv_dc_power is None:
+            return None
+        if inv_dc_power == 0:
+            return 0
+        return min(100.0 * inv_ac_power / inv_dc_power, 100)
+
+    @classmethod
+    def calc_bat_power(cls, raw_bat_power, mod_power, inv_dc_power):
+        """The MPPT delivers an unsigned battery power; the sign gets derived by the total DC power of the inverter."""
+        charge_factor = 0
+        if inv_dc_power is not None:
+            power_abs_1 = abs(0.0 + inv_dc_power - mod_power + raw_bat_power)
+            power_abs_2 = abs(0.0 + inv_dc_power - mod_power - raw_bat_power)
+            if power_abs_1 < power_abs_2:
+                charge_factor = -1.0
+            else:
+                charge_factor = 1.0
+
+        return raw_bat_power * charge_factor
+
     @classmethod
     def get_item_keys(cls, delivery: FronmodDelivery) -> Set[str]:
         if delivery == FronmodDelivery.QUICK:
@@ -208,8 +471,7 @@ class FronmodConfig:
 
         item_keys = set()
 
-        batches = [cls.INVERTER_BATCH, cls.MPPT_BATCH, cls.STORAGE_BATCH, cls.METER_BATCH]
-        for batch in batches:
+        for batch in cls.get_batches():
             for item in batch.items:
                 if item.flags & delivery_flag:
                     item_keys.add(item.name)
@@ -217,7 +479,8 @@ class FronmodConfig:
         return item_keys
 
     @classmethod
-    def list_items(cls, delivery: FronmodDelivery) -> str:
+    def get_send_keys(cls, delivery: FronmodDelivery) -> Set[str]:
+        """:return: keys of all items sent by a delivery (see `FronmodProcessor.pop_send_data`)"""
         item_set = cls.get_item_keys(delivery)
 
         if delivery == FronmodDelivery.MEDIUM:
@@ -230,6 +493,11 @@ class FronmodConfig:
             item_set.add(FronmodItem.EFLOW_INV_DC_OUT)
             item_set.add(FronmodItem.EFLOW_MOD_OUT)
 
+        return item_set
+
+    @classmethod
+    def list_items(cls, delivery: FronmodDelivery) -> str:
+        item_set = cls.get_send_keys(delivery)
         item_list = list(item_set)
         item_list.sort()
         return ", ".join(item_list)
@@ -237,104 +505,19 @@ class FronmodConfig:
     @classmethod
     def format_inv_sun_spec_state(cls, code: int) -> str:
         """former: pv_state_inv_sunspec.map"""
-        if code is None:
-            return None
-
-        text = f"({code}) "
-        if code == 1:
-            text += "OFF"
-        elif code == 2:
-            text += "AUTO-SHUTDOWN"
-        elif code == 3:
-            text += "RUN-UP"
-        elif code == 4:
-            text += "NORMAL"
-        elif code == 5:
-            text += "POWER REDUCTION"
-        elif code == 6:
-            text += "SWITCH-OFF"
-        elif code == 7:
-            text += "ERROR"
-        elif code == 8:
-            text += "STANDBY"
-        else:
-            text += "?"
-        return text
+        return cls.STATE_TEXTS.inverter_sunspec.format(code)
 
     @classmethod
     def format_inv_fronius_state(cls, code: int) -> str:
         """former: pv_state_inv_fronius.map"""
-        if code is None:
-            return None
-
-        if 1 <= code <= 8:
-            return cls.format_inv_sun_spec_state(code)
-
-        text = f"({code}) "
-        if code == 9:
-            text += "NO SOLARNET COMMUNICATION"
-        elif code == 10:
-            text += "NO COMMUNICATION"
-        elif code == 11:
-            text += "OVER-CURRENT SOLARNET SOCKET"
-        elif code == 12:
-            text += "UPDATE"
-        elif code == 13:
-            text += "AFCI EVENT (ARC)"
-        else:
-            text += "?"
-        return text
+        return cls.STATE_TEXTS.inverter_fronius.format(code)
 
     @classmethod
     def format_bat_state(cls, code: int) -> str:
         """former: pv_state_batt.map"""
-        if code is None:
-            return None
-
-        text = f"({code}) "
-        if code == 1:
-            text += "OFF"
-        elif code == 2:
-            text += "EMPTY"
-        elif code == 3:
-            text += "DISCHARGE"
-        elif code == 4:
-            text += "CHARGING"
-        elif code == 5:
-            text += "FULL"
-        elif code == 6:
-            text += "HOLDING"
-        elif code == 7:
-            text += "TESTING"
-        else:
-            text += "?"
-        return text
+        return cls.STATE_TEXTS.battery.format(code)
 
     @classmethod
     def format_mptt_state(cls, code: int) -> str:
         """former: pv_state_mppt.map"""
-        if code is None:
-            return None
-
-        text = f"({code}) "
-        if code == 1:
-            text += "OFF"
-        elif code == 2:
-            text += "IN OPERATION (NO FEED-IN)"
-        elif code == 3:
-            text += "RUN-UP"
-        elif code == 4:
-            text += "NORMAL"
-        elif code == 5:
-            text += "POWER REDUCTION"
-        elif code == 6:
-            text += "SWITCH-OFF"
-        elif code == 7:
-            text += "ERROR"
-        elif code == 8:
-            text += "STANDBY"
-        elif code == 65535:
-            text += "(0xFFFF) ?"
-        else:
-            text += "?"
-        return text
+        return cls.STATE_TEXTS.mppt.format(code)
@@ -1,18 +1,30 @@
 import logging
+from collections import namedtuple
+from functools import partial
+from typing import Iterator, List, Optional, Tuple
 
 from src.fronmod.eflow import EflowChannel, EflowAggregate
-from src.fronmod.fronmod_config import FronmodConfig, FronmodItem
+from src.fronmod.fronmod_config import FronmodConfig, FronmodItem, FronmodStateTexts
 from src.fronmod.fronmod_exception import FronmodException
-from src.fronmod.mobu import MobuFlag, MobuResult, MobuBatch
+from src.fronmod.mobu import MobuFlag, MobuMask, MobuResult, MobuResults, MobuBatch
+from src.fronmod.mobu_program import MobuProgram, MobuSlots
+from src.utils.clock import Clock
 
 
 _logger = logging.getLogger(__name__)
 
 
+FronmodModel = namedtuple('FronmodModel', ['name', 'batch', 'evaluate', 'inputs', 'flags'])
+"""Read of a Modbus batch: `evaluate` derives values and depends on the evaluation of the `inputs` (model names);
+`flags` give the cadence (Q_QUICK, Q_SLOW, ...)."""
+
+
 class FronmodProcessor:
 
-    def __init__(self, reader):
+    def __init__(self, reader, clock: Optional[Clock] = None, state_texts: Optional[dict] = None):
+        """:param state_texts: overrides of the state text tables (see `FronmodConfKey.STATE_TEXTS`)"""
         self._reader = reader
+        self._clock = clock or Clock()
 
         self._send_quick = {}  # 10s
         self._send_medium = {}  # 60s
@@ -20,23 +32,99 @@ class FronmodProcessor:
 
         self.eflow_inv_dc = EflowChannel(FronmodItem.INV_DC_POWER,
                                          EflowAggregate(FronmodItem.EFLOW_INV_DC_OUT),
-                                         EflowAggregate(FronmodItem.EFLOW_INV_DC_IN))
+                                         EflowAggregate(FronmodItem.EFLOW_INV_DC_IN),
+                                         self._clock)
         self.eflow_inv_ac = EflowChannel(FronmodItem.INV_AC_POWER,
                                          EflowAggregate(FronmodItem.EFLOW_INV_AC_OUT),
-                                         EflowAggregate(FronmodItem.EFLOW_INV_AC_IN))
+                                         EflowAggregate(FronmodItem.EFLOW_INV_AC_IN),
+                                         self._clock)
         self.eflow_bat = EflowChannel(FronmodItem.MPPT_BAT_POWER,
                                       EflowAggregate(FronmodItem.EFLOW_BAT_OUT),
-                                      EflowAggregate(FronmodItem.EFLOW_BAT_IN))
+                                      EflowAggregate(FronmodItem.EFLOW_BAT_IN),
+                                      self._clock)
         self.eflow_mod = EflowChannel(FronmodItem.MPPT_MOD_POWER,
                                       EflowAggregate(FronmodItem.EFLOW_MOD_OUT),
-                                      None)
-
-        self.value_inv_ac_power = None
-        self.value_inv_dc_power = None
-        self.value_met_ac_power = None
+                                      None,
+                                      self._clock)
 
         self._show_errors = True
 
+        batches = FronmodConfig.get_batches()
+        formulas = FronmodConfig.get_formulas(FronmodStateTexts(state_texts) if state_texts else None)
+        self._slots = MobuSlots(batches)
+        self._programs = {batch: MobuProgram(self._slots, batch, formulas.get(batch.name, [])) for batch in batches}
+        self._slot_inv_ac_power = self._slots.resolve(FronmodConfig.INVERTER_BATCH, FronmodItem.INV_AC_POWER)
+        self._slot_inv_dc_power = self._slots.resolve(FronmodConfig.INVERTER_BATCH, FronmodItem.INV_DC_POWER)
+        self._slot_met_ac_power = self._slots.resolve(FronmodConfig.METER_BATCH, FronmodItem.MET_AC_POWER)
+
+        self._eflows = eflows = [self.eflow_inv_dc, self.eflow_inv_ac, self.eflow_bat, self.eflow_mod]
+        self._log_limits = {}  # batch => [(slot, limit)]
+        self._eflow_slots = {}  # batch => [(slot, eflow)]
+        self._queue_slots = {}  # batch => [(queue_dict, name, slot)] of derived items
+        self._read_queues = {}  # batch => [(queue_dict, name, index)] of read items
+        self._reset_queues = {}  # batch => [(queue_dict, name)] of all queued items
+        for batch, program in self._programs.items():
+            self._log_limits[batch] = [
+                (self._slots.get_slot(batch, name), limit) for name, limit in FronmodConfig.REGISTER_LOG_LIMITS.items()
+                if self._slots.get_slot(batch, name) is not None
+            ]
+            self._eflow_slots[batch] = [
+                (self._slots.get_slot(batch, eflow.source_name), eflow) for eflow in eflows
+                if self._slots.get_slot(batch, eflow.source_name) is not None
+            ]
+            items = {item.name: item for item in batch.items}
+            self._queue_slots[batch] = [
+                (self._get_queue_dict(items[name].flags), name, self._slots.get_slot(batch, name))
+                for name in program.targets if self._get_queue_dict(items[name].flags) is not None
+            ]
+            self._read_queues[batch] = [
+                (self._get_queue_dict(item.flags), item.name, index) for index, item in enumerate(batch.items)
+                if item.offset is not None and self._get_queue_dict(item.flags) is not None
+            ]
+            self._reset_queues[batch] = [
+                (self._get_queue_dict(item.flags), item.name) for item in batch.items
+                if self._get_queue_dict(item.flags) is not None
+            ]
+
+        self._models = [
+            FronmodModel(FronmodConfig.INVERTER_BATCH.name, FronmodConfig.INVERTER_BATCH,
+                         partial(self._evaluate, self._programs[FronmodConfig.INVERTER_BATCH]), [], MobuFlag.Q_QUICK),
+            # MPPT_BAT_POWER (value_inv_dc_power)
+            FronmodModel(FronmodConfig.MPPT_BATCH.name, FronmodConfig.MPPT_BATCH,
+                         partial(self._evaluate, self._programs[FronmodConfig.MPPT_BATCH]),
+                         [FronmodConfig.INVERTER_BATCH.name], MobuFlag.Q_QUICK),
+            # SELF_CONSUMPTION (value_inv_ac_power)
+            FronmodModel(FronmodConfig.METER_BATCH.name, FronmodConfig.METER_BATCH,
+                         partial(self._evaluate, self._programs[FronmodConfig.METER_BATCH]),
+                         [FronmodConfig.INVERTER_BATCH.name], MobuFlag.Q_QUICK),
+            FronmodModel(FronmodConfig.STORAGE_BATCH.name, FronmodConfig.STORAGE_BATCH,
+                         partial(self._evaluate, self._programs[FronmodConfig.STORAGE_BATCH]), [], MobuFlag.Q_SLOW),
+        ]
+
+    @property
+    def value_inv_ac_power(self):
+        return self._slots.values[self._slot_inv_ac_power]
+
+    @value_inv_ac_power.setter
+    def value_inv_ac_power(self, value):
+        self._slots.values[self._slot_inv_ac_power] = value
+
+    @property
+    def value_inv_dc_power(self):
+        return self._slots.values[self._slot_inv_dc_power]
+
+    @value_inv_dc_power.setter
+    def value_inv_dc_power(self, value):
+        self._slots.values[self._slot_inv_dc_power] = value
+
+    @property
+    def value_met_ac_power(self):
+        return self._slots.values[self._slot_met_ac_power]
+
+    @value_met_ac_power.setter
+    def value_met_ac_power(self, value):
+        self._slots.values[self._slot_met_ac_power] = value
+
     def set_show_errors(self, show_errors):
         self._show_errors = show_errors
 
@@ -50,16 +138,27 @@ class FronmodProcessor:
             self._reader.close()
             self._reader = None
 
+    async def prefetch_async(self, batches: List[MobuBatch]):
+        """Coalesces the reads of the given batches; failures show up with the following (single) reads."""
+        try:
+            await self._reader.prefetch_async(batches)
+        except Exception as ex:
+            if self._show_errors:
+                _logger.warning('prefetch failed (%s): %s', batches, ex)
+
+    def pop_read_stats(self):
+        return self._reader.pop_read_stats()
+
     def _get_queue_dict(self, flags):
         if flags is None:
             return
 
         queue_dict = None
-        if flags & MobuFlag.Q_QUICK:
+        if flags & MobuMask.Q_QUICK:
             queue_dict = self._send_quick
-        elif flags & MobuFlag.Q_MEDIUM:
+        elif flags & MobuMask.Q_MEDIUM:
             queue_dict = self._send_medium
-        elif flags & MobuFlag.Q_SLOW:
+        elif flags & MobuMask.Q_SLOW:
             queue_dict = self._send_slow
 
         return queue_dict
@@ -72,249 +171,148 @@ class FronmodProcessor:
                 _logger.error('read_model failed (%s)!', read_conf)
             raise
 
-        for key, result in results.items():
-            self._queue_send(result)
-
-        return results  # used for loading and analysing real values from test context
+        self._queue_reads(read_conf, results)
+        return results
 
-    def reset_items(self, read_conf: MobuBatch):
-        for item in read_conf.items:
-            if not item.flags & MobuFlag.Q_ALL:
-                continue
-            result = MobuResult(item.name)
-            result.item = item
-            result.ready = True
-            self._queue_send(result)
-
-    def process_inverter_model(self):
-        batch = FronmodConfig.INVERTER_BATCH
+    async def _process_model_async(self, read_conf: MobuBatch):
         try:
-            results = self._process_model(batch)
-
-            self._process_text_conversion(results, FronmodItem.INV_STATE_CODE, FronmodItem.INV_STATE_TEXT,
-                                          FronmodConfig.format_inv_sun_spec_state)
-
-            self._push_eflow(results, self.eflow_inv_dc)
-            self._push_eflow(results, self.eflow_inv_ac)
+            results = await self._reader.read_async(read_conf)
+        except Exception:
+            if self._show_errors:
+                _logger.error('read_model failed (%s)!', read_conf)
+            raise
 
-            self.value_inv_ac_power = self.get_value(results, FronmodItem.INV_AC_POWER)
-            self.value_inv_dc_power = self.get_value(results, FronmodItem.INV_DC_POWER)
+        self._queue_reads(read_conf, results)
+        return results
 
-            self._process_self_consumption(results)
-            self._process_inv_efficiency(results)
+    def _queue_reads(self, batch: MobuBatch, results: MobuResults):
+        values = results.values
+        for queue_dict, name, index in self._read_queues[batch]:
+            queue_dict[name] = values[index]
 
-            return results
+    def _process(self, batch: MobuBatch):
+        try:
+            results = self._process_model(batch)
+            self._evaluate(self._programs[batch], results)
+            return self.get_values(batch)  # used for loading and analysing real values from test context
         except Exception:
             self.reset_items(batch)
             raise
 
-    def process_storage_model(self):
-        batch = FronmodConfig.STORAGE_BATCH
+    async def _process_async(self, batch: MobuBatch):
         try:
-            results = self._process_model(batch)
-
-            self._process_modbus_scale(results, FronmodItem.RAW_BAT_FILL_LEVEL, FronmodItem.RAW_BAT_FILL_LEVEL_SF,
-                                       FronmodItem.BAT_FILL_LEVEL)
+            results = await self._process_model_async(batch)
+            self._evaluate(self._programs[batch], results)
+            return self.get_values(batch)
+        except Exception:
+            self.reset_items(batch)
+            raise
 
-            self._process_text_conversion(results, FronmodItem.BAT_STATE_CODE, FronmodItem.BAT_STATE_TEXT, FronmodConfig.format_bat_state)
+    def get_models(self) -> List[FronmodModel]:
+        """:return: models in dependency order (inputs first)"""
+        return list(self._models)
 
-            return results
+    async def read_model_async(self, model: FronmodModel):
+        """Reads (and queues) the raw values of a model, see `evaluate_model`."""
+        try:
+            return await self._process_model_async(model.batch)
         except Exception:
-            self.reset_items(batch)
+            self.reset_items(model.batch)
             raise
 
-    def process_mppt_model(self):
-        batch = FronmodConfig.MPPT_BATCH
+    def evaluate_model(self, model: FronmodModel, results):
+        """Derives the values of a model from read `results`; the input models have to be evaluated before."""
         try:
-            results = self._process_model(batch)
+            model.evaluate(results)
+            return results
+        except Exception:
+            self.reset_items(model.batch)
+            raise
 
-            self._process_modbus_scale(results, FronmodItem.RAW_MPPT_MOD_VOLTAGE, FronmodItem.RAW_MPPT_VOLTAGE_SF,
-                                       FronmodItem.MPPT_MOD_VOLTAGE)
+    def reset_items(self, read_conf: MobuBatch):
+        for queue_dict, name in self._reset_queues[read_conf]:
+            queue_dict[name] = None
 
-            self._process_modbus_scale(results, FronmodItem.RAW_MPPT_MOD_POWER, FronmodItem.RAW_MPPT_POWER_SF,
-                                       FronmodItem.MPPT_MOD_POWER)
-            self._log_mobu_registers_when_value_larger_than(results, FronmodItem.MPPT_MOD_POWER, 5500)
+    def process_inverter_model(self):
+        return self._process(FronmodConfig.INVERTER_BATCH)
 
-            self._process_modbus_scale(results, FronmodItem.RAW_MPPT_BAT_POWER, FronmodItem.RAW_MPPT_POWER_SF,
-                                       FronmodItem.RAW2_MPPT_BAT_POWER)
+    async def process_inverter_model_async(self):
+        return await self._process_async(FronmodConfig.INVERTER_BATCH)
 
-            self._process_text_conversion(results, FronmodItem.MPPT_BAT_STATE_CODE, FronmodItem.MPPT_BAT_STATE_TEXT,
-                                          FronmodConfig.format_mptt_state)
-            self._process_text_conversion(results, FronmodItem.MPPT_MOD_STATE_CODE, FronmodItem.MPPT_MOD_STATE_TEXT,
-                                          FronmodConfig.format_mptt_state)
+    def process_storage_model(self):
+        return self._process(FronmodConfig.STORAGE_BATCH)
 
-            self._process_bat_power_sign(results)  # RAW2_MPPT_BAT_POWER => MPPT_BAT_POWER
-            self._log_mobu_registers_when_value_larger_than(results, FronmodItem.MPPT_BAT_POWER, 3300)
+    async def process_storage_model_async(self):
+        return await self._process_async(FronmodConfig.STORAGE_BATCH)
 
-            self._push_eflow(results, self.eflow_bat)
-            self._push_eflow(results, self.eflow_mod)
+    def process_mppt_model(self):
+        return self._process(FronmodConfig.MPPT_BATCH)
 
-            return results
-        except Exception:
-            self.reset_items(batch)
-            raise
+    async def process_mppt_model_async(self):
+        return await self._process_async(FronmodConfig.MPPT_BATCH)
 
     def process_meter_model(self):
-        batch = FronmodConfig.METER_BATCH
-        try:
-            results = self._process_model(FronmodConfig.METER_BATCH)
+        return self._process(FronmodConfig.METER_BATCH)
 
-            self.value_met_ac_power = self.get_value(results, FronmodItem.MET_AC_POWER)
-            self._process_self_consumption(results)
+    async def process_meter_model_async(self):
+        return await self._process_async(FronmodConfig.METER_BATCH)
 
-            return results
-        except Exception:
-            self.reset_items(batch)
-            raise
+    def _evaluate(self, program: MobuProgram, results: MobuResults):
+        values = self._slots.values
+        program.run(values, results.values, self._on_formula_error)
 
-    def _process_modbus_scale(self, results: dict, value_name: str, scale_name: str, target_name: str):
+        for slot, limit in self._log_limits[program.batch]:
+            if values[slot] is not None and values[slot] >= limit and self._reader is not None:
+                self._reader.log_last_registers()
 
-        try:
-            value_temp = results[value_name]
-            scale_temp = results[scale_name]
-            value_target = self.scale_item(value_temp, scale_temp)
-        except (FronmodException, TypeError, ValueError) as ex:
-            if self._show_errors:
-                _logger.error('process_modbus_scale failed (%s + %s => %s)!', value_name, scale_name, target_name)
-                _logger.exception(ex)
-            value_target = None
-
-        target_result = results[target_name]
-        target_result.value = value_target
-        target_result.ready = True
-        self._queue_send(target_result)
-
-    def _process_text_conversion(self, results: dict, source_name: str, target_name: str, convertion_func):
-        target_result = results[target_name]
-
-        source_mobu = results[source_name]
-        if source_mobu:
-            target_result.value = convertion_func(source_mobu.value)
-
-        target_result.ready = True
-        self._queue_send(target_result)
-
-    def _process_self_consumption(self, results):
-        target_result = results[FronmodItem.SELF_CONSUMPTION]
-        if self.value_inv_ac_power is not None and self.value_met_ac_power is not None:
-            target_result.value = -0.001 * (self.value_inv_ac_power + self.value_met_ac_power)
-        target_result.ready = True
-        self._queue_send(target_result)
-
-    def _process_bat_power_sign(self, results: dict):
-        value_target = None
-        try:
-            raw_bat_power = results.get(FronmodItem.RAW2_MPPT_BAT_POWER)
-
-            if raw_bat_power and raw_bat_power.ready:
-                mod_power = results.get(FronmodItem.MPPT_MOD_POWER)
-                if mod_power and mod_power.ready:
-                    charge_factor = 0
-                    if self.value_inv_dc_power is not None:
-                        power_abs_1 = abs(0.0 + self.value_inv_dc_power - mod_power.value + raw_bat_power.value)
-                        power_abs_2 = abs(0.0 + self.value_inv_dc_power - mod_power.value - raw_bat_power.value)
-                        if power_abs_1 < power_abs_2:
-                            charge_factor = -1.0
-                        else:
-                            charge_factor = 1.0
-
-                    value_target = raw_bat_power.value * charge_factor
-
-        except (TypeError, ValueError) as ex:
-            if self._show_errors:
-                _logger.error('process_bat_power_sign failed!')
-                _logger.exception(ex)
-            value_target = None
+        for slot, eflow in self._eflow_slots[program.batch]:
+            eflow.push_value(values[slot])
 
-        target_result = results[FronmodItem.MPPT_BAT_POWER]
-        target_result.value = value_target
-        target_result.ready = True
-        self._queue_send(target_result)
+        for queue_dict, name, slot in self._queue_slots[program.batch]:
+            queue_dict[name] = values[slot]
 
-    def _process_inv_efficiency(self, results: dict):
-        value_target = None
-        try:
-            if self.value_inv_ac_power is not None and self.value_inv_dc_power is not None:
-                if self.value_inv_dc_power == 0:
-                    value_target = 0
-                else:
-                    value_target = 100.0 * self.value_inv_ac_power / self.value_inv_dc_power
-                    value_target = min(value_target, 100)
-
-        except (TypeError, ValueError) as ex:
-            if self._show_errors:
-                _logger.error('process_inv_efficiency failed!')
-                _logger.exception(ex)
-            value_target = None
+    def _on_formula_error(self, target_name: str, ex: Exception):
+        if self._show_errors:
+            _logger.error('formula failed (=> %s)!', target_name)
+            _logger.exception(ex)
 
-        target_result = results[FronmodItem.INV_EFFICIENCY]
-        target_result.value = value_target
-        target_result.ready = True
-        self._queue_send(target_result)
+    def get_values(self, batch: MobuBatch) -> dict:
+        """:return: last evaluated values of a batch (item name => value)"""
+        start = self._slots.get_start(batch)
+        return {item.name: self._slots.values[start + index] for index, item in enumerate(batch.items)}
 
-    @classmethod
-    def _push_eflow(cls, results, eflow):
-        result = results[eflow.source_name]
-        if not result.ready:
-            raise FronmodException('can only push ready values!')
-        eflow.push_value(result.value)
+    def get_send_data(self, flags) -> dict:
+        return dict(self.pop_send_data(flags))
 
-    def get_send_data(self, flags):
-        export_data = {}
+    def pop_send_data(self, flags) -> Iterator[Tuple[str, any]]:
+        """
+        :return: queued values and energy flows (medium) as (name, value), without an intermediate copy; the queue gets
+            cleared and the aggregates reset, when the iteration is finished
+        """
         queue_dict = self._get_queue_dict(flags)
         if queue_dict:
-            for key, value in queue_dict.items():
-                # send_data_list.append(send_data)
-                export_data[key] = value
+            yield from queue_dict.items()
             queue_dict.clear()
 
-        if flags & MobuFlag.Q_MEDIUM:
-            eflow_list = [self.eflow_inv_dc, self.eflow_inv_ac, self.eflow_bat, self.eflow_mod]
-            for eflow in eflow_list:
-                agg_list = eflow.get_aggregates_and_reset()
-                for agg in agg_list:
-                    if agg.value_agg != 0:
-                        # channel = Channel.create(ChannelType.ITEM, agg.item_name)
-                        # send_data = OhSendData(self.SENDFLAGS, channel, agg.value_agg)
-                        # send_data_list.append(send_data)
-                        export_data[agg.item_name] = agg.value_agg
-
-        return export_data
-
-    def _queue_send(self, result: MobuResult):
-        if not result or not result.ready:
-            return
-
-        queue_dict = self._get_queue_dict(result.item.flags)
-        if queue_dict is not None:
-            # channel = Channel.create(ChannelType.ITEM, result.name)
-            # send_data = OhSendData(self.SENDFLAGS, channel, result.value)
-            queue_dict[result.name] = result.value
+        if flags & MobuMask.Q_MEDIUM:
+            for eflow in self._eflows:
+                yield from eflow.pop_aggregates()
 
     @classmethod
     def scale_item(cls, value_item: MobuResult, scale_item: MobuResult):
-        if value_item is None or value_item.value is None:
+        if value_item is None:
             raise ValueError()
-
-        scale = cls.convert_scale_factor(scale_item)
-        value = value_item.value * scale
-        return value
+        return FronmodConfig.scale(value_item.value, cls.get_result_value(scale_item))
 
     @classmethod
     def convert_scale_factor(cls, data_in):
-        if isinstance(data_in, MobuResult):
-            sunssf = data_in.value
-        else:
-            sunssf = data_in
+        return FronmodConfig.convert_scale_factor(cls.get_result_value(data_in))
 
-        if sunssf is None:
-            raise ValueError()
-        sunssf = round(sunssf)
-        if sunssf > 10 or sunssf < -10:
-            raise ValueError()
-
-        scale_factor = pow(10, sunssf)
-        return scale_factor
+    @classmethod
+    def get_result_value(cls, data_in):
+        if isinstance(data_in, MobuResult):
+            return data_in.value
+        return data_in
 
     @classmethod
     def get_value(cls, results, value_name, default_value=None):
@@ -324,13 +322,3 @@ class FronmodProcessor:
         if result.value is not None:
             return result.value
         return default_value
-
-    def _log_mobu_registers_when_value_larger_than(self, results, item_name, limit):
-        if limit is None or self._reader is None:
-            return
-        result = results.get(item_name)
-        if result is None or result.value is None:
-            return
-
-        if result.value >= limit:
-            self._reader.log_last_registers()
@@ -1,25 +1,76 @@
-import datetime
+import asyncio
 import logging
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import FrozenSet, List, Optional
 
-from .fronmod_config import FronmodConfig, FronmodConfKey
+from .fronmod_config import FronmodClient, FronmodConfig, FronmodConfKey
 from .fronmod_exception import FronmodException
-from .mobu import MobuBatch, MobuFlag, MobuItem, MobuResult
+from .mobu import MobuBatch, MobuItem, MobuResults
+from .mobu_capture import MobuCaptureWriter
+from .mobu_client import MobuAsyncClient
+from .mobu_decoder import MobuDecoder
+from .mobu_mbap import MobuPipeline, MobuTransactionIds
+from .mobu_planner import REGISTER_SIZE, MobuCostModel, MobuLatencyModel, MobuPlanner, MobuReadStats
 from pymodbus.client.sync import ModbusTcpClient as ModbusClient
-from pymodbus.payload import BinaryPayloadDecoder
 
-from src.utils.time_utils import TimeUtils
+from src.utils.clock import Clock
 
 _logger = logging.getLogger(__name__)
 
 
 class FronmodReader:
 
-    def __init__(self, config, print_registers=False):
+    DEFAULT_COALESCE_GAP = 16
+    DEFAULT_READ_COST_REQUEST = 50.0  # ms
+    DEFAULT_READ_COST_REGISTER = 2.0  # ms
+
+    def __init__(self, config, print_registers=False, clock: Optional[Clock] = None):
+        self._clock = clock or Clock()
         self._url = config[FronmodConfKey.HOST]
         self._port = config[FronmodConfKey.PORT]
         self._print_registers = print_registers
+        self._client_type = config.get(FronmodConfKey.CLIENT, FronmodClient.PYMODBUS)
+
+        sparse_reads = config.get(FronmodConfKey.SPARSE_READS, False)
+        request_cost = config.get(FronmodConfKey.READ_COST_REQUEST, self.DEFAULT_READ_COST_REQUEST)
+        register_cost = config.get(FronmodConfKey.READ_COST_REGISTER, self.DEFAULT_READ_COST_REGISTER)
+
+        cost_model = None
+        self._latency_model = None  # type: Optional[MobuLatencyModel]
+        if config.get(FronmodConfKey.READ_COST_AUTO, False):
+            self._latency_model = MobuLatencyModel(request_cost, register_cost)
+            cost_model = self._latency_model
+        elif sparse_reads:
+            cost_model = MobuCostModel(request_cost, register_cost)
+
+        self._planner = MobuPlanner(
+            config.get(FronmodConfKey.COALESCE_GAP, self.DEFAULT_COALESCE_GAP), cost_model=cost_model, sparse=sparse_reads
+        )
+        self._pipeline_depth = config.get(FronmodConfKey.PIPELINE_DEPTH, 1)
+        self._read_stats = MobuReadStats()
+        self._prefetched = {}  # batch => register data
+        self._cache = {}  # item => (register data, expires); only items with caching policy
 
         self._client = None
+        self._transaction_ids = MobuTransactionIds()  # pipelined requests
+        self._executor = None  # type: Optional[ThreadPoolExecutor]
+        self._async_client = None  # type: Optional[MobuAsyncClient]
+
+        self._capture = None  # type: Optional[MobuCaptureWriter]
+        capture_file = config.get(FronmodConfKey.CAPTURE_FILE)
+        if capture_file:
+            self._capture = MobuCaptureWriter(
+                capture_file,
+                config.get(FronmodConfKey.CAPTURE_MAX_BYTES, MobuCaptureWriter.DEFAULT_MAX_BYTES),
+                config.get(FronmodConfKey.CAPTURE_BACKUPS, MobuCaptureWriter.DEFAULT_BACKUPS),
+                clock=self._clock,
+            )
+
+        # decode plans get compiled once
+        self._decoders = {batch: MobuDecoder(batch, FronmodConfig.BYTEORDER) for batch in FronmodConfig.get_batches()}
+        self._results = {batch: MobuResults(batch) for batch in FronmodConfig.get_batches()}  # reused by each read
 
         self._last_read = None
         self._last_register = None
@@ -28,12 +79,22 @@ class FronmodReader:
         logging.getLogger("pymodbus").setLevel(logging.WARNING)
 
     def open(self):
-        if not self._client:
+        self._cache.clear()
+        if self._client_type == FronmodClient.ASYNCIO:
+            if not self._async_client:
+                # connects with the first (async) read
+                on_response = self._latency_model.observe if self._latency_model else None
+                self._async_client = MobuAsyncClient(
+                    self._url, self._port, max_in_flight=self._pipeline_depth, on_response=on_response, clock=self._clock
+                )
+        elif not self._client:
             self._client = ModbusClient(self._url, port=self._port)
             self._client.connect()
             _logger.debug("connected")
 
     def is_open(self) -> bool:
+        if self._async_client is not None:
+            return True  # (re)connects on demand
         if self._client is None:
             return False
         if not self._client.is_socket_open():
@@ -41,45 +102,39 @@ class FronmodReader:
         return True
 
     def close(self):
+        self._prefetched.clear()
+        self._cache.clear()
+        if self._capture:
+            self._capture.close()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._async_client:
+            _logger.debug("closing")
+            self._async_client.close()
+            self._async_client = None
         if self._client:
             _logger.debug("closing")
             self._client.close()
             self._client = None
 
-    def _extract(self, read_item: MobuItem, registers):
-        if read_item.offset == 0:
-            decoder = BinaryPayloadDecoder.fromRegisters(registers, byteorder=FronmodConfig.BYTEORDER)
-        else:
-            offset = read_item.offset
-            if read_item.flags & MobuFlag.INT16:
-                buffer = registers[offset:offset + 1]
-                decoder = BinaryPayloadDecoder.fromRegisters(buffer, byteorder=FronmodConfig.BYTEORDER)
-            elif read_item.flags & MobuFlag.UINT16:
-                buffer = registers[offset:offset + 1]
-                decoder = BinaryPayloadDecoder.fromRegisters(buffer, byteorder=FronmodConfig.BYTEORDER)
-            elif read_item.flags & MobuFlag.FLOAT32:
-                buffer = registers[offset:offset + 2]
-                decoder = BinaryPayloadDecoder.fromRegisters(buffer, byteorder=FronmodConfig.BYTEORDER)
-            else:
-                decoder = None  # error
-
-        result = MobuResult(read_item.name)
-
-        if read_item.flags & MobuFlag.INT16:
-            result.value = decoder.decode_16bit_int()
-        elif read_item.flags & MobuFlag.UINT16:
-            result.value = decoder.decode_16bit_uint()
-            if result.value == 0xffff:
-                result.value = 0  # strange behavior with RAW_MPPT_MOD_POWER + RAW_MPPT_BAT_POWER
-        elif read_item.flags & MobuFlag.FLOAT32:
-            result.value = decoder.decode_32bit_float()
-        elif read_item.flags & MobuFlag.STRING8:
-            raise NotImplementedError()
-        else:
-            raise ValueError()
-
-        result.ready = True
-        return result
+    def _abort(self):
+        """Unblocks a pending (synchronous) read running in the executor thread."""
+        self._cache.clear()
+        client = self._client
+        if client is not None and client.socket is not None:
+            try:
+                client.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            _logger.warning("pending read aborted")
+
+    def _get_decoder(self, read: MobuBatch) -> MobuDecoder:
+        decoder = self._decoders.get(read)
+        if decoder is None:
+            decoder = MobuDecoder(read, FronmodConfig.BYTEORDER)
+            self._decoders[read] = decoder
+        return decoder
 
     def _read_remote_registers(self, read: MobuBatch):
         self._last_read = None
@@ -91,9 +146,11 @@ class FronmodReader:
         if not self.is_open():
             raise FronmodException('ModbusClient is not open!')
 
-        time_start = datetime.datetime.now()
+        time_start = self._clock.monotonic()
         response = self._client.read_holding_registers(read.pos, read.length, unit=read.unit_id)
-        diff_seconds = (datetime.datetime.now() - time_start).total_seconds()
+        diff_seconds = self._clock.monotonic() - time_start
+        if self._latency_model is not None:
+            self._latency_model.observe(read.unit_id, read.length, diff_seconds)
         if diff_seconds > 0.3:
             _logger.debug('read_holding_registers <pos=%d, l=%d, unit=%d> took %fs',
                           read.pos, read.length, read.unit_id, diff_seconds)
@@ -109,27 +166,246 @@ class FronmodReader:
             print('response.registers: ', response.registers)
         return response.registers
 
+    def _read_remote_ranges(self, ranges) -> List[bytes]:
+        """:return: register data (2 bytes per register) for each range"""
+        if self._async_client is not None:
+            raise FronmodException('synchronous reads are not supported by the asyncio client!')
+        if self._pipeline_depth > 1 and len(ranges) > 1:
+            return self._read_remote_pipelined(ranges)
+
+        data_list = []
+        for read_range in ranges:
+            registers = self._read_remote_registers(read_range)
+            data_list.append(struct.pack(f">{len(registers)}H", *registers))
+        return data_list
+
+    async def _read_remote_ranges_async(self, ranges) -> List[memoryview]:
+        """Same as `_read_remote_ranges`, but by the asyncio client (pipelined up to the max. in-flight depth)."""
+        self._last_read = None
+        self._last_register = None
+        self._last_logged = False
+
+        if self._async_client is None:
+            raise FronmodException('MobuAsyncClient is None!')
+
+        time_start = self._clock.monotonic()
+        try:
+            await self._async_client.connect()
+            data_list = await self._async_client.read_ranges(ranges)
+        except (Exception, asyncio.CancelledError):
+            self._async_client.close()  # a pending response would mess up the next requests
+            raise
+        diff_seconds = self._clock.monotonic() - time_start
+        if diff_seconds > 0.3:
+            _logger.debug('read_holding_registers <%s> took %fs', ranges, diff_seconds)
+
+        self._last_read = ranges
+        self._last_register = data_list
+
+        if self._print_registers:
+            print('response.registers: ', self._unpack_registers(data_list))
+        return data_list
+
+    @classmethod
+    def _unpack_registers(cls, data_list) -> List[List[int]]:
+        return [list(struct.unpack(f">{len(data) // REGISTER_SIZE}H", data)) for data in data_list]
+
+    def _read_remote_pipelined(self, ranges) -> List[memoryview]:
+        """Sends all requests back to back (up to the max. in-flight depth), costs about one round trip."""
+        self._last_read = None
+        self._last_register = None
+        self._last_logged = False
+
+        if self._client is None:
+            raise FronmodException('ModbusClient is None!')
+        if not self.is_open():
+            raise FronmodException('ModbusClient is not open!')
+
+        sock = self._client.socket
+        sock.settimeout(self._client.timeout)  # pymodbus switches to non-blocking mode
+        on_response = self._latency_model.observe if self._latency_model else None
+        pipeline = MobuPipeline(sock, self._pipeline_depth, self._transaction_ids.next, on_response, self._clock)
+
+        time_start = self._clock.monotonic()
+        try:
+            data_list = pipeline.read(ranges)
+        except Exception:
+            self._client.close()  # a pending response would mess up the next requests
+            raise
+        diff_seconds = self._clock.monotonic() - time_start
+        if diff_seconds > 0.3:
+            _logger.debug('pipelined read_holding_registers <%s> took %fs', ranges, diff_seconds)
+
+        self._last_read = ranges
+        self._last_register = data_list
+
+        if self._print_registers:
+            print('response.registers: ', self._unpack_registers(data_list))
+        return data_list
+
     def read(self, read: MobuBatch):
-        time_start = TimeUtils.now()
+        time_start = self._clock.monotonic()
 
-        registers = self._read_remote_registers(read)
+        registers = self._prefetched.pop(read, None)
+        if registers is None:
+            registers = self._fetch_registers([read]).get(read)
+        return self._get_results(read, registers, time_start)
 
-        results = {}
-        for item in read.items:
-            if item.offset is not None:
-                result = self._extract(item, registers)
-                if results.get(item.name) is not None:
-                    raise FronmodException('wrong configuration - duplicate read names!')
-            else:
-                result = MobuResult(item.name)  # empty result!
+    def _get_results(self, read: MobuBatch, registers, time_start) -> MobuResults:
+        """:return: reused store of the batch, valid until its next read"""
+        if registers is None:
+            registers = bytes(read.length * REGISTER_SIZE)
 
-            result.item = item
-            results[item.name] = result
+        results = self._results.get(read)
+        if results is None:
+            results = MobuResults(read)
+            self._results[read] = results
+        self._get_decoder(read).decode_into(registers, results.values)
 
-        _logger.debug("read batch '%s' (%.1fs)", read.name, (TimeUtils.now() - time_start).total_seconds())
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("read batch '%s' (%.1fs)", read.name, self._clock.monotonic() - time_start)
         return results
 
+    def _get_cached_items(self, batches: List[MobuBatch]) -> FrozenSet[MobuItem]:
+        """:return: items with valid cached registers, which need not be read"""
+        if not self._cache:
+            return frozenset()
+
+        now = self._clock.monotonic()
+        return frozenset(
+            item for batch in batches for item in batch.items if item in self._cache and self._cache[item][1] > now
+        )
+
+    def _update_cache(self, batches: List[MobuBatch], batch_registers: dict, cached_items: FrozenSet[MobuItem]):
+        now = None
+        for batch in batches:
+            registers = batch_registers.get(batch)
+            for item in batch.items:
+                if item.cache is None or item.offset is None:
+                    continue
+                start = item.offset * REGISTER_SIZE
+                end = start + item.width * REGISTER_SIZE
+
+                if item in cached_items:
+                    if not isinstance(registers, bytearray):
+                        registers = bytearray(registers or batch.length * REGISTER_SIZE)
+                        batch_registers[batch] = registers
+                    registers[start:end] = self._cache[item][0]
+                elif registers is not None:
+                    now = now or self._clock.monotonic()
+                    self._cache[item] = (bytes(registers[start:end]), now + item.cache)
+
+    def _fetch_registers(self, batches: List[MobuBatch]):
+        """:return: register data per batch, read by the planned requests or taken from cache"""
+        cached_items = self._get_cached_items(batches)
+        ranges = self._planner.plan(batches, cached_items)
+        try:
+            data_list = self._read_remote_ranges(ranges)
+        except Exception:
+            self._cache.clear()  # refresh after reconnect
+            raise
+        return self._collect_registers(batches, ranges, data_list, cached_items)
+
+    async def _fetch_registers_async(self, batches: List[MobuBatch]):
+        """Same as `_fetch_registers`, but by the asyncio client."""
+        cached_items = self._get_cached_items(batches)
+        ranges = self._planner.plan(batches, cached_items)
+        try:
+            data_list = await self._read_remote_ranges_async(ranges)
+        except (Exception, asyncio.CancelledError):
+            self._cache.clear()  # refresh after reconnect
+            raise
+        return self._collect_registers(batches, ranges, data_list, cached_items)
+
+    def _collect_registers(self, batches: List[MobuBatch], ranges, data_list, cached_items: FrozenSet[MobuItem]):
+        if self._capture is not None:
+            self._write_capture(ranges, data_list)
+
+        batch_registers = {}
+        for read_range, data in zip(ranges, data_list):
+            read_range.fill(data, batch_registers)
+
+        self._update_cache(batches, batch_registers, cached_items)
+        self._read_stats.add(batches, ranges)
+        return batch_registers
+
+    def _write_capture(self, ranges, data_list):
+        """A failing capture (e.g. disk full) gets disabled, reading goes on."""
+        monotonic_ns = self._clock.monotonic_ns()
+        try:
+            for read_range, data in zip(ranges, data_list):
+                self._capture.write(monotonic_ns, read_range.unit_id, read_range.pos, data)
+        except OSError:
+            _logger.exception('capture to "%s" failed - capture disabled!', self._capture.path)
+            try:
+                self._capture.close()
+            except OSError:
+                pass
+            self._capture = None
+
+    def prefetch(self, batches: List[MobuBatch]):
+        """
+        Reads the registers of batches in advance, which can be coalesced into less requests or pipelined. The next `read` of
+        such a batch is served from the prefetched registers.
+        """
+        self._prefetched.clear()
+        batches = self._get_prefetch_batches(batches)
+        if batches:
+            self._prefetched = self._fetch_registers(batches)
+
+    def _get_prefetch_batches(self, batches: List[MobuBatch]) -> List[MobuBatch]:
+        if self._pipeline_depth <= 1:
+            ranges = self._planner.plan(batches, self._get_cached_items(batches))
+            coalesced = [batch for read_range in ranges if len(read_range.batches) > 1 for batch in read_range.batches]
+            batches = [batch for batch in batches if batch in coalesced]  # others are read on demand
+        return batches
+
+    def pop_read_stats(self) -> MobuReadStats:
+        """:return: read statistics since the last call"""
+        stats = self._read_stats
+        self._read_stats = MobuReadStats()
+        if self._latency_model is not None:
+            _logger.debug("read latency: %s", self._latency_model)
+        return stats
+
+    async def _run_in_executor(self, func, *args):
+        """
+        Runs the blocking Modbus communication in a dedicated worker thread, so the event loop stays responsive.
+        A cancellation (e.g. by `asyncio.wait_for`) aborts the pending socket operation.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fronmod")
+
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        except asyncio.CancelledError:
+            self._abort()
+            raise
+
+    async def read_async(self, read: MobuBatch):
+        """Same as `read`, but non-blocking."""
+        if self._async_client is None:
+            return await self._run_in_executor(self.read, read)
+
+        time_start = self._clock.monotonic()
+        registers = self._prefetched.pop(read, None)
+        if registers is None:
+            registers = (await self._fetch_registers_async([read])).get(read)
+        return self._get_results(read, registers, time_start)
+
+    async def prefetch_async(self, batches: List[MobuBatch]):
+        """Same as `prefetch`, but non-blocking."""
+        if self._async_client is None:
+            await self._run_in_executor(self.prefetch, batches)
+            return
+
+        self._prefetched.clear()
+        batches = self._get_prefetch_batches(batches)
+        if batches:
+            self._prefetched = await self._fetch_registers_async(batches)
+
     def log_last_registers(self):
         if not self._last_logged:
-            _logger.warning('log_last_registers ({}): {}', self._last_read, self._last_register)
+            _logger.warning('log_last_registers (%s): %s', self._last_read, self._last_register)
             self._last_logged = True
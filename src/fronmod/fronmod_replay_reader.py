@@ -0,0 +1,67 @@
+from typing import List, Optional
+
+from .fronmod_config import FronmodConfKey
+from .fronmod_reader import FronmodReader
+from .mobu_capture import MobuCaptureRecord
+from .mobu_planner import REGISTER_SIZE
+
+from src.utils.clock import Clock
+
+
+class FronmodReplayReader(FronmodReader):
+    """
+    Serves reads from a register image instead of the network. The image gets updated by the records of a capture file
+    (`apply`), so any planned request (coalesced, sparse, cached) returns the registers as last captured. Registers which
+    were never captured read as zero.
+    """
+
+    UNIT_REGISTERS = 0x10000
+
+    REPLAY_CONFIG = {
+        FronmodConfKey.HOST: "replay",
+        FronmodConfKey.PORT: 0,
+    }
+
+    def __init__(self, config: Optional[dict] = None, clock: Optional[Clock] = None):
+        config = {**self.REPLAY_CONFIG, **(config or {})}
+        config.pop(FronmodConfKey.CAPTURE_FILE, None)  # never record a replay
+        config.pop(FronmodConfKey.CLIENT, None)
+        super().__init__(config, clock=clock)
+
+        self._is_open = False
+        self._images = {}  # unit id => register data (bytearray)
+
+    def open(self):
+        self._cache.clear()
+        self._is_open = True
+
+    def is_open(self) -> bool:
+        return self._is_open
+
+    def close(self):
+        super().close()
+        self._is_open = False
+
+    def apply(self, record: MobuCaptureRecord):
+        image = self._images.get(record.unit_id)
+        if image is None:
+            image = bytearray(self.UNIT_REGISTERS * REGISTER_SIZE)
+            self._images[record.unit_id] = image
+        start = record.pos * REGISTER_SIZE
+        image[start:start + len(record.data)] = record.data
+
+    def _read_remote_ranges(self, ranges) -> List[bytes]:
+        data_list = []
+        for read_range in ranges:
+            image = self._images.get(read_range.unit_id)
+            start = read_range.pos * REGISTER_SIZE
+            end = start + read_range.length * REGISTER_SIZE
+            data_list.append(bytes(image[start:end]) if image is not None else bytes(end - start))
+
+        self._last_read = ranges
+        self._last_register = data_list
+        self._last_logged = False
+        return data_list
+
+    async def _run_in_executor(self, func, *args):
+        return func(*args)  # no I/O, no worker thread
@@ -1,5 +1,9 @@
+import math
+from abc import ABC, abstractmethod
 from enum import IntFlag
-from typing import Optional
+from typing import Iterator, Optional, Sequence, Tuple
+
+from .fronmod_exception import FronmodException
 
 
 class MobuFlag(IntFlag):
@@ -14,37 +18,99 @@ class MobuFlag(IntFlag):
     Q_ALL = Q_QUICK | Q_MEDIUM | Q_SLOW
 
 
-class MobuItem:
-    def __init__(self, docu_offset: Optional[int], flags: MobuFlag, name: str, lambda_convert=None):
+class MobuMask:
+    """Plain int masks of `MobuFlag` for the hot path: `&` of an `IntFlag` runs through the enum machinery."""
+    INT16 = int(MobuFlag.INT16)
+    UINT16 = int(MobuFlag.UINT16)
+    FLOAT32 = int(MobuFlag.FLOAT32)
+    STRING8 = int(MobuFlag.STRING8)
+    Q_QUICK = int(MobuFlag.Q_QUICK)
+    Q_MEDIUM = int(MobuFlag.Q_MEDIUM)
+    Q_SLOW = int(MobuFlag.Q_SLOW)
+    Q_ALL = int(MobuFlag.Q_ALL)
+
+
+class MobuCache:
+    """Caching policy of item registers: seconds to live"""
+    FRESH = None  # read every time
+    STATIC = math.inf  # read once per connection
+
+
+class MobuFrozen(ABC):
+    """Base of immutable definitions (set attributes in `__init__` by `_init`, `_get_args` for pickling)."""
+
+    __slots__ = ()
+
+    def _init(self, name: str, value):
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable!")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable!")
+
+    def __reduce__(self):
+        return self.__class__, self._get_args()
+
+    @abstractmethod
+    def _get_args(self) -> tuple:
+        """:return: arguments of `__init__`"""
+
+
+class MobuItem(MobuFrozen):
+    """Item definition; `flags` are a plain int (see `MobuMask`), `width` (registers) gets precomputed."""
+
+    __slots__ = ('offset', 'flags', 'name', 'lambda_convert', 'cache', 'width', '_docu_offset')
+
+    def __init__(self, docu_offset: Optional[int], flags: MobuFlag, name: str, lambda_convert=None,
+                 cache: Optional[float] = MobuCache.FRESH):
         if docu_offset is not None and docu_offset > 0:
-            self.offset = docu_offset - 1  # fronius start position are not 0 terminated
+            self._init('offset', docu_offset - 1)  # fronius start position are not 0 terminated
         else:
-            self.offset = docu_offset
-        self.flags = flags
-        self.name = name
-        self.lambda_convert = lambda_convert
+            self._init('offset', docu_offset)
+        self._init('_docu_offset', docu_offset)
+        self._init('flags', int(flags) if flags is not None else None)
+        self._init('name', name)
+        self._init('lambda_convert', lambda_convert)
+        self._init('cache', cache)
+        self._init('width', 1 if self.flags is not None and self.flags & (MobuMask.INT16 | MobuMask.UINT16) else 2)
+
+    def _get_args(self) -> tuple:
+        return self._docu_offset, self.flags, self.name, self.lambda_convert, self.cache
 
     def __repr__(self) -> str:
         return '{}({},{})'.format(self.__class__.__name__, self.name,
                                   hex(self.flags) if self.flags is not None else 'None')
 
 
-class MobuBatch:
-    def __init__(self, unit_id: int, name: str, pos: int, length: int, items: list):
-        self.unit_id = unit_id
-        self.name = name
-        self.pos = pos
-        self.length = length
-        self.items = items
+class MobuBatch(MobuFrozen):
+    """Batch definition (registers of a unit read at once); `items` become a tuple."""
+
+    __slots__ = ('unit_id', 'name', 'pos', 'length', 'items', '_hash')
+
+    def __init__(self, unit_id: int, name: str, pos: int, length: int, items: Sequence[MobuItem]):
+        self._init('unit_id', unit_id)
+        self._init('name', name)
+        self._init('pos', pos)
+        self._init('length', length)
+        self._init('items', tuple(items))
+        self._init('_hash', hash((unit_id, pos, length)))
+
+    def _get_args(self) -> tuple:
+        return self.unit_id, self.name, self.pos, self.length, self.items
 
     def __repr__(self) -> str:
         return '{}({},{})'.format(self.__class__.__name__, self.unit_id, self.pos)
 
     def __hash__(self):
-        return hash((self.unit_id, self.pos, self.length))
+        return self._hash
 
 
 class MobuResult:
+
+    __slots__ = ('name', 'value', 'item', 'ready')
+
     def __init__(self, name: str, value=None):
         self.name = name
         self.value = value
@@ -53,3 +119,47 @@ class MobuResult:
 
     def __repr__(self) -> str:
         return '{}({},{})'.format(self.__class__.__name__, self.name, self.value)
+
+
+class MobuResults:
+    """
+    Reusable result store of a batch: `values` are aligned to `batch.items` (address by `index`) and get overwritten
+    by the next read of the batch. Access by name (`results[name]`) returns a `MobuResult` snapshot, for tests and tools.
+    """
+
+    __slots__ = ('batch', 'values', 'index')
+
+    def __init__(self, batch: MobuBatch):
+        self.batch = batch
+        self.values = [None] * len(batch.items)
+        self.index = {}  # item name => index
+        for index, item in enumerate(batch.items):
+            if item.offset is not None and item.name in self.index:
+                raise FronmodException('wrong configuration - duplicate read names!')
+            self.index[item.name] = index
+
+    def __getitem__(self, name: str) -> MobuResult:
+        index = self.index[name]
+        item = self.batch.items[index]
+        result = MobuResult(name, self.values[index])
+        result.item = item
+        result.ready = item.offset is not None
+        return result
+
+    def get(self, name: str, default=None) -> Optional[MobuResult]:
+        return self[name] if name in self.index else default
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def items(self) -> Iterator[Tuple[str, MobuResult]]:
+        return ((name, self[name]) for name in self.index)
+
+    def __repr__(self) -> str:
+        return '{}({},{})'.format(self.__class__.__name__, self.batch.name, self.values)
@@ -0,0 +1,169 @@
+import os
+import struct
+from collections import namedtuple
+from typing import BinaryIO, Iterator, List, Optional
+
+from .fronmod_exception import FronmodException
+from src.utils.clock import Clock
+
+
+MobuCaptureRecord = namedtuple('MobuCaptureRecord', ['monotonic_ns', 'unit_id', 'pos', 'data'])
+"""Raw response: monotonic clock (ns), unit id, start position, register data (2 bytes per register, big endian)"""
+
+
+class MobuCapture:
+    """
+    Binary capture file of raw "read holding registers" responses, append-only:
+
+    - file header: magic, version, wall clock (ns), monotonic clock (ns)
+    - records: record size (bytes following), monotonic clock (ns), unit id, start position, register count, register data
+    """
+
+    MAGIC = b"FMCAP"
+    VERSION = 1
+
+    HEADER = struct.Struct(">5sBqq")
+    RECORD_SIZE = struct.Struct(">I")
+    RECORD = struct.Struct(">qBHH")
+
+
+class MobuCaptureWriter:
+    """
+    Appends records to a capture file, which gets rotated by size (`<path>.1`, `<path>.2`, ...).
+
+    An existing file of a former writer (e.g. before a service restart or reboot) gets rotated on open, its anchor
+    (monotonic clock) is not valid for new records. Reopening by the same writer appends.
+
+    Writes are buffered and never synced, so a crash may lose the last records.
+    """
+
+    DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+    DEFAULT_BACKUPS = 3
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS,
+                 clock: Optional[Clock] = None):
+        self._path = path
+        self._clock = clock or Clock()
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._file = None  # type: Optional[BinaryIO]
+        self._size = 0
+        self._anchored = False  # the file header was written by this writer
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def open(self):
+        if self._file is not None:
+            return
+        if not self._anchored and os.path.exists(self._path) and os.path.getsize(self._path) > 0:
+            self._rotate_files()  # anchored by a former writer
+        self._file = open(self._path, "ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._write(MobuCapture.HEADER.pack(
+                MobuCapture.MAGIC, MobuCapture.VERSION, self._clock.time_ns(), self._clock.monotonic_ns()
+            ))
+        self._anchored = True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._size += len(data)
+
+    def write(self, monotonic_ns: int, unit_id: int, pos: int, data: bytes):
+        """:param data: raw register data (2 bytes per register)"""
+        if self._file is None:
+            self.open()
+
+        record = MobuCapture.RECORD.pack(monotonic_ns, unit_id, pos, len(data) // 2)
+        self._write(MobuCapture.RECORD_SIZE.pack(len(record) + len(data)))
+        self._write(record)
+        self._write(data)
+
+        if self._size >= self._max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.close()
+        self._rotate_files()
+        self.open()
+
+    def _rotate_files(self):
+        for index in range(self._backups - 1, 0, -1):
+            source = f"{self._path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self._path}.{index + 1}")
+        if self._backups > 0:
+            os.replace(self._path, f"{self._path}.1")
+        else:
+            os.remove(self._path)
+
+
+class MobuCaptureReader:
+    """Reads the records of a capture file; a truncated last record (crash while writing) is ignored."""
+
+    def __init__(self, path: str):
+        self._path = path
+        # anchor of the file: wall clock (ns) at the monotonic clock (ns)
+        self.wall_ns = None  # type: Optional[int]
+        self.monotonic_ns = None  # type: Optional[int]
+
+    def get_wall_ns(self, record: MobuCaptureRecord) -> int:
+        """:return: wall clock time (ns) of a record (after the header was read)"""
+        return self.wall_ns + record.monotonic_ns - self.monotonic_ns
+
+    @classmethod
+    def get_rotated_paths(cls, path: str) -> List[str]:
+        """:return: existing files of a rotated capture, oldest first"""
+        paths = []
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            paths.insert(0, f"{path}.{index}")
+            index += 1
+        if os.path.exists(path):
+            paths.append(path)
+        return paths
+
+    def read_header(self) -> int:
+        """:return: wall clock time (ns) of the file start (the anchor)"""
+        with open(self._path, "rb") as file:
+            self._read_header(file)
+        return self.wall_ns
+
+    def _read_header(self, file: BinaryIO):
+        header = file.read(MobuCapture.HEADER.size)
+        if len(header) < MobuCapture.HEADER.size:
+            raise FronmodException(f"no capture file ({self._path})!")
+        magic, version, self.wall_ns, self.monotonic_ns = MobuCapture.HEADER.unpack(header)
+        if magic != MobuCapture.MAGIC or version != MobuCapture.VERSION:
+            raise FronmodException(f"no capture file or unknown version ({self._path})!")
+
+    def __iter__(self) -> Iterator[MobuCaptureRecord]:
+        with open(self._path, "rb") as file:
+            self._read_header(file)
+
+            record_struct = MobuCapture.RECORD
+            while True:
+                size_bytes = file.read(MobuCapture.RECORD_SIZE.size)
+                if len(size_bytes) < MobuCapture.RECORD_SIZE.size:
+                    break
+                size, = MobuCapture.RECORD_SIZE.unpack(size_bytes)
+                record = file.read(size)
+                if len(record) < size:
+                    break  # truncated
+
+                monotonic_ns, unit_id, pos, count = record_struct.unpack_from(record)
+                data = record[record_struct.size:]
+                if len(data) != count * 2:
+                    raise FronmodException(f"corrupt capture record ({self._path})!")
+                yield MobuCaptureRecord(monotonic_ns, unit_id, pos, data)
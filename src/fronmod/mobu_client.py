@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Sequence
+
+from .fronmod_exception import FronmodException
+from .mobu_mbap import MobuMbap, MobuTransactionIds
+from src.utils.clock import Clock
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MobuAsyncClient:
+    """
+    Minimal asyncio Modbus TCP client for the read-only hot path: MBAP framing and "read holding registers" only.
+    Responses are delivered as raw register bytes (`memoryview`), concurrent requests are pipelined.
+    """
+
+    DEFAULT_TIMEOUT = 3.0  # seconds
+
+    def __init__(self, host: str, port: int, timeout: float = DEFAULT_TIMEOUT, max_in_flight: int = 1,
+                 on_response: Optional[Callable[[int, int, float], None]] = None, clock: Optional[Clock] = None):
+        """
+        :param on_response: called with unit id, register count and latency (seconds) of each successful request; the
+            latency of a request sent before the previous response arrived counts from that response on (gateway time)
+        """
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._max_in_flight = max_in_flight
+        self._on_response = on_response
+        self._clock = clock or Clock()
+
+        self._stream_reader = None  # type: Optional[asyncio.StreamReader]
+        self._stream_writer = None  # type: Optional[asyncio.StreamWriter]
+        self._receive_task = None  # type: Optional[asyncio.Task]
+        self._in_flight = None  # type: Optional[asyncio.Semaphore]
+        self._pending = {}  # transaction id => (future, unit id, count)
+        self._transaction_ids = MobuTransactionIds()
+        self._time_last_response = 0.0
+
+    def is_open(self) -> bool:
+        return self._stream_writer is not None and not self._stream_writer.is_closing()
+
+    async def connect(self):
+        if self.is_open():
+            return
+        self.close()
+
+        try:
+            self._stream_reader, self._stream_writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port), self._timeout
+            )
+        except (OSError, asyncio.TimeoutError) as ex:
+            raise FronmodException(f"cannot connect to {self._host}:{self._port} ({ex})!") from ex
+
+        self._in_flight = asyncio.Semaphore(self._max_in_flight)
+        self._receive_task = asyncio.get_event_loop().create_task(self._receive())
+        _logger.debug("connected")
+
+    def close(self):
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+            self._receive_task = None
+        if self._stream_writer is not None:
+            self._stream_writer.close()
+            self._stream_writer = None
+            self._stream_reader = None
+        self._fail_pending(FronmodException("connection closed!"))
+
+    def _fail_pending(self, ex: Exception):
+        for future, _, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(ex)
+        self._pending.clear()
+
+    async def read_holding_registers(self, unit_id: int, pos: int, count: int) -> memoryview:
+        """:return: register data, 2 bytes per register (big endian)"""
+        if not self.is_open():
+            raise FronmodException("client is not open!")
+
+        async with self._in_flight:
+            transaction_id = self._transaction_ids.next()
+            future = asyncio.get_event_loop().create_future()
+            self._pending[transaction_id] = (future, unit_id, count)
+
+            time_start = self._clock.monotonic()
+            self._stream_writer.write(MobuMbap.build_read_request(transaction_id, unit_id, pos, count))
+            try:
+                data = await asyncio.wait_for(future, self._timeout)
+            except asyncio.TimeoutError:
+                raise FronmodException(f"read_holding_registers timeout <pos={pos}, l={count}, unit={unit_id}>!") from None
+            finally:
+                self._pending.pop(transaction_id, None)
+
+            time_response = self._clock.monotonic()
+            if self._on_response is not None:
+                self._on_response(unit_id, count, time_response - max(time_start, self._time_last_response))
+            self._time_last_response = time_response
+            return data
+
+    async def read_ranges(self, ranges: Sequence) -> List[memoryview]:
+        """
+        :param ranges: register ranges (`unit_id`, `pos`, `length`), requested concurrently (pipelined)
+        :return: register data for each range (same order)
+        """
+        return await asyncio.gather(*[self.read_holding_registers(r.unit_id, r.pos, r.length) for r in ranges])
+
+    async def _receive(self):
+        try:
+            while True:
+                header = await self._stream_reader.readexactly(MobuMbap.HEADER_SIZE)
+                transaction_id, pdu_length, unit_id = MobuMbap.parse_header(header)
+                pdu = await self._stream_reader.readexactly(pdu_length)
+
+                pending = self._pending.get(transaction_id)
+                if pending is None:
+                    _logger.warning("dropped response with unknown transaction id (%d)", transaction_id)
+                    continue
+                future, expected_unit_id, count = pending
+                if future.done():
+                    continue
+
+                try:
+                    if unit_id != expected_unit_id:
+                        raise FronmodException(f"unexpected unit id in response ({unit_id} != {expected_unit_id})!")
+                    future.set_result(MobuMbap.parse_read_response(pdu, count))
+                except FronmodException as ex:
+                    future.set_exception(ex)
+
+        except (asyncio.IncompleteReadError, OSError, FronmodException) as ex:
+            _logger.error("connection lost (%s)", ex)
+            if self._stream_writer is not None:
+                self._stream_writer.close()
+            self._fail_pending(FronmodException(f"connection lost ({ex})!"))
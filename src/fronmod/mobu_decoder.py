@@ -0,0 +1,79 @@
+import struct
+from typing import Any, List, Optional, Sequence
+
+from .fronmod_exception import FronmodException
+from .mobu import MobuBatch, MobuMask
+
+
+class MobuDecoder:
+    """
+    Decode plan of a `MobuBatch`, compiled once: all register based items are decoded by a single `struct.unpack_from`
+    over the raw register bytes.
+    """
+
+    UINT16_INVALID = 0xffff
+
+    def __init__(self, batch: MobuBatch, byteorder: str):
+        self.batch = batch
+
+        fields = []
+        for index, item in enumerate(batch.items):
+            if item.offset is None:
+                continue
+            if item.flags & MobuMask.INT16:
+                fields.append((item.offset, "h", 1, index))
+            elif item.flags & MobuMask.UINT16:
+                fields.append((item.offset, "H", 1, index))
+            elif item.flags & MobuMask.FLOAT32:
+                fields.append((item.offset, "f", 2, index))
+            elif item.flags & MobuMask.STRING8:
+                raise NotImplementedError()
+            else:
+                raise ValueError(f"no data type for item '{item.name}'!")
+        fields.sort()
+
+        struct_format = byteorder
+        position = 0
+        for offset, code, size, _ in fields:
+            if offset < position:
+                raise FronmodException(f"wrong configuration - overlapping items in batch '{batch.name}'!")
+            if offset > position:
+                struct_format += f"{(offset - position) * 2}x"
+            struct_format += code
+            position = offset + size
+        if position > batch.length:
+            raise FronmodException(f"wrong configuration - items exceed batch '{batch.name}'!")
+
+        self._byteorder = byteorder
+        self._item_count = len(batch.items)
+        self._struct = struct.Struct(struct_format)
+        self._registers_struct = struct.Struct(f"{byteorder}{batch.length}H")
+        self._indexes = tuple(index for _, _, _, index in fields)
+        self._uint16_positions = tuple(pos for pos, field in enumerate(fields) if field[1] == "H")
+
+    def to_bytes(self, registers: Sequence[int]) -> bytes:
+        if len(registers) == self.batch.length:
+            return self._registers_struct.pack(*registers)
+        return struct.pack(f"{self._byteorder}{len(registers)}H", *registers)
+
+    def decode_registers(self, registers: Sequence[int]) -> List[Optional[Any]]:
+        return self.decode(self.to_bytes(registers))
+
+    def decode(self, buffer) -> List[Optional[Any]]:
+        """:return: values aligned to `batch.items`, `None` for items without register"""
+        values = [None] * self._item_count
+        self.decode_into(buffer, values)
+        return values
+
+    def decode_into(self, buffer, values: list):
+        """Same as `decode`, but overwrites the register based values of a reusable list (others stay untouched)."""
+        try:
+            raw_values = self._struct.unpack_from(buffer)
+        except struct.error as ex:
+            raise FronmodException(f"cannot decode batch '{self.batch.name}' ({ex})!") from ex
+
+        for pos, index in enumerate(self._indexes):
+            values[index] = raw_values[pos]
+        for pos in self._uint16_positions:
+            if raw_values[pos] == self.UINT16_INVALID:
+                values[self._indexes[pos]] = 0  # strange behavior with RAW_MPPT_MOD_POWER + RAW_MPPT_BAT_POWER
@@ -0,0 +1,128 @@
+import logging
+import socket
+import struct
+from typing import Callable, List, Optional, Sequence
+
+from .fronmod_exception import FronmodException
+from src.utils.clock import Clock
+
+
+_logger = logging.getLogger(__name__)
+
+
+class MobuMbap:
+    """Modbus TCP framing (MBAP header), restricted to "read holding registers" (function code 0x03)."""
+
+    HEADER = struct.Struct(">HHHB")  # transaction id, protocol id, length, unit id
+    HEADER_SIZE = HEADER.size
+
+    PROTOCOL_ID = 0
+    FC_READ_HOLDING_REGISTERS = 0x03
+    FC_ERROR = 0x80
+
+    _READ_REQUEST = struct.Struct(">HHHBBHH")  # MBAP header + function code, start address, count
+
+    @classmethod
+    def build_read_request(cls, transaction_id: int, unit_id: int, pos: int, count: int) -> bytes:
+        return cls._READ_REQUEST.pack(transaction_id, cls.PROTOCOL_ID, 6, unit_id, cls.FC_READ_HOLDING_REGISTERS, pos, count)
+
+    @classmethod
+    def parse_header(cls, header: bytes):
+        """:return: transaction id, PDU length (without unit id), unit id"""
+        transaction_id, protocol_id, length, unit_id = cls.HEADER.unpack(header)
+        if protocol_id != cls.PROTOCOL_ID or length < 2:
+            raise FronmodException(f"invalid MBAP header ({header.hex()})!")
+        return transaction_id, length - 1, unit_id
+
+    @classmethod
+    def parse_read_response(cls, pdu: bytes, count: int) -> memoryview:
+        """:return: register data (2 bytes per register, big endian) of a "read holding registers" response PDU"""
+        function_code = pdu[0]
+        if function_code == cls.FC_READ_HOLDING_REGISTERS | cls.FC_ERROR:
+            raise FronmodException(f"read_holding_registers failed - exception code: {pdu[1] if len(pdu) > 1 else '?'}!")
+        if function_code != cls.FC_READ_HOLDING_REGISTERS:
+            raise FronmodException(f"unexpected function code ({function_code})!")
+
+        byte_count = pdu[1]
+        if byte_count != count * 2 or len(pdu) < 2 + byte_count:
+            raise FronmodException(f"unexpected response length ({byte_count} bytes, {count} registers expected)!")
+
+        return memoryview(pdu)[2:2 + byte_count]
+
+
+class MobuTransactionIds:
+    """Allocates the MBAP transaction ids of a connection (16 bit, wrapping)."""
+
+    def __init__(self):
+        self._transaction_id = 0
+
+    def next(self) -> int:
+        self._transaction_id = (self._transaction_id + 1) & 0xffff
+        return self._transaction_id
+
+
+class MobuPipeline:
+    """
+    Sends several "read holding registers" requests back to back over a (blocking) socket, without waiting for the
+    responses in between. Responses are matched by transaction id.
+    """
+
+    def __init__(self, sock: socket.socket, max_in_flight: int, next_transaction_id: Callable[[], int],
+                 on_response: Optional[Callable[[int, int, float], None]] = None, clock: Optional[Clock] = None):
+        """
+        :param on_response: called with unit id, register count and latency (seconds) of each response; the latency
+            of a request sent before the previous response arrived counts from that response on (gateway time)
+        """
+        self._socket = sock
+        self._max_in_flight = max_in_flight
+        self._next_transaction_id = next_transaction_id
+        self._on_response = on_response
+        self._clock = clock or Clock()
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise FronmodException("connection closed by remote!")
+            data += chunk
+        return bytes(data)
+
+    def read(self, requests: Sequence) -> List[memoryview]:
+        """
+        :param requests: register ranges (`unit_id`, `pos`, `length`)
+        :return: register data for each request (same order)
+        """
+        results = [None] * len(requests)
+        pending = {}  # transaction id => request index, time sent
+        next_index = 0
+        time_last = 0.0  # last response
+
+        while next_index < len(requests) or pending:
+            while next_index < len(requests) and len(pending) < self._max_in_flight:
+                request = requests[next_index]
+                transaction_id = self._next_transaction_id() & 0xffff
+                self._socket.sendall(MobuMbap.build_read_request(transaction_id, request.unit_id, request.pos, request.length))
+                pending[transaction_id] = (next_index, self._clock.monotonic())
+                next_index += 1
+
+            transaction_id, pdu_length, unit_id = MobuMbap.parse_header(self._recv_exactly(MobuMbap.HEADER_SIZE))
+            pdu = self._recv_exactly(pdu_length)
+
+            sent = pending.pop(transaction_id, None)
+            if sent is None:
+                _logger.warning("dropped response with unknown transaction id (%d)", transaction_id)
+                continue
+            index, time_sent = sent
+            request = requests[index]
+            if unit_id != request.unit_id:
+                raise FronmodException(f"unexpected unit id in response ({unit_id} != {request.unit_id})!")
+
+            results[index] = MobuMbap.parse_read_response(pdu, request.length)
+
+            time_response = self._clock.monotonic()
+            if self._on_response is not None:
+                self._on_response(unit_id, request.length, time_response - max(time_sent, time_last))
+            time_last = time_response
+
+        return results
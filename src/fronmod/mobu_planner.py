@@ -0,0 +1,268 @@
+from collections import OrderedDict
+from typing import AbstractSet, Dict, List, Sequence
+
+from .mobu import MobuBatch, MobuItem
+
+
+REGISTER_SIZE = 2  # bytes
+
+
+class MobuSpan:
+    """Registers of a batch, which have to be read (absolute position)."""
+
+    def __init__(self, batch: MobuBatch, pos: int, length: int):
+        self.batch = batch
+        self.pos = pos
+        self.length = length
+
+    def __repr__(self) -> str:
+        return '{}({},{},{})'.format(self.__class__.__name__, self.batch.name, self.pos, self.length)
+
+
+class MobuRange:
+    """Register range fetched by a single `read_holding_registers` request, serves one or more batches."""
+
+    def __init__(self, unit_id: int, pos: int, length: int, spans: List[MobuSpan]):
+        self.unit_id = unit_id
+        self.pos = pos
+        self.length = length
+        self.spans = spans
+
+    @property
+    def batches(self) -> List[MobuBatch]:
+        batches = []
+        for span in self.spans:
+            if span.batch not in batches:
+                batches.append(span.batch)
+        return batches
+
+    @property
+    def name(self):
+        return "+".join(batch.name for batch in self.batches)
+
+    def __repr__(self) -> str:
+        return '{}({},{},{})'.format(self.__class__.__name__, self.unit_id, self.pos, self.length)
+
+    def fill(self, data: bytes, batch_registers: Dict[MobuBatch, bytes]):
+        """
+        Copies the register data of the range (2 bytes per register) into the register data of the served batches.
+        Registers, which were not read, are 0.
+        """
+        for span in self.spans:
+            batch = span.batch
+            offset = (span.pos - self.pos) * REGISTER_SIZE
+            size = span.length * REGISTER_SIZE
+            if span.pos == batch.pos and span.length == batch.length:
+                batch_registers[batch] = data[offset:offset + size]
+            else:
+                target = batch_registers.get(batch)
+                if not isinstance(target, bytearray):
+                    target = bytearray(target or batch.length * REGISTER_SIZE)
+                    batch_registers[batch] = target
+                target_offset = (span.pos - batch.pos) * REGISTER_SIZE
+                target[target_offset:target_offset + size] = data[offset:offset + size]
+
+    def split(self, data: bytes) -> Dict[MobuBatch, bytes]:
+        """:return: register data of the range split back into the register data of each batch"""
+        batch_registers = {}
+        self.fill(data, batch_registers)
+        return batch_registers
+
+
+class MobuReadStats:
+    """Read requests and registers of planned reads, compared to reading each batch in full."""
+
+    def __init__(self):
+        self.requests = 0
+        self.registers = 0
+        self.requests_saved = 0
+        self.registers_saved = 0
+
+    def add(self, batches: Sequence[MobuBatch], ranges: Sequence[MobuRange]):
+        requests = len(ranges)
+        registers = sum(r.length for r in ranges)
+        self.requests += requests
+        self.registers += registers
+        self.requests_saved += len(batches) - requests
+        self.registers_saved += sum(b.length for b in batches) - registers
+
+    def __repr__(self) -> str:
+        return '{}(requests={} (saved {}), registers={} (saved {}))'.format(
+            self.__class__.__name__, self.requests, self.requests_saved, self.registers, self.registers_saved
+        )
+
+
+class MobuCostModel:
+    """Estimated costs (time) of a read request: a fixed part per request and a part per register."""
+
+    def __init__(self, request_cost: float, register_cost: float):
+        self.request_cost = request_cost
+        self.register_cost = register_cost
+
+    def get_costs(self, _unit_id: int):
+        """:return: (request_cost, register_cost) in ms"""
+        return self.request_cost, self.register_cost
+
+    def get_max_gap(self, unit_id: int) -> int:
+        """:return: max. unused registers, which are cheaper to read than an additional request"""
+        request_cost, register_cost = self.get_costs(unit_id)
+        if register_cost <= 0:
+            return MobuPlanner.MAX_REGISTERS
+        return int(min(request_cost / register_cost, MobuPlanner.MAX_REGISTERS))
+
+
+class MobuLatencyModel(MobuCostModel):
+    """
+    Cost model learned from measured read latencies: per unit an exponentially weighted linear regression
+    `latency = request_cost + register_cost * registers`. Falls back to the configured costs until enough samples exist.
+    """
+
+    DEFAULT_ALPHA = 0.05
+    MIN_SAMPLES = 10
+
+    class _UnitStats:
+        def __init__(self):
+            self.samples = 0
+            self.weight = 0.0
+            self.sum_x = 0.0
+            self.sum_y = 0.0
+            self.sum_xx = 0.0
+            self.sum_xy = 0.0
+
+    def __init__(self, request_cost: float, register_cost: float, alpha: float = DEFAULT_ALPHA):
+        super().__init__(request_cost, register_cost)
+        self._alpha = alpha
+        self._units = {}  # unit_id => _UnitStats
+
+    def observe(self, unit_id: int, registers: int, seconds: float):
+        stats = self._units.get(unit_id)
+        if stats is None:
+            stats = self._UnitStats()
+            self._units[unit_id] = stats
+
+        x = float(registers)
+        y = seconds * 1000.0  # ms
+        decay = 1.0 - self._alpha
+
+        stats.samples += 1
+        stats.weight = decay * stats.weight + self._alpha
+        stats.sum_x = decay * stats.sum_x + self._alpha * x
+        stats.sum_y = decay * stats.sum_y + self._alpha * y
+        stats.sum_xx = decay * stats.sum_xx + self._alpha * x * x
+        stats.sum_xy = decay * stats.sum_xy + self._alpha * x * y
+
+    def get_costs(self, unit_id: int):
+        """:return: (request_cost, register_cost) in ms"""
+        stats = self._units.get(unit_id)
+        if stats is None or stats.samples < self.MIN_SAMPLES:
+            return self.request_cost, self.register_cost
+
+        mean_x = stats.sum_x / stats.weight
+        mean_y = stats.sum_y / stats.weight
+        var_x = stats.sum_xx / stats.weight - mean_x * mean_x
+
+        if var_x > 1.0:
+            cov_xy = stats.sum_xy / stats.weight - mean_x * mean_y
+            register_cost = max(0.0, cov_xy / var_x)
+        else:
+            register_cost = self.register_cost  # always the same request sizes, cannot separate the costs
+        request_cost = max(0.0, mean_y - register_cost * mean_x)
+
+        return request_cost, register_cost
+
+    def __repr__(self) -> str:
+        units = []
+        for unit_id in sorted(self._units.keys()):
+            request_cost, register_cost = self.get_costs(unit_id)
+            units.append('{}: {:.1f}ms + {:.2f}ms/reg'.format(unit_id, request_cost, register_cost))
+        return '{}({})'.format(self.__class__.__name__, '; '.join(units))
+
+
+class MobuPlanner:
+    """
+    Plans the read requests for a set of batches: batches of the same unit get coalesced. In sparse mode only the registers
+    used by the items are read and split into sub-ranges, if cheaper.
+    """
+
+    MAX_REGISTERS = 125  # protocol limit of "read holding registers"
+    MAX_PLANS = 64  # cached plans (least recently used get dropped), a learning model keeps changing the max. gaps
+
+    def __init__(self, max_gap: int, max_registers: int = MAX_REGISTERS, cost_model: MobuCostModel = None, sparse=False):
+        """
+        :param max_gap: max. unused registers between coalesced batches; ignored if a cost model is given
+        :param cost_model: decides, if merging or splitting ranges is cheaper
+        :param sparse: read only registers used by items
+        """
+        self._max_gap = max_gap
+        self._max_registers = max_registers
+        self._cost_model = cost_model
+        self._sparse = sparse
+
+        self._plans = OrderedDict()  # (tuple(batches), max gaps, skip) => ranges
+
+    @property
+    def is_sparse(self):
+        return self._sparse
+
+    def get_max_gap(self, unit_id: int) -> int:
+        if self._cost_model is not None:
+            return self._cost_model.get_max_gap(unit_id)
+        return self._max_gap
+
+    def get_spans(self, batch: MobuBatch, skip: AbstractSet[MobuItem] = frozenset()) -> List[MobuSpan]:
+        """:param skip: items which need not be read (cached)"""
+        if not skip and not self._sparse:
+            return [MobuSpan(batch, batch.pos, batch.length)]
+
+        spans = []
+        for item in batch.items:
+            if item.offset is None or item in skip:
+                continue
+            spans.append(MobuSpan(batch, batch.pos + item.offset, item.width))
+
+        if spans and not self._sparse:
+            start = min(span.pos for span in spans)
+            end = max(span.pos + span.length for span in spans)
+            spans = [MobuSpan(batch, start, end - start)]  # trimmed batch
+
+        return spans
+
+    def plan(self, batches: Sequence[MobuBatch], skip: AbstractSet[MobuItem] = frozenset()) -> List[MobuRange]:
+        """:param skip: items which need not be read (cached)"""
+        max_gaps = tuple(self.get_max_gap(batch.unit_id) for batch in batches)  # a learning model changes gaps
+        key = (tuple(batches), max_gaps, skip)
+        plans = self._plans
+        ranges = plans.get(key)
+        if ranges is None:
+            ranges = self._plan(batches, skip)
+            plans[key] = ranges
+            if len(plans) > self.MAX_PLANS:
+                plans.popitem(last=False)
+        else:
+            plans.move_to_end(key)
+        return ranges
+
+    def _plan(self, batches: Sequence[MobuBatch], skip: AbstractSet[MobuItem]) -> List[MobuRange]:
+        unit_spans = {}
+        for batch in batches:
+            unit_spans.setdefault(batch.unit_id, []).extend(self.get_spans(batch, skip))
+
+        ranges = []
+        for unit_id, spans in unit_spans.items():
+            spans.sort(key=lambda s: s.pos)
+            max_gap = self.get_max_gap(unit_id)
+
+            current = None
+            for span in spans:
+                if current is not None:
+                    gap = span.pos - (current.pos + current.length)
+                    end = max(current.pos + current.length, span.pos + span.length)
+                    if gap <= max_gap and end - current.pos <= self._max_registers:
+                        current.length = end - current.pos
+                        current.spans.append(span)
+                        continue
+
+                current = MobuRange(unit_id, span.pos, span.length, [span])
+                ranges.append(current)
+
+        return ranges
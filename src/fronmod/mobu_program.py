@@ -0,0 +1,96 @@
+from typing import Callable, List, Optional, Sequence
+
+from .fronmod_exception import FronmodException
+from .mobu import MobuBatch
+
+
+class MobuFormula:
+    """
+    Derived item of a batch: `target` = `function(*sources)`. Sources are item names of the own batch or items read by
+    another batch (their last evaluated values). A failing function (e.g. by a missing value) delivers None.
+    """
+
+    def __init__(self, target: str, function: Callable, sources: Sequence[str]):
+        self.target = target
+        self.function = function
+        self.sources = tuple(sources)
+
+    def __repr__(self) -> str:
+        return '{}({}<={})'.format(self.__class__.__name__, self.target, ','.join(self.sources))
+
+
+class MobuSlots:
+    """Flat value store of all batches: each batch occupies a contiguous range of slots, in the order of its items."""
+
+    def __init__(self, batches: List[MobuBatch]):
+        self._starts = {}  # batch => first slot
+        size = 0
+        for batch in batches:
+            self._starts[batch] = size
+            size += len(batch.items)
+        self._batches = list(batches)
+        self.values = [None] * size
+
+    def get_start(self, batch: MobuBatch) -> int:
+        return self._starts[batch]
+
+    def get_slot(self, batch: MobuBatch, name: str) -> Optional[int]:
+        for index, item in enumerate(batch.items):
+            if item.name == name:
+                return self._starts[batch] + index
+        return None
+
+    def resolve(self, batch: MobuBatch, name: str) -> int:
+        """:return: slot of an item of the own batch, otherwise of the single batch which reads the item"""
+        slot = self.get_slot(batch, name)
+        if slot is not None:
+            return slot
+
+        slots = [
+            self._starts[other] + index
+            for other in self._batches if other is not batch
+            for index, item in enumerate(other.items) if item.name == name and item.offset is not None
+        ]
+        if len(slots) != 1:
+            raise FronmodException(f"wrong configuration - cannot resolve source '{name}' of batch '{batch.name}'!")
+        return slots[0]
+
+
+class MobuProgram:
+    """
+    Evaluation program of a batch, compiled once: the read values get copied into the slots of the batch, then the
+    formulas run in declaration order over precomputed slot indexes (no lookups by name).
+    """
+
+    ERRORS = (FronmodException, ArithmeticError, TypeError, ValueError)
+
+    def __init__(self, slots: MobuSlots, batch: MobuBatch, formulas: List[MobuFormula]):
+        self.batch = batch
+        self.start = slots.get_start(batch)
+        self.end = self.start + len(batch.items)
+        self.steps = []
+
+        derived = set(item.name for item in batch.items if item.offset is None)
+        for formula in formulas:
+            if formula.target not in derived:
+                raise FronmodException(f"wrong configuration - no derived item '{formula.target}' in batch '{batch.name}'!")
+            sources = tuple(slots.resolve(batch, source) for source in formula.sources)
+            self.steps.append((slots.get_slot(batch, formula.target), formula.function, sources, formula.target))
+
+    @property
+    def targets(self) -> List[str]:
+        return [step[3] for step in self.steps]
+
+    def run(self, values: list, inputs: list, on_error: Callable[[str, Exception], None]):
+        """
+        :param values: slot values (see `MobuSlots`)
+        :param inputs: values of the batch items (derived ones get overwritten)
+        :param on_error: gets target name and exception of a failed formula
+        """
+        values[self.start:self.end] = inputs
+        for target, function, sources, name in self.steps:
+            try:
+                values[target] = function(*[values[source] for source in sources])
+            except self.ERRORS as ex:
+                values[target] = None
+                on_error(name, ex)
@@ -1,13 +1,17 @@
+import asyncio
 import datetime
 import logging
 import threading
 from typing import Dict, Optional, Union
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from tzlocal import get_localzone
 
 from src.mqtt_config import MqttConfKey
-from src.utils.json_utils import JsonUtils
+from src.utils.json_utils import JsonKeyEncoder, JsonUtils
+from src.utils.payload_encoder import PayloadEncoder
 
 _logger = logging.getLogger(__name__)
 
@@ -26,6 +30,8 @@ class MqttClient:
 
     TIME_WAIT_FOR_CONNECTION = 10  # seconds
 
+    TOPIC_SUFFIX_CONTENT_TYPE = "/content-type"
+
     def __init__(self, config):
 
         self._host = None
@@ -39,6 +45,11 @@ class MqttClient:
         self._shutdown = False
 
         self._lock = threading.Lock()
+        self._state_loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._state_event = None  # type: Optional[asyncio.Event]
+        self._encoders = {}  # type: Dict[str, PayloadEncoder]
+        self._properties = {}  # type: Dict[str, Properties]
+        self._content_types = {}  # type: Dict[str, str]  # announced retained on connect (sibling topics)
 
         self._host = config[MqttConfKey.HOST]
         self._port = config.get(MqttConfKey.PORT)
@@ -48,6 +59,7 @@ class MqttClient:
         self._retain = config.get(MqttConfKey.RETAIN, True)
 
         protocol = config.get(MqttConfKey.PROTOCOL, self.DEFAULT_PROTOCOL)
+        self._protocol = protocol
         client_id = config.get(MqttConfKey.CLIENT_ID)
         ssl_ca_certs = config.get(MqttConfKey.SSL_CA_CERTS)
         ssl_certfile = config.get(MqttConfKey.SSL_CERTFILE)
@@ -82,6 +94,20 @@ class MqttClient:
         with self._lock:
             return self._is_connected
 
+    def set_state_event(self, loop: asyncio.AbstractEventLoop, event: asyncio.Event):
+        """The event gets set (within the loop) on each connection state change (connected, disconnected, failure)."""
+        self._state_loop = loop
+        self._state_event = event
+
+    def _notify_state_changed(self):
+        """called from the MQTT network thread"""
+        loop, event = self._state_loop, self._state_event
+        if loop is not None and event is not None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop closed (shutdown)
+
     def connect(self):
         self._client.connect_async(self._host, port=self._port, keepalive=self._keepalive)
         self._client.loop_start()
@@ -110,7 +136,7 @@ class MqttClient:
         if not is_connected:
             raise MqttException("MQTT is not connected!")
 
-    def set_last_will(self, topic: str, last_will: str):
+    def set_last_will(self, topic: str, last_will: Union[str, bytes]):
         if self.is_connected():
             raise MqttException("MQTT last wills must be set before connecting!")
 
@@ -121,18 +147,34 @@ class MqttClient:
             retain=self._retain
         )
 
-    def publish(self, topic: str, payload: Union[str, Dict]):
+    def set_encoder(self, topic: str, encoder: PayloadEncoder):
+        """
+        Encoder of the dict payloads of a topic (default: `JsonUtils.dumps`). Other content types than JSON get announced
+        by a retained message on a sibling topic (<topic>/content-type) and, with MQTT v5, by the content type property.
+        """
+        self._encoders[topic] = encoder
+        if encoder.CONTENT_TYPE != JsonKeyEncoder.CONTENT_TYPE:
+            self._content_types[topic + self.TOPIC_SUFFIX_CONTENT_TYPE] = encoder.CONTENT_TYPE
+            if self._protocol == mqtt.MQTTv5:
+                properties = Properties(PacketTypes.PUBLISH)
+                properties.ContentType = encoder.CONTENT_TYPE
+                self._properties[topic] = properties
+
+    def publish(self, topic: str, payload: Union[str, Dict], retain: Optional[bool] = None):
+        """:param retain: default by config"""
         if self._shutdown:
             return
 
         if isinstance(payload, dict):
-            payload = JsonUtils.dumps(payload)
+            encoder = self._encoders.get(topic)
+            payload = encoder.dumps(payload) if encoder is not None else JsonUtils.dumps(payload)
 
         result = self._client.publish(
             topic=topic,
             payload=payload,
             qos=self._qos,
-            retain=self._retain
+            retain=self._retain if retain is None else retain,
+            properties=self._properties.get(topic),
         )
 
         _logger.debug("sent - topic: '%s' | payload: '%s'", topic, payload)
@@ -146,6 +188,8 @@ class MqttClient:
             with self._lock:
                 self._is_connected = True
             _logger.debug("%s was connected.", class_name)
+            for topic, content_type in self._content_types.items():
+                self._client.publish(topic=topic, payload=content_type, qos=self._qos, retain=True)
         else:
             connection_error_info = f"{class_name} connection failed (#{rc}: {mqtt.error_string(rc)})!"
             _logger.error(connection_error_info)
@@ -153,6 +197,8 @@ class MqttClient:
                 self._is_connected = False
                 self._connection_error_info = connection_error_info
 
+        self._notify_state_changed()
+
     def _on_disconnect(self, _mqtt_client, _userdata, rc):
         """MQTT callback for when the client disconnects from the MQTT server."""
         class_name = self.__class__.__name__
@@ -170,6 +216,8 @@ class MqttClient:
         else:
             _logger.error("%s was unexpectedly disconnected: %s", class_name, connection_error_info or "???")
 
+        self._notify_state_changed()
+
     def _on_message(self, mqtt_client, userdata, mqtt_message: mqtt.MQTTMessage):
         """MQTT callback when a message is received from MQTT server"""
 
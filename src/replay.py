@@ -0,0 +1,243 @@
+import asyncio
+import datetime
+import itertools
+import logging
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.fronmod.fronmod_config import FronmodConfKey
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.fronmod_replay_reader import FronmodReplayReader
+from src.fronmod.mobu_capture import MobuCaptureReader, MobuCaptureRecord
+from src.runner import Runner
+from src.utils.clock import Clock, VirtualClock
+from src.utils.json_utils import JsonKeyEncoder, JsonUtils
+
+_logger = logging.getLogger(__name__)
+
+
+ReplayState = namedtuple('ReplayState', ['wall_ns', 'records'])
+"""End of captures: wall clock time (ns) of the last tick, latest record of each captured register range (capture order)"""
+
+
+class ReplayMqttClient:
+    """
+    Stands in for `MqttClient`: serializes the payloads the same way and hands them to `output` (optional).
+    Without `serialize` the payloads are handed over as they are (dict).
+    """
+
+    def __init__(self, output: Optional[Callable[[str, any], None]] = None, serialize: bool = True):
+        self._output = output
+        self._serialize = serialize
+        self._encoders = {}  # topic => encoder (see `MqttClient.set_encoder`)
+        self.muted = False  # discards messages (warm-up)
+        self.messages = 0
+        self.payload_bytes = 0
+
+    def set_last_will(self, topic, last_will):
+        pass
+
+    def set_state_event(self, loop, event):
+        pass
+
+    def set_encoder(self, topic: str, encoder: JsonKeyEncoder):
+        self._encoders[topic] = encoder
+
+    def connect(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def ensure_connection(self):
+        pass
+
+    def publish(self, topic: str, payload, retain=None):
+        if self.muted:
+            return
+
+        self.messages += 1
+        if self._serialize:
+            if isinstance(payload, dict):
+                encoder = self._encoders.get(topic)
+                payload = encoder.dumps(payload) if encoder is not None else JsonUtils.dumps(payload)
+            self.payload_bytes += len(payload)
+        if self._output is not None:
+            self._output(topic, payload)
+
+
+class ReplayStats:
+
+    def __init__(self, ticks: int, messages: int, payload_bytes: int, seconds: float, replayed_seconds: float):
+        self.ticks = ticks
+        self.messages = messages
+        self.payload_bytes = payload_bytes
+        self.seconds = seconds  # real time
+        self.replayed_seconds = replayed_seconds  # captured time
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return "{} ticks ({:.0f}s captured) in {:.3f}s => {:.1f} ticks/s; {} messages, {} bytes".format(
+            self.ticks, self.replayed_seconds, self.seconds, self.ticks_per_second, self.messages, self.payload_bytes
+        )
+
+
+class Replay:
+    """
+    Feeds captured register responses (see `FronmodConfKey.CAPTURE_FILE`) through the whole processing:
+    `FronmodProcessor` => `Runner` (scheduling, payload building) => JSON payloads.
+
+    The records get grouped into ticks (the reads of one captured cycle): a pause of more than `tick_gap` seconds
+    starts a new tick. Each tick runs one `Runner` cycle on a virtual clock set to the captured time, so eflow
+    integration and timestamps are re-derived as they happened.
+
+    `speed`: 1 replays in real time, N at N times the speed, None as fast as possible.
+
+    Continuation of previous captures (e.g. a backfill with one capture file per process): the records of their end
+    `state` (see `get_end_state`) are loaded into the register image and their last cycle is run without publishing,
+    so the eflow integration continues seamlessly. `flush` publishes all pending values (e.g. energy flows since the last
+    "medium" delivery) after the last tick.
+    """
+
+    DEFAULT_TICK_GAP = 2.0  # seconds
+
+    def __init__(self, paths: List[str], runner_config: Optional[dict] = None, fronmod_config: Optional[dict] = None,
+                 speed: Optional[float] = None, output: Optional[Callable[[str, any], None]] = None,
+                 tick_gap: float = DEFAULT_TICK_GAP, tz: Optional[datetime.tzinfo] = None,
+                 state: Optional[ReplayState] = None, flush: bool = False, serialize: bool = True):
+        if speed is not None and speed <= 0:
+            raise ValueError("replay speed must be positive (or None: as fast as possible)!")
+
+        self._paths = list(paths)
+        self._runner_config = runner_config or {}
+        self._fronmod_config = fronmod_config
+        self._speed = speed
+        self._output = output
+        self._tick_gap = tick_gap
+        self._tz = tz
+        self._state = state
+        self._flush = flush
+        self._serialize = serialize
+
+        self._real_clock = Clock(tz=datetime.timezone.utc)
+
+    @classmethod
+    def _iter_records(cls, paths: List[str]) -> Iterator[Tuple[int, MobuCaptureRecord]]:
+        """:return: wall clock time (ns, by the anchor of each file) and record, over all files"""
+        for path in paths:
+            capture_reader = MobuCaptureReader(path)
+            for record in capture_reader:
+                yield capture_reader.get_wall_ns(record), record
+
+    def _iter_ticks(self, paths: List[str]) -> Iterator[Tuple[int, List[MobuCaptureRecord]]]:
+        """:return: wall clock time (ns) of the first record and records of each tick"""
+        tick_gap_ns = round(self._tick_gap * 1e9)
+        tick_wall_ns, last_wall_ns, records = None, None, []
+        for wall_ns, record in self._iter_records(paths):
+            if records and not 0 <= wall_ns - last_wall_ns <= tick_gap_ns:
+                yield tick_wall_ns, records
+                records = []
+            if not records:
+                tick_wall_ns = wall_ns
+            last_wall_ns = wall_ns
+            records.append(record)
+
+        if records:
+            yield tick_wall_ns, records
+
+    def get_end_state(self) -> ReplayState:
+        """Scans the captures (no processing), so following captures can be replayed independently."""
+        wall_ns = None
+        records = {}  # (unit id, pos, register count) => latest record, in order of capture
+        for wall_ns, tick_records in self._iter_ticks(self._paths):
+            for record in tick_records:
+                key = (record.unit_id, record.pos, len(record.data))
+                records.pop(key, None)
+                records[key] = record
+
+        return ReplayState(wall_ns, list(records.values()))
+
+    @classmethod
+    def merge_end_states(cls, previous: Optional[ReplayState], state: ReplayState) -> ReplayState:
+        """:return: end state of `previous` captures followed by captures with the end `state` (scanned separately)"""
+        if previous is None:
+            return state
+        keys = set((record.unit_id, record.pos, len(record.data)) for record in state.records)
+        records = [record for record in previous.records if (record.unit_id, record.pos, len(record.data)) not in keys]
+        return ReplayState(state.wall_ns if state.wall_ns is not None else previous.wall_ns, records + state.records)
+
+    def run(self) -> ReplayStats:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self._run_async())
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    async def _run_async(self) -> ReplayStats:
+        ticks = self._iter_ticks(self._paths)
+        first = next(ticks, None)
+        if first is None:
+            _logger.warning("no captured records (%s)", self._paths)
+            return ReplayStats(0, 0, 0, 0.0, 0.0)
+
+        state = self._state
+        if state is not None and state.wall_ns > first[0]:
+            state = None  # no predecessor
+
+        base_wall_ns = first[0] if state is None else state.wall_ns
+        start = datetime.datetime.fromtimestamp(base_wall_ns / 1e9, tz=datetime.timezone.utc)
+        clock = VirtualClock(start, tz=self._tz or Clock().tz)
+
+        reader = FronmodReplayReader(self._fronmod_config, clock=clock)
+        processor = FronmodProcessor(
+            reader, clock=clock, state_texts=(self._fronmod_config or {}).get(FronmodConfKey.STATE_TEXTS)
+        )
+        mqtt_client = ReplayMqttClient(self._output, self._serialize)
+        runner = Runner(self._runner_config, mqtt_client, processor, clock=clock)
+
+        tick_count = 0
+        replayed_seconds = 0.0
+        real_start = self._real_clock.monotonic()
+        try:
+            processor.open()
+            if state is not None:
+                for record in state.records:
+                    reader.apply(record)
+                mqtt_client.muted = True
+                await runner.replay_cycle(clock.monotonic() + self._tick_gap)
+                mqtt_client.muted = False
+
+            for wall_ns, records in itertools.chain([first], ticks):
+                if runner.is_shutdown():
+                    break
+
+                replayed_seconds = (wall_ns - base_wall_ns) / 1e9
+                if self._speed is not None:
+                    delay = real_start + replayed_seconds / self._speed - self._real_clock.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                clock.set_monotonic(replayed_seconds)
+                for record in records:
+                    reader.apply(record)
+
+                # captured cycles are not exactly periodic (read latencies): deadlines within the tick gap are due
+                await runner.replay_cycle(clock.monotonic() + self._tick_gap)
+                tick_count += 1
+
+            if self._flush:
+                runner.replay_flush()
+        finally:
+            processor.close()
+
+        stats = ReplayStats(
+            tick_count, mqtt_client.messages, mqtt_client.payload_bytes, self._real_clock.monotonic() - real_start,
+            replayed_seconds
+        )
+        _logger.info("replay: %s", stats)
+        return stats
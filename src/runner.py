@@ -1,38 +1,41 @@
 import asyncio
-import copy
-import datetime
+import json
 import logging
 import signal
 import threading
 from asyncio import Task
 from collections import namedtuple
-from typing import Dict, Optional
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-from src.fronmod.fronmod_config import FronmodDelivery, FronmodConfig
+from src.fronmod.fronmod_config import FronmodConfig, FronmodDelivery
 from src.fronmod.fronmod_processor import FronmodProcessor
 from src.fronmod.mobu import MobuFlag
 from src.mqtt_client import MqttClient
+from src.runner_changes import RunnerChangeFilter, RunnerDelta
 from src.runner_config import RunnerConfKey
-from src.utils.time_utils import TimeUtils
+from src.runner_scheduler import RunnerCadence, RunnerJob, RunnerScheduler
+from src.utils.clock import Clock
+from src.utils.json_utils import JsonKeyEncoder, JsonOrjsonEncoder, orjson
+from src.utils.payload_encoder import CborKeyEncoder, MsgpackKeyEncoder, PayloadEncoder
 
 _logger = logging.getLogger(__name__)
 
 
-class RunnerDelivery:
+class RunnerDelivery(RunnerCadence):
 
-    def __init__(self, delivery: FronmodDelivery, period: float, topic: str):
+    __slots__ = ('delivery', 'flags', 'topic', 'payload_format')
+
+    def __init__(self, delivery: FronmodDelivery, flags: MobuFlag, period: float, topic: str, payload_format: str = "json"):
+        super().__init__(period)
 
         self.delivery = delivery
-        self.period = period
+        self.flags = int(flags)  # plain int mask (see `MobuMask`)
         self.topic = topic
+        self.payload_format = payload_format
 
-        self.next_trigger = TimeUtils.now()
-
-    def retrigger(self):
-        self.next_trigger = TimeUtils.now() + datetime.timedelta(seconds=self.period)
 
-
-RunnerResult = namedtuple('RunnerResult', ['topic', 'values'])
+RunnerResult = namedtuple('RunnerResult', ['topic', 'values', 'keyframe'], defaults=[None])
 
 
 class Runner:
@@ -41,37 +44,56 @@ class Runner:
     DEFAULT_DELIVERY_TIME_MEDIUM = 60
     DEFAULT_DELIVERY_TIME_SLOW = 300
     DEFAULT_FETCH_TIMEOUT = 10
+    DEFAULT_KEYFRAME_CYCLES = 30
+    DEFAULT_KEYFRAME_DELTAS = 30
 
     ROUND_FLOAT = 7
 
+    JSON_ENCODER_BUILTIN = "builtin"
+    JSON_ENCODER_ORJSON = "orjson"
+
+    FORMAT_JSON = "json"
+    FORMAT_CBOR = "cbor"
+    FORMAT_MSGPACK = "msgpack"
+
     JSON_STATUS = "status"
     JSON_TIMESTAMP = "timestamp"
 
+    TOPIC_SUFFIX_KEYFRAME = "/keyframe"  # delta mode
+
     TIME_LIMIT_MQTT_CONNECTION = 10  # seconds
 
-    def __init__(self, config: dict, mqtt_client: MqttClient, fronmod_processor: FronmodProcessor):
+    def __init__(self, config: dict, mqtt_client: MqttClient, fronmod_processor: FronmodProcessor,
+                 clock: Optional[Clock] = None):
+        self._clock = clock or Clock()
+
         # config
         self._fetch_timeout = config.get(RunnerConfKey.FETCH_TIMEOUT, self.DEFAULT_FETCH_TIMEOUT)
         self._last_will_message = config.get(RunnerConfKey.MESSAGE_LAST_WILL)
 
         self._hide_items = set(config.get(RunnerConfKey.HIDE_ITEMS, []))
-
-        tick_time = config.get(RunnerConfKey.DELIVERY_TIME_QUICK, self.DEFAULT_DELIVERY_TIME_QUICK) / FronmodConfig.TICK_COUNTER
+        self._json_encoder = config.get(RunnerConfKey.JSON_ENCODER, self.JSON_ENCODER_BUILTIN)
 
         self._quick_delivery = RunnerDelivery(
             delivery=FronmodDelivery.QUICK,
-            period=tick_time,  # used as tick time, there will be delivered after full cycle
+            flags=MobuFlag.Q_QUICK,
+            period=config.get(RunnerConfKey.DELIVERY_TIME_QUICK, self.DEFAULT_DELIVERY_TIME_QUICK),  # cycle time
             topic=config.get(RunnerConfKey.TOPIC_QUICK),
+            payload_format=config.get(RunnerConfKey.FORMAT_QUICK, self.FORMAT_JSON),
         )
         self._medium_delivery = RunnerDelivery(
-            delivery=FronmodDelivery.QUICK,
+            delivery=FronmodDelivery.MEDIUM,
+            flags=MobuFlag.Q_MEDIUM,
             period=config.get(RunnerConfKey.DELIVERY_TIME_MEDIUM, self.DEFAULT_DELIVERY_TIME_MEDIUM),
             topic=config.get(RunnerConfKey.TOPIC_MEDIUM),
+            payload_format=config.get(RunnerConfKey.FORMAT_MEDIUM, self.FORMAT_JSON),
         )
         self._slow_delivery = RunnerDelivery(
-            delivery=FronmodDelivery.QUICK,
+            delivery=FronmodDelivery.SLOW,
+            flags=MobuFlag.Q_SLOW,
             period=config.get(RunnerConfKey.DELIVERY_TIME_SLOW, self.DEFAULT_DELIVERY_TIME_SLOW),
             topic=config.get(RunnerConfKey.TOPIC_SLOW),
+            payload_format=config.get(RunnerConfKey.FORMAT_SLOW, self.FORMAT_JSON),
         )
         self._deliveries = [self._quick_delivery, self._medium_delivery, self._slow_delivery]
 
@@ -79,33 +101,144 @@ class Runner:
         self._mqtt_client = mqtt_client
         self._fronmod_processor = fronmod_processor
 
+        self._deltas = {}  # type: Dict[RunnerDelivery, RunnerDelta]
+        if config.get(RunnerConfKey.DELTA_QUICK, False):
+            self._deltas[self._quick_delivery] = RunnerDelta(
+                keyframe_deltas=config.get(RunnerConfKey.KEYFRAME_DELTAS, self.DEFAULT_KEYFRAME_DELTAS),
+                meta_keys=(self.JSON_TIMESTAMP, self.JSON_STATUS),
+            )
+        self._change_filters = {}  # type: Dict[RunnerDelivery, RunnerChangeFilter]
+        if config.get(RunnerConfKey.CHANGES_ONLY, False):
+            for delivery in self._deliveries:
+                if delivery not in self._deltas:  # deltas are change-only
+                    self._change_filters[delivery] = self._create_change_filter(delivery, config)
+
+        self._last_wills = {}  # type: Dict[str, Union[str, bytes]]  # topic => last will in the payload format of the topic
+        self._init_encoders()
+
+        self._scheduler = self._create_scheduler()
+
         self._loop = asyncio.get_event_loop()
         self._periodic_task = None  # type: Optional[Task]
-        # stretch the requests
-        self._tick_task = None  # type: Optional[Task]
-        self._tick_started = None  # type: Optional[datetime.datetime]
-        self._tick_operation = 0
+        self._cycle_task = None  # type: Optional[Task]
+        self._cycle_started = None  # type: Optional[float]
+        # wakes up the periodic loop: next deadline, cycle done or MQTT state change
+        self._wakeup = asyncio.Event()
+        self._wakeup_handle = None  # type: Optional[asyncio.TimerHandle]
 
         self._error_count_fetch_too_long = 0
+        self._shutdown = False
 
         if threading.current_thread() is threading.main_thread():
             # integration tests may run the service in a thread...
             signal.signal(signal.SIGINT, self._shutdown_signaled)
             signal.signal(signal.SIGTERM, self._shutdown_signaled)
 
+    def _get_delivery(self, flags: MobuFlag) -> RunnerDelivery:
+        for delivery in self._deliveries:
+            if delivery.flags & flags:
+                return delivery
+        raise ValueError(f"no delivery for flags ({flags})!")
+
+    def _create_scheduler(self) -> RunnerScheduler:
+        """
+        Model reads run with the cadence of their delivery flags, each delivery publishes after the evaluation of all
+        models, which provide its items.
+        """
+        scheduler = RunnerScheduler()
+
+        models = self._fronmod_processor.get_models()
+        for model in models:
+            scheduler.add_job(RunnerJob(
+                model.name, self._get_delivery(model.flags), model.inputs,
+                fetch=partial(self._fronmod_processor.read_model_async, model),
+                evaluate=partial(self._fronmod_processor.evaluate_model, model),
+            ))
+
+        for delivery in self._deliveries:
+            inputs = [model.name for model in models if any(item.flags & delivery.flags for item in model.batch.items)]
+            scheduler.add_job(RunnerJob(
+                self._get_publish_job_name(delivery), delivery, inputs, evaluate=partial(self._get_result, delivery)
+            ))
+
+        return scheduler
+
+    @classmethod
+    def _get_publish_job_name(cls, delivery: RunnerDelivery) -> str:
+        return f"publish-{delivery.delivery.value}"
+
+    def _create_encoder(self, delivery: RunnerDelivery) -> PayloadEncoder:
+        keys = FronmodConfig.get_send_keys(delivery.delivery)
+        keys.difference_update(self._hide_items)
+        keys.update((self.JSON_STATUS, self.JSON_TIMESTAMP))
+        if delivery in self._deltas:
+            keys.add(RunnerDelta.SEQUENCE_KEY)
+
+        if delivery.payload_format == self.FORMAT_CBOR:
+            return CborKeyEncoder(keys, timestamp_key=self.JSON_TIMESTAMP)
+        if delivery.payload_format == self.FORMAT_MSGPACK:
+            return MsgpackKeyEncoder(keys, timestamp_key=self.JSON_TIMESTAMP)
+
+        if self._json_encoder == self.JSON_ENCODER_ORJSON:
+            if orjson is not None:
+                return JsonOrjsonEncoder()
+            _logger.warning("package 'orjson' is not installed - using the builtin JSON encoder!")
+        return JsonKeyEncoder(keys)
+
+    def _init_encoders(self):
+        """payloads of a topic have a known key set (see `_build_payload`), their keys get pre-encoded"""
+        for delivery in self._deliveries:
+            if delivery.topic:
+                encoder = self._create_encoder(delivery)
+                self._mqtt_client.set_encoder(delivery.topic, encoder)
+                if self._last_will_message:
+                    self._last_wills[delivery.topic] = self._encode_last_will(delivery, encoder)
+                if delivery in self._deltas:
+                    self._mqtt_client.set_encoder(delivery.topic + self.TOPIC_SUFFIX_KEYFRAME, self._create_encoder(delivery))
+
+    def _encode_last_will(self, delivery: RunnerDelivery, encoder: PayloadEncoder) -> Union[str, bytes]:
+        """the configured last will (JSON) gets encoded like the other payloads of binary topics"""
+        if delivery.payload_format == self.FORMAT_JSON:
+            return self._last_will_message
+
+        try:
+            values = json.loads(self._last_will_message)
+        except ValueError:
+            values = None
+        if not isinstance(values, dict):
+            values = {self.JSON_STATUS: self._last_will_message}  # plain text
+        return encoder.dumps(values)
+
+    def _create_change_filter(self, delivery: RunnerDelivery, config: dict) -> RunnerChangeFilter:
+        # eflow items are the energy of their period (not a state)
+        always_keys = FronmodConfig.get_send_keys(delivery.delivery) - FronmodConfig.get_item_keys(delivery.delivery)
+        return RunnerChangeFilter(
+            keyframe_cycles=config.get(RunnerConfKey.KEYFRAME_CYCLES, self.DEFAULT_KEYFRAME_CYCLES),
+            deadbands=config.get(RunnerConfKey.DEADBANDS),
+            always_keys=always_keys,
+            meta_keys=(self.JSON_TIMESTAMP, self.JSON_STATUS),
+        )
+
     def _init_mqtt_client(self):
-        if self._last_will_message:
-            for delivery in self._deliveries:
-                if delivery.topic:
-                    self._mqtt_client.set_last_will(delivery.topic, self._last_will_message)
+        for topic, last_will in self._last_wills.items():
+            self._mqtt_client.set_last_will(topic, last_will)
 
+        self._mqtt_client.set_state_event(self._loop, self._wakeup)
         self._mqtt_client.connect()
 
     def _shutdown_signaled(self, sig, _frame):
         _logger.info("shutdown signaled (%s)", sig)
+        self.shutdown()
+
+    def shutdown(self):
+        """Stops `run` (signal handler, end of a simulation)."""
+        self._shutdown = True
         if self._periodic_task:
             self._periodic_task.cancel()
 
+    def is_shutdown(self) -> bool:
+        return self._shutdown
+
     def run(self):
         """endless loop"""
 
@@ -119,8 +252,16 @@ class Runner:
         except asyncio.CancelledError:
             _logger.info("canceling...")
         finally:
+            self._cancel_cycle()
             self.close()
 
+    def _cancel_cycle(self):
+        task = self._cycle_task
+        if task is not None and not task.done():
+            task.cancel()
+            self._loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        self._cycle_task = None
+
     async def _wait_for_mqtt_connection_timeout(self, timeout):
         try:
             return await asyncio.wait_for(self._wait_for_mqtt_connection(), timeout)
@@ -129,157 +270,170 @@ class Runner:
 
     async def _wait_for_mqtt_connection(self):
         while True:
+            self._wakeup.clear()
             if self._mqtt_client.is_connected():
                 break
 
-            await asyncio.sleep(0.1)
+            await self._wakeup.wait()  # MQTT state change
 
     async def _periodic(self):
         await self._wait_for_mqtt_connection_timeout(self.TIME_LIMIT_MQTT_CONNECTION)
 
         while True:
-            if TimeUtils.now() >= self._quick_delivery.next_trigger:
-                self._run_next_tick()
-            else:
-                self._mqtt_client.ensure_connection()
-
-            await asyncio.sleep(0.1)
-
-    def _run_next_tick(self):
-        """the goal of all this magic is to stretch the requests."""
-        if self._tick_task:
-            if not self._tick_task.done():
-                return  # task not done, wait for next loop
+            self._wakeup.clear()
             self._handle_results()
-        assert self._tick_task is None
-
-        task = None
-        if self._tick_operation == 0:
-            task = self._process_tick_0
-        elif self._tick_operation == 1:
-            task = self._process_tick_1
-        elif self._tick_operation == 2:
-            task = self._process_tick_2
-        elif self._tick_operation == 3:
-            task = self._process_tick_3
-        elif self._tick_operation == 4:
-            task = self._process_tick_4
-
-        assert 4 == FronmodConfig.TICK_COUNTER
-
-        if task:
-            self._tick_task = self._loop.create_task(self._process_tick_timeout(task))  # type: Task
-            self._tick_started = TimeUtils.now()
-
-        self._quick_delivery.retrigger()
-
-        self._tick_operation += 1
-        if self._tick_operation > FronmodConfig.TICK_COUNTER:
-            self._tick_operation = 0
-
-    async def _process_tick_timeout(self, tick_func, timeout=None):
+            self._mqtt_client.ensure_connection()
+
+            if self._cycle_task is None:
+                now = self._clock.monotonic()
+                if self._scheduler.is_due(now):
+                    self._run_cycle(now)
+                else:
+                    self._set_wakeup(now, self._scheduler.get_next_deadline())
+
+            await self._wakeup.wait()
+
+    def _set_wakeup(self, now: float, deadline: Optional[float]):
+        """Sleeps until the deadline (monotonic clock), if nothing else happens before."""
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+            self._wakeup_handle = None
+        if deadline is not None:
+            self._wakeup_handle = self._loop.call_at(self._loop.time() + deadline - now, self._wakeup.set)
+
+    def _run_cycle(self, now: float):
+        jobs = self._scheduler.start_cycle(now)
+        self._cycle_task = self._loop.create_task(self._process_cycle_timeout(jobs))  # type: Task
+        self._cycle_task.add_done_callback(lambda _task: self._wakeup.set())
+        self._cycle_started = now
+
+    async def _process_cycle_timeout(self, jobs: List[RunnerJob], timeout=None):
         timeout = timeout or self._fetch_timeout
         try:
-            self._tick_started = TimeUtils.now()
-            return await asyncio.wait_for(tick_func(), timeout)
+            return await asyncio.wait_for(self._process_cycle(jobs), timeout)
         except asyncio.exceptions.TimeoutError:
             raise asyncio.exceptions.TimeoutError("timeout ({:.1f}s) - abort!".format(timeout))
 
-    async def _process_tick_0(self):
-        self._fronmod_processor.process_inverter_model()  # must be first
-        # no return value
-
-    async def _process_tick_1(self):
-        # depends on _process_tick_0
-        self._fronmod_processor.process_mppt_model()
-        # no return value
-
-    async def _process_tick_2(self):
-        # depends on _process_tick_1
-        self._fronmod_processor.process_meter_model()
-        values = self._fronmod_processor.get_send_data(MobuFlag.Q_QUICK)
-        # values = {"values": "quick"}
-        return RunnerResult(topic=self._quick_delivery.topic, values=values)
-
-    async def _process_tick_3(self):
-        now = TimeUtils.now()
-        if now < self._medium_delivery.next_trigger:
-            return
-        self._medium_delivery.retrigger()
-
-        values = self._fronmod_processor.get_send_data(MobuFlag.Q_MEDIUM)
-        # values = {"values": "medium......"}
-        return RunnerResult(topic=self._medium_delivery.topic, values=values)
-
-    async def _process_tick_4(self):
-        now = TimeUtils.now()
-        if now < self._slow_delivery.next_trigger:
-            return
-        self._slow_delivery.retrigger()
+    async def _process_cycle(self, jobs: List[RunnerJob]) -> List[RunnerResult]:
+        # coalesced or pipelined reads of the cycle
+        models = self._fronmod_processor.get_models()
+        job_names = set(job.name for job in jobs)
+        await self._fronmod_processor.prefetch_async([model.batch for model in models if model.name in job_names])
+
+        results = await self._scheduler.run_async(jobs)
+        publish_job_names = [self._get_publish_job_name(delivery) for delivery in self._deliveries]
+        return [results[name] for name in publish_job_names if name in results]
+
+    async def replay_cycle(self, now: float):
+        """
+        Runs the jobs due at `now` (monotonic clock) and publishes their results right away. Drives replays, which
+        run the cycles by the captured data instead of the own deadlines (no timeout, no overrun handling).
+        """
+        jobs = self._scheduler.start_cycle(now)
+        if jobs:
+            for result in await self._process_cycle(jobs):
+                self._publish_result(result)
+
+    def replay_flush(self):
+        """Publishes the pending values of all deliveries (end of a replay)."""
+        for delivery in self._deliveries:
+            self._publish_result(self._get_result(delivery))
+
+    def _get_result(self, delivery: RunnerDelivery, _data=None):
+        values = self._build_payload(self._fronmod_processor.pop_send_data(delivery.flags))
+        change_filter = self._change_filters.get(delivery)
+        if change_filter is not None:
+            values = change_filter.filter(values)
+        keyframe = None
+        delta = self._deltas.get(delivery)
+        if delta is not None:
+            values, keyframe = delta.next(values)
+        if delivery is self._quick_delivery:
+            _logger.debug("modbus reads of cycle: %s", self._fronmod_processor.pop_read_stats())
+        return RunnerResult(topic=delivery.topic, values=values, keyframe=keyframe)
+
+    def _build_payload(self, items: Iterable[Tuple[str, any]]) -> Optional[Dict[str, any]]:
+        """
+        Assembles the payload in a single pass over the items: rounds floats, drops hidden items, adds timestamp and
+        status. :return: None if there are no items
+        """
+        payload = {}
+        has_items = False
+        hide_items = self._hide_items
+        round_float = self.ROUND_FLOAT
+        for key, value in items:
+            has_items = True
+            if key in hide_items:
+                continue
+            if isinstance(value, float):
+                value = round(value, round_float)
+            payload[key] = value
 
-        self._fronmod_processor.process_storage_model()
-        values = self._fronmod_processor.get_send_data(MobuFlag.Q_SLOW)
-        # values = {"values": "slow................."}
-        return RunnerResult(topic=self._slow_delivery.topic, values=values)
+        if not has_items:
+            return None
+        if not payload.get(self.JSON_TIMESTAMP) and self.JSON_TIMESTAMP not in hide_items:
+            payload[self.JSON_TIMESTAMP] = self._clock.now(True).isoformat()
+        if not payload.get(self.JSON_STATUS) and self.JSON_STATUS not in hide_items:
+            payload[self.JSON_STATUS] = "ok"
+        return payload
 
     def _sent_failure(self):
         values = {
             self.JSON_STATUS: "error",
-            self.JSON_TIMESTAMP: TimeUtils.now(True).isoformat()
+            self.JSON_TIMESTAMP: self._clock.now(True).isoformat()
         }
 
         for delivery in self._deliveries:
             self._mqtt_client.publish(topic=delivery.topic, payload=values)
+        for change_filter in self._change_filters.values():
+            change_filter.reset()  # keyframes after the failure
+        for delta in self._deltas.values():
+            delta.reset()
 
     def _handle_results(self):
-        if not self._tick_task or not self._tick_task.done():
+        if not self._cycle_task or not self._cycle_task.done():
             return
 
         try:
-            result = self._tick_task.result()  # may raise exception from task
-            self._tick_task.cancel()
-            task_time_used = (TimeUtils.now() - self._tick_started).total_seconds()
+            results = self._cycle_task.result()  # may raise exception from task
+            task_time_used = self._clock.monotonic() - self._cycle_started
         except Exception:
             self._sent_failure()
             raise
         finally:
-            self._tick_task = None
-            self._tick_started = None
+            self._cycle_task = None
+            self._cycle_started = None
 
-        if task_time_used >= self._quick_delivery.period + 0.5:  # as task get checked at concrete time intervals
+        if task_time_used >= self._quick_delivery.period:
             self._error_count_fetch_too_long += 1
             if self._error_count_fetch_too_long < 50:
                 _logger.warning(
-                    "fetching data took too long - wrong timing (?): duration=%.1fs; max-expected=%.1fs (quick-time / %d); timeout=%.1fs",
-                    task_time_used, self._quick_delivery.period, FronmodConfig.TICK_COUNTER, self._fetch_timeout,
+                    "fetching data took too long - wrong timing (?): duration=%.1fs; max-expected=%.1fs (quick-time); timeout=%.1fs",
+                    task_time_used, self._quick_delivery.period, self._fetch_timeout,
                 )
             elif self._error_count_fetch_too_long % 50 == 0:
                 _logger.warning("fetching data took too long - too many errors. these errors are now disabled!")
 
+        for result in results:
+            self._publish_result(result)
+
+    def _publish_result(self, result: RunnerResult):
         if not result:
             return
         if not result.values:
             return
 
-        values = Runner.round_floats(result.values)
-
-        if not values.get(self.JSON_TIMESTAMP):
-            values[self.JSON_TIMESTAMP] = TimeUtils.now(True).isoformat()
-        if not values.get(self.JSON_STATUS):
-            values[self.JSON_STATUS] = "ok"
-
-        for hide_item in self._hide_items:
-            values.pop(hide_item, None)
-
-        self._mqtt_client.publish(topic=result.topic, payload=values)
+        self._mqtt_client.publish(topic=result.topic, payload=result.values)  # see `_build_payload`
+        if result.keyframe:
+            self._mqtt_client.publish(topic=result.topic + self.TOPIC_SUFFIX_KEYFRAME, payload=result.keyframe, retain=True)
 
     def close(self):
+        self._set_wakeup(0, None)
+
         if self._mqtt_client is not None:
             try:
-                if self._last_will_message:
-                    for delivery in self._deliveries:
-                        if delivery.topic:
-                            self._mqtt_client.publish(topic=delivery.topic, payload=self._last_will_message)
+                for topic, last_will in self._last_wills.items():
+                    self._mqtt_client.publish(topic=topic, payload=last_will)
             except Exception as ex:
                 _logger.error("could not publish the final service messages! %s", ex)
 
@@ -290,10 +444,4 @@ class Runner:
         if values is None:
             return values
 
-        values = copy.deepcopy(values)
-
-        for key, value in values.items():
-            if isinstance(value, float):
-                values[key] = round(value, cls.ROUND_FLOAT)
-
-        return values
+        return {key: round(value, cls.ROUND_FLOAT) if isinstance(value, float) else value for key, value in values.items()}
@@ -0,0 +1,139 @@
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+
+class RunnerChangeFilter:
+    """
+    Change-only publishing of a topic: items get dropped while their value stays within its deadband of the last
+    published value (no deadband: unchanged value). Every `keyframe_cycles` cycle publishes all items (keyframe), so
+    the state can be rebuilt by the retained/last messages.
+
+    `always_keys` are published whenever they occur (e.g. energy of the period), `meta_keys` (timestamp, status) get
+    published with changed items only. A cycle without changed items publishes nothing.
+    """
+
+    __slots__ = ('keyframe_cycles', '_deadbands', '_always_keys', '_meta_keys', '_last', '_cycle')
+
+    _NUMBERS = (int, float)  # not bool
+
+    def __init__(self, keyframe_cycles: int, deadbands: Optional[Dict[str, Union[float, str]]] = None,
+                 always_keys: Iterable[str] = (), meta_keys: Iterable[str] = ()):
+        self.keyframe_cycles = max(1, keyframe_cycles)
+        self._deadbands = {key: self.parse_deadband(deadband) for key, deadband in (deadbands or {}).items()}
+        self._always_keys = frozenset(always_keys)
+        self._meta_keys = frozenset(meta_keys)
+        self._last = {}  # type: Dict[str, any]  # last published values
+        self._cycle = 0
+
+    @classmethod
+    def parse_deadband(cls, deadband: Union[float, str]) -> Tuple[float, float]:
+        """:return: absolute, relative deadband; a string "<number>%" is relative to the last published value"""
+        if isinstance(deadband, str):
+            text = deadband.strip()
+            if not text.endswith("%"):
+                raise ValueError(f"wrong deadband '{deadband}' (number or '<number>%' expected)!")
+            return 0.0, float(text[:-1]) / 100.0
+        return float(deadband), 0.0
+
+    def reset(self):
+        """next cycle publishes a keyframe"""
+        self._cycle = 0
+
+    def filter(self, payload: Optional[Dict[str, any]]) -> Optional[Dict[str, any]]:
+        """:return: payload with the changed items; None if nothing changed"""
+        if not payload:
+            return payload
+
+        last = self._last
+        if self._cycle % self.keyframe_cycles == 0:
+            self._cycle = 1
+            last.update(payload)
+            return payload
+        self._cycle += 1
+
+        deadbands = self._deadbands
+        always_keys = self._always_keys
+        meta_keys = self._meta_keys
+        changes = {}
+        changed = False
+        for key, value in payload.items():
+            if key in meta_keys:
+                changes[key] = value
+                continue
+            if key not in always_keys and key in last:
+                last_value = last[key]
+                deadband = deadbands.get(key)
+                if deadband is not None and value.__class__ in self._NUMBERS and last_value.__class__ in self._NUMBERS:
+                    if abs(value - last_value) <= max(deadband[0], deadband[1] * abs(last_value)):
+                        continue
+                elif value == last_value and value.__class__ is last_value.__class__:
+                    continue
+            changes[key] = value
+            last[key] = value
+            changed = True
+
+        return changes if changed else None
+
+
+class RunnerDelta:
+    """
+    Delta mode of a topic: a message carries the items whose value changed since their last publish, the meta items
+    and a sequence number (`SEQUENCE_KEY`). Every `keyframe_deltas` deltas (and with the first one) a keyframe gets
+    published too: all items as last published, with the sequence number of the delta it includes.
+
+    Consumers rebuild the state exactly by applying the deltas in sequence to the last keyframe; a gap in the sequence
+    means to wait for the next keyframe. The sequence continues as long as the process runs (e.g. MQTT reconnects).
+    """
+
+    SEQUENCE_KEY = "seq"
+
+    __slots__ = ('keyframe_deltas', '_meta_keys', '_last', '_sequence', '_keyframe_due')
+
+    def __init__(self, keyframe_deltas: int, meta_keys: Iterable[str] = ()):
+        self.keyframe_deltas = max(1, keyframe_deltas)
+        self._meta_keys = frozenset(meta_keys)
+        self._last = {}  # type: Dict[str, any]  # last published values (state)
+        self._sequence = 0
+        self._keyframe_due = True
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    def reset(self):
+        """next delta comes with a keyframe"""
+        self._keyframe_due = True
+
+    def next(self, payload: Optional[Dict[str, any]]) -> Tuple[Optional[Dict[str, any]], Optional[Dict[str, any]]]:
+        """:return: delta (None if nothing changed), keyframe (None if not due)"""
+        if not payload:
+            return None, None
+
+        last = self._last
+        meta_keys = self._meta_keys
+        delta = {}
+        meta = {}
+        for key, value in payload.items():
+            if key in meta_keys:
+                meta[key] = value
+                continue
+            if key in last:
+                last_value = last[key]
+                if value == last_value and value.__class__ is last_value.__class__:
+                    continue
+            delta[key] = value
+            last[key] = value
+
+        if not delta:
+            return None, None
+
+        self._sequence += 1
+        delta.update(meta)
+        delta[self.SEQUENCE_KEY] = self._sequence
+
+        keyframe = None
+        if self._keyframe_due or self._sequence % self.keyframe_deltas == 0:
+            self._keyframe_due = False
+            keyframe = dict(last)
+            keyframe.update(meta)
+            keyframe[self.SEQUENCE_KEY] = self._sequence
+        return delta, keyframe
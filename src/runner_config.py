@@ -15,6 +15,18 @@ class RunnerConfKey:
 
     HIDE_ITEMS = "hide_items"
 
+    JSON_ENCODER = "json_encoder"
+    FORMAT_QUICK = "format_quick"
+    FORMAT_MEDIUM = "format_medium"
+    FORMAT_SLOW = "format_slow"
+
+    CHANGES_ONLY = "changes_only"
+    KEYFRAME_CYCLES = "keyframe_cycles"
+    DEADBANDS = "deadbands"
+
+    DELTA_QUICK = "delta_quick"
+    KEYFRAME_DELTAS = "keyframe_deltas"
+
 
 RUNNER_JSONSCHEMA = {
     "type": "object",
@@ -63,6 +75,58 @@ RUNNER_JSONSCHEMA = {
             "description": "Topic for items: " + FronmodConfig.list_items(FronmodDelivery.SLOW)
         },
 
+        RunnerConfKey.JSON_ENCODER: {
+            "type": "string",
+            "enum": ["builtin", "orjson"],
+            "description": "Payload encoder: 'builtin' (default) or 'orjson' (optional package, compact output)."
+        },
+        RunnerConfKey.FORMAT_QUICK: {
+            "type": "string",
+            "enum": ["json", "cbor", "msgpack"],
+            "description": "Payload format of topic_quick: 'json' (default), 'cbor' or 'msgpack' (binary timestamp)."
+        },
+        RunnerConfKey.FORMAT_MEDIUM: {
+            "type": "string",
+            "enum": ["json", "cbor", "msgpack"],
+            "description": "Payload format of topic_medium: 'json' (default), 'cbor' or 'msgpack' (binary timestamp)."
+        },
+        RunnerConfKey.FORMAT_SLOW: {
+            "type": "string",
+            "enum": ["json", "cbor", "msgpack"],
+            "description": "Payload format of topic_slow: 'json' (default), 'cbor' or 'msgpack' (binary timestamp)."
+        },
+
+        RunnerConfKey.CHANGES_ONLY: {
+            "type": "boolean",
+            "description": "Publishes changed items only (see 'deadbands'), all items with each keyframe (default: false)."
+        },
+        RunnerConfKey.KEYFRAME_CYCLES: {
+            "type": "integer",
+            "minimum": 1,
+            "description": "Publishes all items every n-th cycle of a topic (changes_only; default: 30)."
+        },
+        RunnerConfKey.DEADBANDS: {
+            "type": "object",
+            "additionalProperties": {
+                "oneOf": [
+                    {"type": "number", "minimum": 0},
+                    {"type": "string", "pattern": "^[0-9]+(\\.[0-9]+)?%$"},
+                ]
+            },
+            "description": "Item changes within deadbands are not published (changes_only): absolute (number) or relative ('1.5%')."
+        },
+
+        RunnerConfKey.DELTA_QUICK: {
+            "type": "boolean",
+            "description": "Delta mode of topic_quick: changed items with sequence number 'seq', keyframes retained on "
+                           "<topic_quick>/keyframe (default: false)."
+        },
+        RunnerConfKey.KEYFRAME_DELTAS: {
+            "type": "integer",
+            "minimum": 1,
+            "description": "Publishes a keyframe every n-th delta (delta_quick; default: 30)."
+        },
+
     },
     "additionalProperties": False,
     "required": [],
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+_logger = logging.getLogger(__name__)
+
+
+class RunnerCadence:
+    """Periodic trigger (e.g. of a delivery) on the monotonic clock (`loop.time()`, seconds); due at first."""
+
+    __slots__ = ('period', 'next_trigger')
+
+    def __init__(self, period: float):
+        self.period = period
+        self.next_trigger = 0.0
+
+    def is_due(self, now: float) -> bool:
+        return now >= self.next_trigger
+
+    def retrigger(self, now: float):
+        self.next_trigger = now + self.period
+
+
+class RunnerJob:
+    """
+    Node of the scheduler graph.
+
+    `fetch` (e.g. a Modbus read) has no dependencies and starts right away with the cycle, `evaluate` gets the fetched
+    data and waits for the evaluation of all `inputs` (job names). The result of `evaluate` is the result of the job.
+    """
+
+    def __init__(self, name: str, cadence: RunnerCadence, inputs: Sequence[str] = (),
+                 fetch: Optional[Callable[[], Awaitable[any]]] = None, evaluate: Optional[Callable[[any], any]] = None):
+        self.name = name
+        self.cadence = cadence
+        self.inputs = list(inputs)
+        self.fetch = fetch
+        self.evaluate = evaluate
+
+    def __repr__(self) -> str:
+        return '{}({})'.format(self.__class__.__name__, self.name)
+
+
+class RunnerScheduler:
+    """
+    Runs the due jobs of a cycle: all fetches in parallel, evaluations in dependency order.
+
+    A job is due by its cadence or as (transitive) input of a due job.
+    """
+
+    def __init__(self):
+        self._jobs = {}  # type: Dict[str, RunnerJob]
+        self._deadlines = []  # heap of (next trigger, seq, cadence); outdated entries are dropped lazily
+        self._deadline_seq = itertools.count()
+        self._cadences = {}  # id => cadence
+
+    @property
+    def jobs(self) -> List[RunnerJob]:
+        return list(self._jobs.values())
+
+    def add_job(self, job: RunnerJob):
+        if job.name in self._jobs:
+            raise ValueError(f"duplicate job name ({job.name})!")
+        for name in job.inputs:
+            if name not in self._jobs:
+                raise ValueError(f"unknown input '{name}' of job '{job.name}' (inputs must be added first)!")
+        self._jobs[job.name] = job
+
+        if id(job.cadence) not in self._cadences:
+            self._cadences[id(job.cadence)] = job.cadence
+            self._push_deadline(job.cadence)
+
+    def _push_deadline(self, cadence: RunnerCadence):
+        heapq.heappush(self._deadlines, (cadence.next_trigger, next(self._deadline_seq), cadence))
+
+    def get_next_deadline(self) -> Optional[float]:
+        """:return: next trigger time of all cadences (monotonic clock)"""
+        while self._deadlines:
+            deadline, _, cadence = self._deadlines[0]
+            if deadline == cadence.next_trigger:
+                return deadline
+            heapq.heappop(self._deadlines)
+        return None
+
+    def is_due(self, now: float) -> bool:
+        deadline = self.get_next_deadline()
+        return deadline is not None and now >= deadline
+
+    def get_due_jobs(self, now: float) -> List[RunnerJob]:
+        """:return: due jobs including their inputs, in declaration order"""
+        names = set()
+        pending = [job for job in self._jobs.values() if job.cadence.is_due(now)]
+        while pending:
+            job = pending.pop()
+            if job.name not in names:
+                names.add(job.name)
+                pending.extend(self._jobs[name] for name in job.inputs)
+
+        return [job for job in self._jobs.values() if job.name in names]
+
+    def start_cycle(self, now: float) -> List[RunnerJob]:
+        """:return: due jobs; their cadences are retriggered"""
+        jobs = self.get_due_jobs(now)
+        for cadence in {id(job.cadence): job.cadence for job in jobs if job.cadence.is_due(now)}.values():
+            cadence.retrigger(now)
+            self._push_deadline(cadence)
+        return jobs
+
+    @classmethod
+    async def run_async(cls, jobs: List[RunnerJob]) -> Dict[str, any]:
+        """
+        Runs the jobs (as returned by `start_cycle`); the first failure cancels the others and is raised.
+
+        :return: results by job name
+        """
+        fetch_tasks = {}
+        for job in jobs:
+            if job.fetch is not None:
+                fetch_tasks[job.name] = asyncio.ensure_future(job.fetch())
+
+        job_tasks = {}  # type: Dict[str, asyncio.Future]
+        for job in jobs:  # inputs precede in declaration order
+            input_tasks = [job_tasks[name] for name in job.inputs]
+            job_tasks[job.name] = asyncio.ensure_future(cls._run_job(job, fetch_tasks.get(job.name), input_tasks))
+
+        tasks = list(fetch_tasks.values()) + list(job_tasks.values())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)  # only the first failure is raised
+
+        return {name: task.result() for name, task in job_tasks.items()}
+
+    @classmethod
+    async def _run_job(cls, job: RunnerJob, fetch_task: Optional[asyncio.Future], input_tasks: List[asyncio.Future]):
+        if input_tasks:
+            await asyncio.gather(*input_tasks)
+        data = await fetch_task if fetch_task is not None else None
+        if job.evaluate is None:
+            return data
+        return job.evaluate(data)
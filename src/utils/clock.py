@@ -0,0 +1,76 @@
+import datetime
+import time
+from typing import Optional
+
+from tzlocal import get_localzone
+
+
+class Clock:
+    """
+    Time source of the service: monotonic time for scheduling and integration (immune to NTP steps and DST changes),
+    wall-clock time for timestamps only. The local timezone is looked up once.
+
+    Injectable; tests and replays use `VirtualClock`.
+    """
+
+    def __init__(self, tz: Optional[datetime.tzinfo] = None):
+        self._tz = tz or get_localzone()
+
+    @property
+    def tz(self) -> datetime.tzinfo:
+        return self._tz
+
+    def monotonic_ns(self) -> int:
+        return time.monotonic_ns()
+
+    def monotonic(self) -> float:
+        """:return: seconds"""
+        return self.monotonic_ns() / 1e9
+
+    def time_ns(self) -> int:
+        """:return: wall-clock time (ns since epoch)"""
+        return time.time_ns()
+
+    def now(self, no_ms=False) -> datetime.datetime:
+        """:return: wall-clock time (aware, local timezone)"""
+        now = datetime.datetime.now(tz=self._tz)
+        if no_ms:
+            now = now.replace(microsecond=0)
+        return now
+
+
+class VirtualClock(Clock):
+    """Clock, which only moves by `advance`/`set_monotonic`; the wall-clock time moves along."""
+
+    def __init__(self, start: Optional[datetime.datetime] = None, tz: Optional[datetime.tzinfo] = None):
+        super().__init__(tz or (start.tzinfo if start is not None and start.tzinfo else datetime.timezone.utc))
+        if start is None:
+            start = datetime.datetime(2020, 1, 1, tzinfo=self.tz)
+        elif start.tzinfo is None:
+            start = start.replace(tzinfo=self.tz)
+
+        self._start = start
+        self._monotonic_ns = 0
+
+    def monotonic_ns(self) -> int:
+        return self._monotonic_ns
+
+    def time_ns(self) -> int:
+        return round(self._start.timestamp() * 1e6) * 1000 + self._monotonic_ns
+
+    def now(self, no_ms=False) -> datetime.datetime:
+        now = (self._start + datetime.timedelta(microseconds=self._monotonic_ns // 1000)).astimezone(self.tz)
+        if no_ms:
+            now = now.replace(microsecond=0)
+        return now
+
+    def advance(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("a clock cannot go back!")
+        self._monotonic_ns += round(seconds * 1e9)
+
+    def set_monotonic(self, seconds: float):
+        """Moves the clock forward to `seconds` (monotonic), if not already beyond."""
+        monotonic_ns = round(seconds * 1e9)
+        if monotonic_ns > self._monotonic_ns:
+            self._monotonic_ns = monotonic_ns
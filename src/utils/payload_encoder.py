@@ -0,0 +1,290 @@
+import datetime
+import struct
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional, Union
+
+from src.utils.json_utils import JsonKeyEncoder
+
+
+class BinaryKeyEncoder(ABC):
+    """
+    Base of the binary encoders (CBOR, MessagePack) for payloads with a known key set (see `JsonKeyEncoder`): the map
+    keys get pre-encoded and written in sorted order, the encoded items get reused while their values do not change.
+    The value of `timestamp_key` (ISO format) gets encoded as binary timestamp.
+    """
+
+    CONTENT_TYPE = None  # type: str
+    FLOAT32_HEAD = None  # type: bytes
+    FLOAT64_HEAD = None  # type: bytes
+
+    EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    _MISSING = object()
+    _FLOAT32 = struct.Struct(">f")
+    _FLOAT64 = struct.Struct(">d")
+
+    def __init__(self, keys: Iterable[str], timestamp_key: Optional[str] = None):
+        self._timestamp_key = timestamp_key
+        self._fragments = tuple((key, self.encode_str(key)) for key in sorted(set(keys)))
+        self._items = {}  # last encoded item by key: class, value, bytes
+        self._minute = ("-", "-", 0)  # last timestamp: up to the minute, UTC offset, epoch seconds of the minute
+
+    def dumps(self, data) -> bytes:
+        if data.__class__ is not dict:
+            return self.encode_value(data)
+
+        missing = self._MISSING
+        items = self._items
+        timestamp_key = self._timestamp_key
+        parts = []
+        for key, fragment in self._fragments:
+            value = data.get(key, missing)
+            if value is missing:
+                continue
+
+            value_class = value.__class__
+            item = items.get(key)
+            if item is not None and item[0] is value_class and item[1] == value:
+                parts.append(item[2])
+                continue
+
+            if key == timestamp_key and value_class is str:
+                encoded = fragment + self.encode_timestamp_text(value)
+            else:
+                encoded = fragment + self.encode_value(value)
+            parts.append(encoded)
+            if value or value_class is not float:  # 0.0 == -0.0
+                items[key] = (value_class, value, encoded)
+
+        if len(parts) != len(data):
+            return self.encode_value(data)  # unknown keys
+        return self.encode_map_header(len(parts)) + b"".join(parts)
+
+    def encode_value(self, value) -> bytes:
+        value_class = value.__class__
+        if value_class is float:
+            return self.encode_float(value)
+        if value_class is str:
+            return self.encode_str(value)
+        if value_class is int:
+            return self.encode_int(value)
+        if value is None:
+            return self.encode_none()
+        if value is True or value is False:
+            return self.encode_bool(value)
+        if isinstance(value, int):
+            return self.encode_int(int(value))
+        if isinstance(value, float):
+            return self.encode_float(float(value))
+        if isinstance(value, str):
+            return self.encode_str(str(value))
+        if isinstance(value, dict):
+            return self.encode_map_header(len(value)) + b"".join(
+                self.encode_value(key) + self.encode_value(item) for key, item in sorted(value.items())
+            )
+        if isinstance(value, (list, tuple)):
+            return self.encode_array_header(len(value)) + b"".join(self.encode_value(item) for item in value)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return self.encode_str(value.isoformat())  # like `JsonUtils.dumps`
+
+        raise TypeError(f"Type '{type(value)}' is not serializable!")
+
+    def encode_timestamp_text(self, text: str) -> bytes:
+        """ISO format; timestamps without fraction ("YYYY-MM-DDTHH:MM:SS+HH:MM") get resolved per minute (cached)"""
+        minute, offset, seconds = self._minute
+        if len(text) == 25 and text.startswith(minute) and text.endswith(offset) and text[17:19].isdigit() and text[17:19] < "60":
+            return self.encode_timestamp(seconds + int(text[17:19]), 0)
+
+        try:
+            time = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return self.encode_str(text)
+        if time.tzinfo is None:
+            time = time.astimezone()  # local time
+
+        delta = time - self.EPOCH
+        seconds = delta.days * 86400 + delta.seconds
+        if len(text) == 25 and text[19] in "+-":
+            self._minute = (text[:17], text[19:], seconds - time.second)
+        return self.encode_timestamp(seconds, delta.microseconds * 1000)
+
+    def encode_float(self, value: float) -> bytes:
+        """:return: 32 bit float if lossless, otherwise 64 bit"""
+        try:
+            packed = self._FLOAT32.pack(value)
+            if self._FLOAT32.unpack(packed)[0] == value:
+                return self.FLOAT32_HEAD + packed
+        except OverflowError:
+            pass
+        return self.FLOAT64_HEAD + self._FLOAT64.pack(value)
+
+    @abstractmethod
+    def encode_int(self, value: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_str(self, value: str) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_none(self) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_bool(self, value: bool) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_map_header(self, size: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_array_header(self, size: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def encode_timestamp(self, seconds: int, nanoseconds: int) -> bytes:
+        pass
+
+
+class CborKeyEncoder(BinaryKeyEncoder):
+    """CBOR (RFC 8949); timestamps as epoch-based date/time (tag 1)."""
+
+    CONTENT_TYPE = "application/cbor"
+
+    FLOAT32_HEAD = b"\xfa"
+    FLOAT64_HEAD = b"\xfb"
+
+    _TAG_EPOCH = b"\xc1"
+    _UINT16 = struct.Struct(">BH")
+    _UINT32 = struct.Struct(">BI")
+    _UINT64 = struct.Struct(">BQ")
+
+    @classmethod
+    def _encode_head(cls, major: int, argument: int) -> bytes:
+        major <<= 5
+        if argument < 24:
+            return bytes((major | argument,))
+        if argument < 0x100:
+            return bytes((major | 24, argument))
+        if argument < 0x10000:
+            return cls._UINT16.pack(major | 25, argument)
+        if argument < 0x100000000:
+            return cls._UINT32.pack(major | 26, argument)
+        if argument < 0x10000000000000000:
+            return cls._UINT64.pack(major | 27, argument)
+        raise ValueError(f"integer out of range ({argument})!")
+
+    def encode_int(self, value: int) -> bytes:
+        if value >= 0:
+            return self._encode_head(0, value)
+        return self._encode_head(1, -1 - value)
+
+    def encode_str(self, value: str) -> bytes:
+        encoded = value.encode("utf-8")
+        return self._encode_head(3, len(encoded)) + encoded
+
+    def encode_none(self) -> bytes:
+        return b"\xf6"
+
+    def encode_bool(self, value: bool) -> bytes:
+        return b"\xf5" if value else b"\xf4"
+
+    def encode_map_header(self, size: int) -> bytes:
+        return self._encode_head(5, size)
+
+    def encode_array_header(self, size: int) -> bytes:
+        return self._encode_head(4, size)
+
+    def encode_timestamp(self, seconds: int, nanoseconds: int) -> bytes:
+        if nanoseconds:
+            return self._TAG_EPOCH + self.encode_float(seconds + nanoseconds / 1e9)
+        return self._TAG_EPOCH + self.encode_int(seconds)
+
+
+class MsgpackKeyEncoder(BinaryKeyEncoder):
+    """MessagePack; timestamps as extension type -1 (timestamp 32/64/96)."""
+
+    CONTENT_TYPE = "application/msgpack"
+
+    FLOAT32_HEAD = b"\xca"
+    FLOAT64_HEAD = b"\xcb"
+
+    _UINT8 = struct.Struct(">BB")
+    _UINT16 = struct.Struct(">BH")
+    _UINT32 = struct.Struct(">BI")
+    _UINT64 = struct.Struct(">BQ")
+    _INT8 = struct.Struct(">Bb")
+    _INT16 = struct.Struct(">Bh")
+    _INT32 = struct.Struct(">Bi")
+    _INT64 = struct.Struct(">Bq")
+    _TIMESTAMP32 = struct.Struct(">BbI")
+    _TIMESTAMP64 = struct.Struct(">BbQ")
+    _TIMESTAMP96 = struct.Struct(">BBbIq")
+
+    def encode_int(self, value: int) -> bytes:
+        if 0 <= value < 0x80:
+            return bytes((value,))
+        if -32 <= value < 0:
+            return bytes((value & 0xff,))
+        if value > 0:
+            if value < 0x100:
+                return self._UINT8.pack(0xcc, value)
+            if value < 0x10000:
+                return self._UINT16.pack(0xcd, value)
+            if value < 0x100000000:
+                return self._UINT32.pack(0xce, value)
+            if value < 0x10000000000000000:
+                return self._UINT64.pack(0xcf, value)
+        else:
+            if value >= -0x80:
+                return self._INT8.pack(0xd0, value)
+            if value >= -0x8000:
+                return self._INT16.pack(0xd1, value)
+            if value >= -0x80000000:
+                return self._INT32.pack(0xd2, value)
+            if value >= -0x8000000000000000:
+                return self._INT64.pack(0xd3, value)
+        raise ValueError(f"integer out of range ({value})!")
+
+    def encode_str(self, value: str) -> bytes:
+        encoded = value.encode("utf-8")
+        size = len(encoded)
+        if size < 32:
+            return bytes((0xa0 | size,)) + encoded
+        if size < 0x100:
+            return self._UINT8.pack(0xd9, size) + encoded
+        if size < 0x10000:
+            return self._UINT16.pack(0xda, size) + encoded
+        return self._UINT32.pack(0xdb, size) + encoded
+
+    def encode_none(self) -> bytes:
+        return b"\xc0"
+
+    def encode_bool(self, value: bool) -> bytes:
+        return b"\xc3" if value else b"\xc2"
+
+    def encode_map_header(self, size: int) -> bytes:
+        if size < 16:
+            return bytes((0x80 | size,))
+        if size < 0x10000:
+            return self._UINT16.pack(0xde, size)
+        return self._UINT32.pack(0xdf, size)
+
+    def encode_array_header(self, size: int) -> bytes:
+        if size < 16:
+            return bytes((0x90 | size,))
+        if size < 0x10000:
+            return self._UINT16.pack(0xdc, size)
+        return self._UINT32.pack(0xdd, size)
+
+    def encode_timestamp(self, seconds: int, nanoseconds: int) -> bytes:
+        if 0 <= seconds < 0x400000000:
+            if nanoseconds == 0 and seconds < 0x100000000:
+                return self._TIMESTAMP32.pack(0xd6, -1, seconds)
+            return self._TIMESTAMP64.pack(0xd7, -1, nanoseconds << 34 | seconds)
+        return self._TIMESTAMP96.pack(0xc7, 12, -1, nanoseconds, seconds)
+
+
+PayloadEncoder = Union[JsonKeyEncoder, BinaryKeyEncoder]
+"""Encoder of the payloads of a topic: `dumps(data)` and `CONTENT_TYPE`"""
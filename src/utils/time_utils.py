@@ -1,14 +1,15 @@
 import datetime
 
-from tzlocal import get_localzone
+from src.utils.clock import Clock
 
 
 class TimeUtils:
 
+    _clock = None
+
     @classmethod
     def now(cls, no_ms=False) -> datetime.datetime:
-        """overwrite/mock in test"""
-        now = datetime.datetime.now(tz=get_localzone())
-        if no_ms:
-            now = now.replace(microsecond=0)
-        return now
+        """overwrite/mock in test; services use an injected `Clock`"""
+        if cls._clock is None:
+            cls._clock = Clock()
+        return cls._clock.now(no_ms)
@@ -0,0 +1,7 @@
+import os
+import unittest
+
+BENCHMARK_ENV = "FRONMOD_BENCHMARK"
+
+benchmark = unittest.skipUnless(os.environ.get(BENCHMARK_ENV), f"wall-clock benchmark (set {BENCHMARK_ENV}=1 to run)")
+"""Decorator of wall-clock benchmarks, which are skipped by default (timings vary on loaded machines)."""
@@ -16,30 +16,47 @@ class MockFronmodReader(FronmodReader):
         FronmodConfKey.PORT: 123,
     }
 
-    def __init__(self):
-        super().__init__(self.DUMMY_CONFIG)
+    def __init__(self, config=None, clock=None):
+        super().__init__(config or self.DUMMY_CONFIG, clock=clock)
         self._is_open = False
         self.mock_reads = {}
-        pass
+        self.mock_registers = {}  # unit_id => {pos: register}
+        self.remote_reads = []  # (unit_id, pos, length) of each remote request
 
     def open(self):
+        self._cache.clear()
         self._is_open = True
 
     def is_open(self) -> bool:
         return self._is_open
 
     def close(self):
+        super().close()
         self._is_open = False
 
     def _read_remote_registers(self, read: MobuBatch):
+        self.remote_reads.append((read.unit_id, read.pos, read.length))
+
         mock_data = self.mock_reads.get(read)
-        if mock_data is None:
-            raise ValueError('no mock data configured!')
-        return mock_data.registers
+        if mock_data is not None:
+            return mock_data.registers
+
+        unit_registers = self.mock_registers.get(read.unit_id, {})
+        try:
+            return [unit_registers[pos] for pos in range(read.pos, read.pos + read.length)]
+        except KeyError:
+            raise ValueError('no mock data configured!') from None
 
     def set_mock_read(self, read, registers):
         data = MockData(read, registers)
         self.mock_reads[data.read] = data
+        self.set_mock_registers(read.unit_id, read.pos, registers)
+
+    def set_mock_registers(self, unit_id, pos, registers):
+        unit_registers = self.mock_registers.setdefault(unit_id, {})
+        for index, register in enumerate(registers):
+            unit_registers[pos + index] = register
 
     def clear_mock_reads(self):
         self.mock_reads.clear()
+        self.mock_registers.clear()
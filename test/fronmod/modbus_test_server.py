@@ -0,0 +1,45 @@
+import threading
+
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.server.sync import ModbusTcpServer
+
+
+class ModbusTestServer:
+    """Local pymodbus server (stand-in for the Fronius Datamanager), holding registers per unit id."""
+
+    HOST = "127.0.0.1"
+
+    def __init__(self, unit_ids=(1, 240), size=0x10000):
+        slaves = {}
+        for unit_id in unit_ids:
+            slaves[unit_id] = ModbusSlaveContext(hr=ModbusSequentialDataBlock(0, [0] * size), zero_mode=True)
+        self._context = ModbusServerContext(slaves=slaves, single=False)
+
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def set_registers(self, unit_id, pos, registers):
+        self._context[unit_id].setValues(3, pos, list(registers))
+
+    def start(self):
+        self._server = ModbusTcpServer(self._context, address=(self.HOST, 0))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
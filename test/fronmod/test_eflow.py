@@ -1,8 +1,15 @@
+import copy
 import datetime
 import math
+import timeit
 import unittest
 
 from src.fronmod.eflow import EflowChannel, EflowAggregate
+from src.utils.clock import VirtualClock
+from test.benchmark import benchmark
+
+
+MOCK_EPOCH = datetime.datetime(2019, 1, 1)
 
 
 class MockEflowChannel(EflowChannel):
@@ -12,7 +19,7 @@ class MockEflowChannel(EflowChannel):
         self.mock_time = None
 
     def get_current_time(self):
-        return self.mock_time
+        return (self.mock_time - MOCK_EPOCH).total_seconds()
 
 
 class TestEflow(unittest.TestCase):
@@ -53,14 +60,14 @@ class TestEflow(unittest.TestCase):
         last_value = 1
         eflow.push_value(last_value)
 
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
         self.assertEqual(0, eflow.plus.value_agg)
         self.assertEqual(0, eflow.minus.value_agg)
 
         # no time change
         eflow.push_value(last_value)
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
         self.assertEqual(0, eflow.plus.value_agg)
         self.assertEqual(0, eflow.minus.value_agg)
@@ -71,7 +78,7 @@ class TestEflow(unittest.TestCase):
         eflow.mock_time = current_time
 
         eflow.push_value(last_value)
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
         self.assertEqual(1, eflow.plus.value_agg)
         self.assertEqual(0, eflow.minus.value_agg)
@@ -84,7 +91,7 @@ class TestEflow(unittest.TestCase):
         last_value = -1
         eflow.push_value(last_value)
 
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
 
         self.assertEqual(1.25, eflow.plus.value_agg)
@@ -98,7 +105,7 @@ class TestEflow(unittest.TestCase):
         last_value = -1
         eflow.push_value(last_value)
 
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
 
         self.assertEqual(1.25, eflow.plus.value_agg)
@@ -112,7 +119,7 @@ class TestEflow(unittest.TestCase):
         last_value = -1
         eflow.push_value(last_value)
 
-        self.assertEqual(current_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(last_value, eflow.last_value)
 
         self.assertEqual(1.25, eflow.plus.value_agg)
@@ -177,7 +184,7 @@ class TestEflow(unittest.TestCase):
 
         eflow.push_value(value)
 
-        self.assertEqual(eflow.mock_time, eflow.last_time)
+        self.assertEqual(eflow.get_current_time(), eflow.last_time)
         self.assertEqual(value, eflow.last_value)
         self.assertEqual(0, eflow.plus.value_agg)
         self.assertEqual(0, eflow.minus.value_agg)
@@ -228,3 +235,40 @@ class TestEflow(unittest.TestCase):
 
         self.assertTrue(math.isclose(1.3889047789481912, eflow.plus.value_agg, rel_tol=1e-6))
         self.assertTrue(math.isclose(-0.002154778948191209, eflow.minus.value_agg, rel_tol=1e-6))
+
+    def test_monotonic_clock(self):
+        # the wall clock may jump (NTP, DST), the integration follows the monotonic clock
+        clock = VirtualClock(datetime.datetime(2021, 10, 31, 2, 59, 55))
+        eflow = EflowChannel('item', EflowAggregate('plus'), EflowAggregate('minus'), clock)
+
+        eflow.push_value(3600)
+        clock.advance(10)
+        eflow.push_value(3600)
+
+        self.assertAlmostEqual(10, eflow.plus.value_agg)
+
+    def test_pop_aggregates(self):
+        eflow = EflowChannel("power", EflowAggregate("plus"), EflowAggregate("minus"))
+        eflow.plus.value_agg = 1.5
+
+        self.assertEqual([("plus", 1.5)], eflow.pop_aggregates())
+        self.assertEqual(0, eflow.plus.value_agg)
+        self.assertEqual([], eflow.pop_aggregates())
+
+    @benchmark
+    def test_benchmark_pop_aggregates(self):
+        """values without copies vs. the former deep copies of the aggregates"""
+        eflow = EflowChannel("power", EflowAggregate("plus"), EflowAggregate("minus"))
+
+        def pop_former():
+            aggregates = []
+            for agg in (eflow.plus, eflow.minus):
+                aggregates.append(copy.deepcopy(agg))
+                agg.value_agg = 0
+            return [(agg.item_name, agg.value_agg) for agg in aggregates if agg.value_agg != 0]
+
+        number = 2000
+        time_former = timeit.timeit(pop_former, number=number)
+        time_pop = timeit.timeit(eflow.pop_aggregates, number=number)
+        self.assertLess(time_pop, time_former, "eflow aggregates: deepcopy={:.1f}us; pop={:.1f}us".format(
+            time_former / number * 1e6, time_pop / number * 1e6))
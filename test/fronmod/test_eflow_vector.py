@@ -0,0 +1,79 @@
+import random
+import time
+import unittest
+
+from src.fronmod.eflow import EflowAggregate, EflowChannel
+from src.utils.clock import VirtualClock
+
+try:
+    import numpy as np
+    from src.fronmod.eflow_vector import EflowVector
+except ImportError:  # optional dependency
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestEflowVector(unittest.TestCase):
+
+    def test_complete(self):
+        # same steps as TestEflow.test_complete
+        hours = [0, 0, 1, 2, 3, 3.5, 4.5, 5.5, 6.5]
+        values = [1, 1, 1, -1, -1, -1, 0, 0, 1]
+
+        plus, minus = EflowVector.integrate([h * 3600 for h in hours], values)
+        self.assertEqual([1.75], list(plus))
+        self.assertEqual([-2.25], list(minus))
+
+    def test_segments(self):
+        plus, minus = EflowVector.get_segments([0, 10, 10, 20, 30, 40], [1039.4, -40.94, 5, float("nan"), 3600, 3600])
+
+        self.assertAlmostEqual(1.3889047789481912, plus[0])
+        self.assertAlmostEqual(-0.002154778948191209, minus[0])
+        self.assertEqual([0, 0, 0], list(plus[1:4]))  # no time, no value (before and after)
+        self.assertAlmostEqual(10, plus[4])
+
+    def test_windows(self):
+        plus, minus = EflowVector.integrate([0, 1800, 3600, 5400, 7200], [1, 1, 1, -1, -1], edges=[0, 3600, 7200])
+
+        self.assertEqual([1, 0.125], list(plus))
+        self.assertEqual([0, -0.625], list(minus))
+
+    def test_channel(self):
+        """random walk through zero, aggregates published every 60s (like the medium delivery)"""
+        rnd = random.Random(4711)
+        clock = VirtualClock()
+        channel = EflowChannel('item', EflowAggregate('plus'), EflowAggregate('minus'), clock)
+
+        times, values = [], []
+        expected_plus, expected_minus = [], []
+        value = 0.0
+        for cycle in range(1, 3601):
+            clock.set_monotonic(cycle * 10 + rnd.uniform(0, 0.5))  # read latency
+            value = max(-3000.0, min(5000.0, value + rnd.uniform(-500, 500)))
+            if rnd.random() < 0.05:
+                value = 0.0
+            channel.push_value(value)
+            times.append(clock.monotonic())
+            values.append(value)
+
+            if cycle % 6 == 0:
+                aggregates = channel.get_aggregates_and_reset()
+                expected_plus.append(aggregates[0].value_agg)
+                expected_minus.append(aggregates[1].value_agg)
+
+        edges = [0.0] + [times[index] for index in range(5, len(times), 6)]
+        plus, minus = EflowVector.integrate(times, values, edges=edges)
+
+        np.testing.assert_allclose(expected_plus, plus, rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(expected_minus, minus, rtol=1e-12, atol=1e-12)
+
+    def test_performance(self):
+        count = 1000000
+        times = np.arange(count) * 10.0
+        values = np.sin(np.arange(count) / 100.0) * 3000.0
+
+        time_start = time.monotonic()
+        plus, minus = EflowVector.integrate(times, values, edges=np.arange(0, count * 10.0 + 60.0, 60.0))
+        self.assertLess(time.monotonic() - time_start, 5.0)
+
+        self.assertAlmostEqual(-minus.sum(), plus.sum(), delta=plus.sum() * 1e-3)
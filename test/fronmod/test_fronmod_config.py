@@ -1,6 +1,11 @@
+import pickle
 import unittest
 
-from src.fronmod.fronmod_config import FronmodItem, FronmodConfig, FronmodDelivery
+from src.fronmod.fronmod_config import FronmodItem, FronmodConfig, FronmodDelivery, FronmodStateTexts
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.mobu import MobuFlag, MobuFrozen
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+from test.fronmod.test_fronmod_processor import STORAGE_REGISTERS
 
 
 class TestFronmodItem(unittest.TestCase):
@@ -23,3 +28,55 @@ class TestFronmodItem(unittest.TestCase):
 
         items = FronmodConfig.get_item_keys(FronmodDelivery.SLOW)
         self.assertTrue(bool(items))
+
+    def test_definitions_frozen(self):
+        batch = FronmodConfig.MPPT_BATCH
+        item = batch.items[0]
+        with self.assertRaises(AttributeError):
+            item.offset = 0
+        with self.assertRaises(AttributeError):
+            batch.extra = 0  # slotted, no __dict__
+        self.assertIs(int, type(item.flags))
+        self.assertEqual(1, item.width)
+
+        copy = pickle.loads(pickle.dumps(batch))
+        self.assertEqual((batch.name, batch.pos, hash(batch)), (copy.name, copy.pos, hash(copy)))
+        self.assertEqual([(i.name, i.offset, i.flags) for i in batch.items], [(i.name, i.offset, i.flags) for i in copy.items])
+
+        class NoArgs(MobuFrozen):
+            __slots__ = ()
+
+        with self.assertRaises(TypeError):
+            NoArgs()  # `_get_args` is abstract
+
+
+class TestFronmodStateTexts(unittest.TestCase):
+
+    def test_format(self):
+        self.assertEqual("(4) NORMAL", FronmodConfig.format_inv_sun_spec_state(4))
+        self.assertEqual("(9) ?", FronmodConfig.format_inv_sun_spec_state(9))
+        self.assertEqual("(9) NO SOLARNET COMMUNICATION", FronmodConfig.format_inv_fronius_state(9))
+        self.assertEqual("(5) FULL", FronmodConfig.format_bat_state(5))
+        self.assertEqual("(65535) (0xFFFF) ?", FronmodConfig.format_mptt_state(65535))
+        self.assertEqual("(0) ?", FronmodConfig.format_mptt_state(0))
+        self.assertIsNone(FronmodConfig.format_mptt_state(None))
+
+        # precomputed: no new string per call
+        self.assertIs(FronmodConfig.format_bat_state(3), FronmodConfig.format_bat_state(3))
+        self.assertIs(FronmodConfig.format_bat_state(99), FronmodConfig.format_bat_state(99))
+
+    def test_override(self):
+        state_texts = FronmodStateTexts({FronmodStateTexts.BATTERY: {"3": "ENTLADEN", 99: "NEU"}})
+        self.assertEqual("(3) ENTLADEN", state_texts.battery.format(3))
+        self.assertEqual("(99) NEU", state_texts.battery.format(99))
+        self.assertEqual("(4) CHARGING", state_texts.battery.format(4))
+        self.assertEqual("(3) DISCHARGE", FronmodConfig.format_bat_state(3))  # defaults unchanged
+
+    def test_processor_override(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.STORAGE_BATCH, STORAGE_REGISTERS)
+        processor = FronmodProcessor(reader, state_texts={FronmodStateTexts.BATTERY: {"3": "ENTLADEN"}})
+
+        processor.process_storage_model()
+
+        self.assertEqual("(3) ENTLADEN", processor.get_send_data(MobuFlag.Q_SLOW)[FronmodItem.BAT_STATE_TEXT])
@@ -1,3 +1,4 @@
+import tracemalloc
 import unittest
 
 from src.fronmod.fronmod_config import FronmodConfig, FronmodItem
@@ -6,6 +7,30 @@ from src.fronmod.mobu import MobuResult, MobuFlag
 from test.fronmod.mock_fronmod_reader import MockFronmodReader
 
 
+INVERTER_SUN_REGISTERS = [
+    60, 16280, 20972, 16076, 52429, 16076, 52429, 16071, 44564, 17354, 45875, 17355, 39322, 17355, 58982, 17258,
+    13107, 17258, 39322, 17259, 58982, 17293, 0, 16967, 55050, 17293, 58, 16256, 0, 49863, 65454, 19158, 29366,
+    32704, 0, 32704, 0, 17310, 22938, 32704, 0, 32704, 0, 32704, 0, 32704, 0, 4, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0
+]
+
+MPPT_REGISTERS = [
+    160, 48, 65534, 65534, 65534, 32768, 0, 0, 2, 65535, 1, 21364, 29289, 28263, 8241, 0, 0, 0, 0, 55, 56620,
+    31141, 0, 0, 9155, 20421, 32768, 4, 65535, 65535, 2, 21364, 29289, 28263, 8242, 0, 0, 0, 0, 2, 18320, 366,
+    0, 0, 9155, 20421, 32768, 4
+]
+
+STORAGE_REGISTERS = [
+    124, 24, 3328, 100, 100, 0, 65535, 0, 2400, 65535, 65535, 3, 10000, 10000, 65535, 65535, 65535, 1, 0, 0,
+    32768, 65534, 65534, 65534, 65534, 65534
+]
+METER_REGISTERS = [
+    3277, 16968, 0, 50336, 573, 17489, 164, 50308, 49889, 50307, 49070, 17571, 49152, 17494, 1720, 17543, 25876,
+    17540, 39715, 50059, 12124, 49841, 47186, 49936, 28180, 49716, 20972, 49016, 20972, 16253, 28836, 49021,
+    28836, 49021, 28836, 19079, 35284, 32704, 0, 32704, 0, 32704, 0, 18772, 13440, 32704, 0, 32704, 0, 32704
+]
+
+
 class TestFronmodProcessor(unittest.TestCase):
 
     def test_convert_scale_factor(self):
@@ -102,12 +127,7 @@ class TestFronmodProcessorProcessing(unittest.TestCase):
         self.assertEqual({}, send_slow)
 
     def test_process_inverter_sun(self):
-        self.mock_reader.set_mock_read(FronmodConfig.INVERTER_BATCH, [
-            60, 16280, 20972, 16076, 52429, 16076, 52429, 16071, 44564, 17354, 45875, 17355, 39322, 17355, 58982, 17258,
-            13107, 17258, 39322, 17259, 58982, 17293, 0, 16967, 55050, 17293, 58, 16256, 0, 49863, 65454, 19158, 29366,
-            32704, 0, 32704, 0, 17310, 22938, 32704, 0, 32704, 0, 32704, 0, 32704, 0, 4, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-            0, 0
-        ])
+        self.mock_reader.set_mock_read(FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS)
 
         self.processor.process_inverter_model()
 
@@ -186,11 +206,7 @@ class TestFronmodProcessorProcessing(unittest.TestCase):
         }, send_slow)
 
     def test_process_mppt(self):
-        self.mock_reader.set_mock_read(FronmodConfig.MPPT_BATCH, [
-            160, 48, 65534, 65534, 65534, 32768, 0, 0, 2, 65535, 1, 21364, 29289, 28263, 8241, 0, 0, 0, 0, 55, 56620,
-            31141, 0, 0, 9155, 20421, 32768, 4, 65535, 65535, 2, 21364, 29289, 28263, 8242, 0, 0, 0, 0, 2, 18320, 366,
-            0, 0, 9155, 20421, 32768, 4
-        ])
+        self.mock_reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
 
         bat_power_expected = -3.66
         mod_power_expected = 311.41
@@ -349,3 +365,47 @@ class TestFronmodProcessorProcessing(unittest.TestCase):
         }, send_medium)
         send_slow = self.processor.get_send_data(MobuFlag.Q_SLOW)
         self.assertEqual({}, send_slow)
+
+
+class TestFronmodProcessorAllocations(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = MockFronmodReader()
+        self.reader.set_mock_read(FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS)
+        self.reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        self.reader.set_mock_read(FronmodConfig.STORAGE_BATCH, STORAGE_REGISTERS)
+        self.reader.set_mock_read(FronmodConfig.METER_BATCH, METER_REGISTERS)
+        self.processor = FronmodProcessor(self.reader)
+
+    def tick(self):
+        self.processor.process_inverter_model()
+        self.processor.process_mppt_model()
+        self.processor.process_meter_model()
+        self.processor.process_storage_model()
+        self.processor.pop_read_stats()
+        self.reader.remote_reads.clear()  # mock only
+
+    def test_results_reused(self):
+        results = self.reader.read(FronmodConfig.METER_BATCH)
+        self.assertIs(results, self.reader.read(FronmodConfig.METER_BATCH))
+        index = results.index[FronmodItem.MET_AC_POWER]
+        self.assertEqual(results.values[index], results[FronmodItem.MET_AC_POWER].value)
+        self.assertTrue(results[FronmodItem.MET_AC_POWER].ready)
+        self.assertFalse(results[FronmodItem.SELF_CONSUMPTION].ready)
+
+    def test_allocations_flat(self):
+        for _ in range(2500):  # warm up caches and the free lists of the interpreter
+            self.tick()
+
+        filters = [tracemalloc.Filter(True, "*/src/*")]
+        tracemalloc.start()
+        try:
+            snapshot_start = tracemalloc.take_snapshot().filter_traces(filters)
+            for _ in range(1000):
+                self.tick()
+            snapshot_end = tracemalloc.take_snapshot().filter_traces(filters)
+        finally:
+            tracemalloc.stop()
+
+        growth = sum(stat.size_diff for stat in snapshot_end.compare_to(snapshot_start, "lineno"))
+        self.assertLess(growth, 4096)  # only the last values, nothing per tick
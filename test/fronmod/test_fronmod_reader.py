@@ -1,5 +1,13 @@
+import asyncio
+import time
 import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodConfKey, FronmodItem
 from src.fronmod.fronmod_reader import FronmodReader  # noqa
+from src.fronmod.mobu import MobuBatch, MobuCache, MobuFlag, MobuItem
+from src.utils.clock import VirtualClock
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+from test.fronmod.test_fronmod_processor import MPPT_REGISTERS
 
 
 class TestFronmodReader(unittest.TestCase):
@@ -17,3 +25,143 @@ class TestFronmodReader(unittest.TestCase):
         #     reader.close()
         #
         # self.assertTrue(True)
+
+
+class BlockingFronmodReader(MockFronmodReader):
+
+    def __init__(self, block_seconds):
+        super().__init__()
+        self.block_seconds = block_seconds
+        self.aborted = False
+
+    def _read_remote_registers(self, read: MobuBatch):
+        time.sleep(self.block_seconds)
+        return super()._read_remote_registers(read)
+
+    def _abort(self):
+        self.aborted = True
+
+
+class TestFronmodReaderAsync(unittest.TestCase):
+
+    def test_read_async(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.METER_BATCH, [0] * FronmodConfig.METER_BATCH.length)
+        try:
+            results = asyncio.run(reader.read_async(FronmodConfig.METER_BATCH))
+        finally:
+            reader.close()
+
+        self.assertEqual(0.0, results[FronmodItem.MET_AC_POWER].value)
+        self.assertTrue(results[FronmodItem.MET_AC_POWER].ready)
+
+    def test_read_async_timeout_keeps_loop_responsive(self):
+        reader = BlockingFronmodReader(0.5)
+        reader.set_mock_read(FronmodConfig.METER_BATCH, [0] * FronmodConfig.METER_BATCH.length)
+
+        heartbeats = []
+
+        async def heartbeat():
+            while True:
+                heartbeats.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            heartbeat_task = asyncio.create_task(heartbeat())
+            time_start = time.monotonic()
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(reader.read_async(FronmodConfig.METER_BATCH), 0.1)
+            finally:
+                heartbeat_task.cancel()
+            return time.monotonic() - time_start
+
+        try:
+            time_used = asyncio.run(run())
+        finally:
+            reader.close()
+
+        self.assertLess(time_used, 0.4)
+        self.assertGreater(len(heartbeats), 3)
+        self.assertTrue(reader.aborted)
+
+
+class TestFronmodReaderCache(unittest.TestCase):
+
+    MPPT_START = FronmodConfig.MPPT_START
+
+    @classmethod
+    def values(cls, results):
+        return {key: result.value for key, result in results.items()}
+
+    def test_static_items_read_once(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        reader.open()
+
+        results_1 = reader.read(FronmodConfig.MPPT_BATCH)
+        results_2 = reader.read(FronmodConfig.MPPT_BATCH)
+
+        self.assertEqual(self.values(results_1), self.values(results_2))
+        self.assertEqual([(1, self.MPPT_START, 48), (1, self.MPPT_START + 20, 28)], reader.remote_reads)
+
+        reader.open()  # reconnect
+        reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual((1, self.MPPT_START, 48), reader.remote_reads[-1])
+
+    def test_static_items_sparse(self):
+        config = {
+            **MockFronmodReader.DUMMY_CONFIG,
+            FronmodConfKey.SPARSE_READS: True,
+            FronmodConfKey.READ_COST_REQUEST: 10,
+            FronmodConfKey.READ_COST_REGISTER: 1,
+        }
+        reader = MockFronmodReader(config)
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+
+        reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual(3, len(reader.remote_reads))
+        reader.remote_reads.clear()
+
+        results = reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual([(1, self.MPPT_START + 20, 8), (1, self.MPPT_START + 41, 7)], reader.remote_reads)
+        self.assertEqual(-2, results[FronmodItem.RAW_MPPT_POWER_SF].value)
+
+    def test_ttl(self):
+        batch = MobuBatch(1, "ttl", 100, 4, [
+            MobuItem(1, MobuFlag.INT16, "sf", cache=10),
+            MobuItem(4, MobuFlag.UINT16, "value"),
+        ])
+        clock = VirtualClock()
+        reader = MockFronmodReader(clock=clock)
+        reader.set_mock_read(batch, [1, 2, 3, 4])
+
+        clock.set_monotonic(1000.0)
+        reader.read(batch)
+        reader.set_mock_registers(1, 100, [5, 6, 7, 8])
+
+        clock.set_monotonic(1009.0)
+        results = reader.read(batch)
+        self.assertEqual((1, 8), (results["sf"].value, results["value"].value))
+
+        clock.set_monotonic(1010.0)
+        results = reader.read(batch)
+        self.assertEqual((5, 8), (results["sf"].value, results["value"].value))
+
+        self.assertEqual([(1, 100, 4), (1, 103, 1), (1, 100, 4)], reader.remote_reads)
+
+    def test_error_clears_cache(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        reader.read(FronmodConfig.MPPT_BATCH)
+
+        reader.clear_mock_reads()
+        with self.assertRaises(ValueError):
+            reader.read(FronmodConfig.MPPT_BATCH)
+
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual((1, self.MPPT_START, 48), reader.remote_reads[-1])
+
+    def test_no_cache_policy(self):
+        self.assertEqual(MobuCache.FRESH, MobuItem(1, MobuFlag.INT16, "test").cache)
@@ -0,0 +1,136 @@
+import errno
+import os
+import struct
+import tempfile
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodConfKey, FronmodItem
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.mobu_capture import MobuCaptureReader, MobuCaptureRecord, MobuCaptureWriter
+from src.utils.clock import VirtualClock
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, MPPT_REGISTERS
+
+
+class TestMobuCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "registers.cap")
+        self.clock = VirtualClock()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_write_read(self):
+        writer = MobuCaptureWriter(self.path, clock=self.clock)
+        self.clock.advance(1)
+        writer.write(1000, 1, 40070, struct.pack(">3H", 1, 2, 3))
+        writer.write(2000, 240, 40094, memoryview(struct.pack(">H", 0xffff)))
+        writer.close()
+
+        reader = MobuCaptureReader(self.path)
+        records = list(reader)
+        self.assertEqual([
+            MobuCaptureRecord(1000, 1, 40070, struct.pack(">3H", 1, 2, 3)),
+            MobuCaptureRecord(2000, 240, 40094, b"\xff\xff"),
+        ], records)
+        self.assertEqual(self.clock.time_ns() - 1000000000 + 1000, reader.get_wall_ns(records[0]))
+
+        # reopened by the same writer: appends (same anchor)
+        writer.write(3000, 1, 0, b"\x00\x01")
+        writer.close()
+        self.assertEqual(3, len(list(MobuCaptureReader(self.path))))
+
+    def test_reopen_rotates(self):
+        writer = MobuCaptureWriter(self.path, clock=self.clock)
+        writer.write(5 * 10 ** 9, 1, 0, b"\x00\x01")
+        writer.close()
+
+        # restart after a reboot: monotonic clock reset => new file with a new anchor
+        self.clock.advance(60)
+        clock = VirtualClock(self.clock.now())
+        writer = MobuCaptureWriter(self.path, clock=clock)
+        writer.write(10 ** 9, 1, 0, b"\x00\x02")
+        writer.close()
+
+        paths = MobuCaptureReader.get_rotated_paths(self.path)
+        self.assertEqual([self.path + ".1", self.path], paths)
+        times = []
+        for path in paths:
+            reader = MobuCaptureReader(path)
+            times.extend(reader.get_wall_ns(record) for record in reader)
+        self.assertEqual([self.clock.time_ns() - 55 * 10 ** 9, self.clock.time_ns() + 10 ** 9], times)
+
+    def test_truncated(self):
+        writer = MobuCaptureWriter(self.path, clock=self.clock)
+        writer.write(1000, 1, 40070, struct.pack(">3H", 1, 2, 3))
+        writer.write(2000, 1, 40070, struct.pack(">3H", 4, 5, 6))
+        writer.close()
+
+        with open(self.path, "r+b") as file:
+            file.truncate(os.path.getsize(self.path) - 1)
+
+        self.assertEqual(1, len(list(MobuCaptureReader(self.path))))
+
+    def test_no_capture_file(self):
+        with open(self.path, "wb") as file:
+            file.write(b"no capture file at all")
+        with self.assertRaises(FronmodException):
+            list(MobuCaptureReader(self.path))
+
+    def test_rotate(self):
+        data = bytes(100)
+        writer = MobuCaptureWriter(self.path, max_bytes=1000, backups=2, clock=self.clock)
+        for index in range(30):
+            writer.write(index, 1, 0, data)
+        writer.close()
+
+        paths = MobuCaptureReader.get_rotated_paths(self.path)
+        self.assertEqual([self.path + ".2", self.path + ".1", self.path], paths)
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        self.assertTrue(all(os.path.getsize(path) <= 1000 + 120 for path in paths))
+
+        times = [record.monotonic_ns for path in paths for record in MobuCaptureReader(path)]
+        self.assertEqual(list(range(times[0], 30)), times)  # oldest dropped, in order
+
+    def test_reader_captures(self):
+        config = dict(MockFronmodReader.DUMMY_CONFIG, **{FronmodConfKey.CAPTURE_FILE: self.path})
+        reader = MockFronmodReader(config, clock=self.clock)
+        reader.set_mock_read(FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS)
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+
+        reader.open()
+        reader.read(FronmodConfig.INVERTER_BATCH)
+        self.clock.advance(10)
+        reader.read(FronmodConfig.MPPT_BATCH)
+        reader.close()
+
+        records = list(MobuCaptureReader(self.path))
+        self.assertEqual([(0, 1, FronmodConfig.INVERTER_START, len(INVERTER_SUN_REGISTERS))],
+                         [(r.monotonic_ns, r.unit_id, r.pos, len(r.data) // 2) for r in records[:1]])
+        self.assertEqual(struct.pack(f">{len(INVERTER_SUN_REGISTERS)}H", *INVERTER_SUN_REGISTERS), records[0].data)
+
+        self.assertEqual(2, len(records))
+        self.assertEqual((10 * 10 ** 9, FronmodConfig.MPPT_START), (records[1].monotonic_ns, records[1].pos))
+        self.assertEqual(struct.pack(f">{len(MPPT_REGISTERS)}H", *MPPT_REGISTERS), records[1].data)
+
+    def test_reader_capture_fails(self):
+        class FullDiskWriter(MobuCaptureWriter):
+            def write(self, monotonic_ns, unit_id, pos, data):
+                raise OSError(errno.ENOSPC, "No space left on device")
+
+        config = dict(MockFronmodReader.DUMMY_CONFIG, **{FronmodConfKey.CAPTURE_FILE: self.path})
+        reader = MockFronmodReader(config, clock=self.clock)
+        reader._capture = FullDiskWriter(self.path, clock=self.clock)
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+
+        reader.open()
+        with self.assertLogs("src.fronmod.fronmod_reader", level="ERROR"):
+            results = reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertIsNone(reader._capture)  # disabled
+        self.assertEqual(4, results[FronmodItem.MPPT_BAT_STATE_CODE].value)
+
+        results = reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual(4, results[FronmodItem.MPPT_BAT_STATE_CODE].value)
+        reader.close()
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+import struct
+import unittest
+
+from src.fronmod.fronmod_config import FronmodClient, FronmodConfig, FronmodConfKey
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.fronmod_reader import FronmodReader
+from src.fronmod.mobu import MobuFlag
+from src.fronmod.mobu_client import MobuAsyncClient
+from src.utils.clock import VirtualClock
+from test.fronmod.modbus_test_server import ModbusTestServer
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, METER_REGISTERS, MPPT_REGISTERS, STORAGE_REGISTERS
+
+
+class TestMobuAsyncClient(unittest.TestCase):
+
+    @classmethod
+    def run_async(cls, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.run_until_complete(asyncio.sleep(0))  # completes the cancelled receive task
+            loop.close()
+
+    def test_read_holding_registers(self):
+        async def read(port):
+            client = MobuAsyncClient(ModbusTestServer.HOST, port)
+            try:
+                await client.connect()
+                return bytes(await client.read_holding_registers(1, 40070, 4))
+            finally:
+                client.close()
+
+        with ModbusTestServer() as server:
+            server.set_registers(1, 40070, [1, 2, 0xffff, 0x8000])
+            data = self.run_async(read(server.port))
+
+        self.assertEqual(struct.pack(">4H", 1, 2, 0xffff, 0x8000), data)
+
+    def test_read_ranges_pipelined(self):
+        latencies = []
+
+        async def read(port):
+            client = MobuAsyncClient(ModbusTestServer.HOST, port, max_in_flight=3,
+                                     on_response=lambda unit_id, count, seconds: latencies.append(seconds),
+                                     clock=VirtualClock())
+            try:
+                await client.connect()
+                ranges = [
+                    FronmodConfig.INVERTER_BATCH, FronmodConfig.MPPT_BATCH, FronmodConfig.METER_BATCH,
+                    FronmodConfig.STORAGE_BATCH
+                ]
+                return [bytes(data) for data in await client.read_ranges(ranges)]
+            finally:
+                client.close()
+
+        with ModbusTestServer() as server:
+            server.set_registers(1, FronmodConfig.INVERTER_START, INVERTER_SUN_REGISTERS)
+            server.set_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+            server.set_registers(240, FronmodConfig.METER_START, range(FronmodConfig.METER_BATCH.length))
+            data_list = self.run_async(read(server.port))
+
+        self.assertEqual(4, len(data_list))
+        inverter_length = FronmodConfig.INVERTER_BATCH.length
+        self.assertEqual(struct.pack(f">{inverter_length}H", *INVERTER_SUN_REGISTERS[:inverter_length]), data_list[0])
+        self.assertEqual(list(range(FronmodConfig.METER_BATCH.length)),
+                         list(struct.unpack(f">{FronmodConfig.METER_BATCH.length}H", data_list[2])))
+        self.assertEqual([0.0] * 4, latencies)  # virtual time stands still
+
+    def test_error_response(self):
+        async def read(port):
+            client = MobuAsyncClient(ModbusTestServer.HOST, port)
+            try:
+                await client.connect()
+                await client.read_holding_registers(1, 0xfff0, 100)  # out of range
+            finally:
+                client.close()
+
+        with ModbusTestServer() as server:
+            with self.assertRaises(FronmodException):
+                self.run_async(read(server.port))
+
+    def test_connection_refused(self):
+        with socket.socket() as sock:
+            sock.bind((ModbusTestServer.HOST, 0))
+            port = sock.getsockname()[1]  # not listening
+
+            client = MobuAsyncClient(ModbusTestServer.HOST, port)
+            with self.assertRaises(FronmodException):
+                self.run_async(client.connect())
+
+    def test_timeout(self):
+        async def read(port):
+            client = MobuAsyncClient(ModbusTestServer.HOST, port, timeout=0.2)
+            try:
+                await client.connect()
+                await client.read_holding_registers(1, 0, 1)
+            finally:
+                client.close()
+
+        with socket.socket() as sock:  # accepts connections (backlog), but never responds
+            sock.bind((ModbusTestServer.HOST, 0))
+            sock.listen()
+            with self.assertRaises(FronmodException):
+                self.run_async(read(sock.getsockname()[1]))
+
+
+class TestFronmodReaderAsyncioClient(unittest.TestCase):
+
+    @classmethod
+    def process_cycle(cls, server, pipeline_depth, client=FronmodClient.ASYNCIO):
+        config = {
+            FronmodConfKey.HOST: ModbusTestServer.HOST,
+            FronmodConfKey.PORT: server.port,
+            FronmodConfKey.CLIENT: client,
+            FronmodConfKey.PIPELINE_DEPTH: pipeline_depth,
+        }
+        reader = FronmodReader(config)
+        processor = FronmodProcessor(reader)
+
+        async def process():
+            try:
+                processor.open()
+                await processor.prefetch_async(FronmodConfig.get_batches())
+                await processor.process_inverter_model_async()
+                await processor.process_mppt_model_async()
+                await processor.process_meter_model_async()
+                await processor.process_storage_model_async()
+
+                stats = reader.pop_read_stats()
+                return stats.requests, [processor.get_send_data(flag) for flag in [MobuFlag.Q_QUICK, MobuFlag.Q_SLOW]]
+            finally:
+                processor.close()
+
+        return TestMobuAsyncClient.run_async(process())
+
+    def test_asyncio_equals_pymodbus(self):
+        with ModbusTestServer() as server:
+            server.set_registers(1, FronmodConfig.INVERTER_START, INVERTER_SUN_REGISTERS)
+            server.set_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+            server.set_registers(1, FronmodConfig.STORAGE_START, STORAGE_REGISTERS)
+            server.set_registers(240, FronmodConfig.METER_START, METER_REGISTERS)
+
+            _, values_pymodbus = self.process_cycle(server, 1, FronmodClient.PYMODBUS)
+            requests_sequential, values_sequential = self.process_cycle(server, 1)
+            requests_pipelined, values_pipelined = self.process_cycle(server, 4)
+
+        self.assertEqual(3, requests_sequential)
+        self.assertEqual(3, requests_pipelined)
+        self.assertEqual(values_pymodbus, values_sequential)
+        self.assertEqual(values_pymodbus, values_pipelined)
+
+    def test_sync_read_not_supported(self):
+        config = {
+            FronmodConfKey.HOST: ModbusTestServer.HOST,
+            FronmodConfKey.PORT: 502,
+            FronmodConfKey.CLIENT: FronmodClient.ASYNCIO,
+        }
+        reader = FronmodReader(config)
+        try:
+            reader.open()
+            with self.assertRaises(FronmodException):
+                reader.read(FronmodConfig.INVERTER_BATCH)
+        finally:
+            reader.close()
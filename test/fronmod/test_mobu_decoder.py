@@ -0,0 +1,89 @@
+import timeit
+import unittest
+
+from pymodbus.payload import BinaryPayloadDecoder
+
+from src.fronmod.fronmod_config import FronmodConfig
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.mobu import MobuBatch, MobuFlag, MobuItem
+from src.fronmod.mobu_decoder import MobuDecoder
+from test.benchmark import benchmark
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, MPPT_REGISTERS
+
+
+def decode_binary_payload(batch: MobuBatch, registers):
+    """reference: former per item decoding of `FronmodReader`"""
+    values = []
+    for item in batch.items:
+        if item.offset is None:
+            values.append(None)
+            continue
+
+        if item.flags & MobuFlag.FLOAT32:
+            buffer = registers[item.offset:item.offset + 2]
+        else:
+            buffer = registers[item.offset:item.offset + 1]
+        decoder = BinaryPayloadDecoder.fromRegisters(buffer, byteorder=FronmodConfig.BYTEORDER)
+
+        if item.flags & MobuFlag.INT16:
+            value = decoder.decode_16bit_int()
+        elif item.flags & MobuFlag.UINT16:
+            value = decoder.decode_16bit_uint()
+            if value == 0xffff:
+                value = 0
+        else:
+            value = decoder.decode_32bit_float()
+        values.append(value)
+
+    return values
+
+
+class TestMobuDecoder(unittest.TestCase):
+
+    FIXTURES = [
+        (FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS),
+        (FronmodConfig.MPPT_BATCH, MPPT_REGISTERS),
+    ]
+
+    def test_equals_binary_payload_decoder(self):
+        for batch, registers in self.FIXTURES:
+            decoder = MobuDecoder(batch, FronmodConfig.BYTEORDER)
+            self.assertEqual(decode_binary_payload(batch, registers), decoder.decode_registers(registers))
+
+    def test_uint16_ffff_equals_0(self):
+        batch = MobuBatch(1, "test", 0, 3, [
+            MobuItem(1, MobuFlag.UINT16, "a"),
+            MobuItem(2, MobuFlag.UINT16, "b"),
+            MobuItem(3, MobuFlag.INT16, "c"),
+        ])
+        decoder = MobuDecoder(batch, FronmodConfig.BYTEORDER)
+        self.assertEqual([0, 65534, -1], decoder.decode_registers([0xffff, 0xfffe, 0xffff]))
+
+    def test_wrong_configuration(self):
+        overlapping = MobuBatch(1, "test", 0, 4, [
+            MobuItem(1, MobuFlag.FLOAT32, "a"),
+            MobuItem(2, MobuFlag.UINT16, "b"),
+        ])
+        with self.assertRaises(FronmodException):
+            MobuDecoder(overlapping, FronmodConfig.BYTEORDER)
+
+        too_long = MobuBatch(1, "test", 0, 2, [MobuItem(2, MobuFlag.FLOAT32, "a")])
+        with self.assertRaises(FronmodException):
+            MobuDecoder(too_long, FronmodConfig.BYTEORDER)
+
+    def test_short_response(self):
+        decoder = MobuDecoder(FronmodConfig.MPPT_BATCH, FronmodConfig.BYTEORDER)
+        with self.assertRaises(FronmodException):
+            decoder.decode_registers(MPPT_REGISTERS[:20])
+
+    @benchmark
+    def test_benchmark(self):
+        number = 2000
+        for batch, registers in self.FIXTURES:
+            decoder = MobuDecoder(batch, FronmodConfig.BYTEORDER)
+
+            time_payload = timeit.timeit(lambda: decode_binary_payload(batch, registers), number=number)
+            time_struct = timeit.timeit(lambda: decoder.decode_registers(registers), number=number)
+
+            self.assertLess(time_struct, time_payload, "decode '{}': BinaryPayloadDecoder={:.1f}us; struct={:.1f}us".format(
+                batch.name, time_payload / number * 1e6, time_struct / number * 1e6))
@@ -0,0 +1,136 @@
+import socket
+import struct
+import threading
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodConfKey
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.fronmod_reader import FronmodReader
+from src.fronmod.mobu import MobuFlag
+from src.fronmod.mobu_mbap import MobuMbap, MobuPipeline, MobuTransactionIds
+from src.fronmod.mobu_planner import MobuRange
+from src.utils.clock import VirtualClock
+from test.fronmod.modbus_test_server import ModbusTestServer
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, METER_REGISTERS, MPPT_REGISTERS, STORAGE_REGISTERS
+
+
+class ReorderingGateway(threading.Thread):
+    """Receives all expected requests before it answers them in reverse order."""
+
+    def __init__(self, sock, expected_requests):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.expected_requests = expected_requests
+        self.max_in_flight = 0
+
+    def run(self):
+        requests = []
+        data = b""
+        while len(requests) < self.expected_requests:
+            data += self.sock.recv(1024)
+            while len(data) >= 12:
+                requests.append(data[:12])
+                data = data[12:]
+            self.max_in_flight = max(self.max_in_flight, len(requests))
+
+        for request in reversed(requests):
+            transaction_id, _, _, unit_id, _, pos, count = struct.unpack(">HHHBBHH", request)
+            payload = struct.pack(f">{count}H", *[pos + i for i in range(count)])
+            self.sock.sendall(struct.pack(">HHHBBB", transaction_id, 0, 3 + len(payload), unit_id, 3, len(payload)) + payload)
+
+
+class TestMobuMbap(unittest.TestCase):
+
+    def test_read_request(self):
+        request = MobuMbap.build_read_request(0x1234, 240, 40094, 50)
+        self.assertEqual(bytes.fromhex("1234 0000 0006 f0 03 9c9e 0032"), request)
+
+    def test_parse_read_response(self):
+        data = MobuMbap.parse_read_response(bytes([3, 4, 0, 1, 0xff, 0xff]), 2)
+        self.assertEqual(bytes([0, 1, 0xff, 0xff]), bytes(data))
+
+        with self.assertRaises(FronmodException):
+            MobuMbap.parse_read_response(bytes([0x83, 2]), 2)
+        with self.assertRaises(FronmodException):
+            MobuMbap.parse_read_response(bytes([3, 2, 0, 1]), 2)
+
+    def test_transaction_ids(self):
+        transaction_ids = MobuTransactionIds()
+        self.assertEqual([1, 2, 3], [transaction_ids.next() for _ in range(3)])
+        for _ in range(0xffff - 4):
+            transaction_ids.next()
+        self.assertEqual([0xffff, 0, 1], [transaction_ids.next() for _ in range(3)])  # wraps
+
+    def test_pipeline_matches_transaction_ids(self):
+        client_sock, gateway_sock = socket.socketpair()
+        client_sock.settimeout(5)
+        ranges = [MobuRange(1, 100, 2, []), MobuRange(240, 200, 3, []), MobuRange(1, 300, 1, [])]
+        gateway = ReorderingGateway(gateway_sock, len(ranges))
+        gateway.start()
+
+        transaction_ids = iter(range(7, 100))
+        latencies = []
+        try:
+            results = MobuPipeline(
+                client_sock, 4, lambda: next(transaction_ids),
+                on_response=lambda unit_id, count, seconds: latencies.append((unit_id, count, seconds)), clock=VirtualClock()
+            ).read(ranges)
+        finally:
+            gateway.join()
+            client_sock.close()
+            gateway_sock.close()
+
+        self.assertEqual(3, gateway.max_in_flight)
+        self.assertEqual([[100, 101], [200, 201, 202], [300]],
+                         [list(struct.unpack(f">{len(r) // 2}H", r)) for r in results])
+        self.assertEqual([(1, 1), (240, 3), (1, 2)], [(unit_id, count) for unit_id, count, _ in latencies])  # reversed
+        self.assertEqual([0.0] * 3, [seconds for _, _, seconds in latencies])  # virtual time stands still
+
+
+class TestFronmodReaderPipelined(unittest.TestCase):
+
+    def process_cycle(self, server, pipeline_depth, read_cost_auto=False):
+        config = {
+            FronmodConfKey.HOST: ModbusTestServer.HOST,
+            FronmodConfKey.PORT: server.port,
+            FronmodConfKey.PIPELINE_DEPTH: pipeline_depth,
+            FronmodConfKey.READ_COST_AUTO: read_cost_auto,
+        }
+        reader = self.reader = FronmodReader(config)
+        processor = FronmodProcessor(reader)
+        try:
+            processor.open()
+            reader.prefetch(FronmodConfig.get_batches())
+            processor.process_inverter_model()
+            processor.process_mppt_model()
+            processor.process_meter_model()
+            processor.process_storage_model()
+
+            stats = reader.pop_read_stats()
+            return stats.requests, [processor.get_send_data(flag) for flag in [MobuFlag.Q_QUICK, MobuFlag.Q_SLOW]]
+        finally:
+            processor.close()
+
+    def test_pipelined_equals_sequential(self):
+        with ModbusTestServer() as server:
+            server.set_registers(1, FronmodConfig.INVERTER_START, INVERTER_SUN_REGISTERS)
+            server.set_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+            server.set_registers(1, FronmodConfig.STORAGE_START, STORAGE_REGISTERS)
+            server.set_registers(240, FronmodConfig.METER_START, METER_REGISTERS)
+
+            requests_sequential, values_sequential = self.process_cycle(server, 1)
+            requests_pipelined, values_pipelined = self.process_cycle(server, 4)
+
+        self.assertEqual(3, requests_sequential)  # mppt + storage coalesced
+        self.assertEqual(3, requests_pipelined)
+        self.assertEqual(values_sequential, values_pipelined)
+        self.assertEqual(24.0, values_pipelined[1]["batFillLevel"])
+
+    def test_pipelined_observes_latencies(self):
+        with ModbusTestServer() as server:
+            requests, _ = self.process_cycle(server, 4, read_cost_auto=True)
+
+        samples = sum(stats.samples for stats in self.reader._latency_model._units.values())
+        self.assertEqual(3, requests)
+        self.assertEqual(requests, samples)
@@ -0,0 +1,256 @@
+import itertools
+import struct
+import unittest
+from types import SimpleNamespace
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodConfKey, FronmodItem
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.fronmod_reader import FronmodReader
+from src.fronmod.mobu import MobuBatch, MobuFlag, MobuItem
+from src.fronmod.mobu_planner import MobuCostModel, MobuLatencyModel, MobuPlanner, MobuReadStats
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, MPPT_REGISTERS
+
+
+class TestMobuPlanner(unittest.TestCase):
+
+    def test_plan_config_batches(self):
+        planner = MobuPlanner(max_gap=16)
+        ranges = planner.plan(FronmodConfig.get_batches())
+
+        ranges_info = sorted((r.unit_id, r.pos, r.length, [b.name for b in r.batches]) for r in ranges)
+        self.assertEqual([
+            (1, FronmodConfig.INVERTER_START, 60, ["inverter"]),
+            (1, FronmodConfig.MPPT_START, 76, ["mppt", "storage"]),
+            (240, FronmodConfig.METER_START, 50, ["meter"]),
+        ], ranges_info)
+
+    def test_plan_gap(self):
+        batch_1 = MobuBatch(1, "b1", 100, 10, [])
+        batch_2 = MobuBatch(1, "b2", 115, 10, [])  # gap: 5
+        batch_3 = MobuBatch(2, "b3", 110, 10, [])  # other unit
+
+        ranges = MobuPlanner(max_gap=4).plan([batch_1, batch_2, batch_3])
+        self.assertEqual(3, len(ranges))
+
+        ranges = MobuPlanner(max_gap=5).plan([batch_2, batch_3, batch_1])
+        self.assertEqual(2, len(ranges))
+        merged = [r for r in ranges if r.unit_id == 1][0]
+        self.assertEqual((100, 25), (merged.pos, merged.length))
+
+    def test_plan_max_registers(self):
+        batch_1 = MobuBatch(1, "b1", 0, 60, [])
+        batch_2 = MobuBatch(1, "b2", 60, 60, [])
+        batch_3 = MobuBatch(1, "b3", 120, 60, [])
+
+        ranges = MobuPlanner(max_gap=10).plan([batch_1, batch_2, batch_3])
+        self.assertEqual([(0, 120), (120, 60)], [(r.pos, r.length) for r in ranges])
+        self.assertTrue(all(r.length <= MobuPlanner.MAX_REGISTERS for r in ranges))
+
+    def test_split(self):
+        batch_1 = MobuBatch(1, "b1", 10, 3, [])
+        batch_2 = MobuBatch(1, "b2", 15, 2, [])
+        read_range = MobuPlanner(max_gap=5).plan([batch_1, batch_2])[0]
+
+        split = read_range.split(struct.pack(">7H", 10, 11, 12, 13, 14, 15, 16))
+        self.assertEqual(struct.pack(">3H", 10, 11, 12), split[batch_1])
+        self.assertEqual(struct.pack(">2H", 15, 16), split[batch_2])
+
+    def test_split_sparse(self):
+        batch = MobuBatch(1, "b", 10, 6, [
+            MobuItem(1, MobuFlag.UINT16, "a"), MobuItem(6, MobuFlag.UINT16, "b")
+        ])
+        planner = MobuPlanner(max_gap=0, cost_model=MobuCostModel(request_cost=1, register_cost=2), sparse=True)
+        ranges = planner.plan([batch])
+        self.assertEqual(2, len(ranges))
+
+        batch_registers = {}
+        ranges[0].fill(struct.pack(">H", 10), batch_registers)
+        ranges[1].fill(struct.pack(">H", 15), batch_registers)
+        self.assertEqual(struct.pack(">6H", 10, 0, 0, 0, 0, 15), batch_registers[batch])
+
+    def test_plan_sparse(self):
+        planner = MobuPlanner(max_gap=0, cost_model=MobuCostModel(request_cost=50, register_cost=2), sparse=True)  # max gap 25
+
+        ranges = planner.plan([FronmodConfig.MPPT_BATCH])  # used offsets: 3, 4, 20, 21, 27, 41, 47
+        self.assertEqual([(FronmodConfig.MPPT_START + 3, 45)], [(r.pos, r.length) for r in ranges])
+
+        ranges = planner.plan([FronmodConfig.METER_BATCH])  # used offsets: 1-2, 3-4, 35-36, 43-44
+        self.assertEqual([(FronmodConfig.METER_START + 1, 4), (FronmodConfig.METER_START + 35, 10)],
+                         [(r.pos, r.length) for r in ranges])
+
+        planner = MobuPlanner(max_gap=0, cost_model=MobuCostModel(request_cost=10, register_cost=1), sparse=True)  # max gap 10
+        ranges = planner.plan([FronmodConfig.MPPT_BATCH])
+        self.assertEqual([(3, 2), (20, 8), (41, 7)], [(r.pos - FronmodConfig.MPPT_START, r.length) for r in ranges])
+
+    def test_cost_model_max_gap(self):
+        self.assertEqual(25, MobuCostModel(request_cost=50, register_cost=2).get_max_gap(1))
+        self.assertEqual(MobuPlanner.MAX_REGISTERS, MobuCostModel(request_cost=500, register_cost=1).get_max_gap(1))
+        self.assertEqual(MobuPlanner.MAX_REGISTERS, MobuCostModel(request_cost=50, register_cost=0).get_max_gap(1))
+        self.assertEqual(MobuCostModel(request_cost=500, register_cost=1).get_max_gap(1),
+                         MobuLatencyModel(request_cost=500, register_cost=1).get_max_gap(1))
+
+    def test_read_stats(self):
+        planner = MobuPlanner(max_gap=0, cost_model=MobuCostModel(request_cost=50, register_cost=2), sparse=True)
+        batches = [FronmodConfig.METER_BATCH, FronmodConfig.MPPT_BATCH]
+
+        stats = MobuReadStats()
+        stats.add(batches, planner.plan(batches))
+
+        self.assertEqual(3, stats.requests)
+        self.assertEqual(-1, stats.requests_saved)
+        self.assertEqual(4 + 10 + 45, stats.registers)
+        self.assertEqual(50 + 48 - stats.registers, stats.registers_saved)
+
+
+class TestMobuLatencyModel(unittest.TestCase):
+
+    @classmethod
+    def observe(cls, model, unit_id, request_ms, register_ms, count=50):
+        for i in range(count):
+            registers = 2 + (i * 7) % 120
+            model.observe(unit_id, registers, (request_ms + register_ms * registers) / 1000.0)
+
+    def test_learn(self):
+        model = MobuLatencyModel(request_cost=50, register_cost=2)
+        self.assertEqual((50, 2), model.get_costs(1))
+
+        self.observe(model, 1, 200, 0.5)  # slow gateway
+        self.observe(model, 240, 5, 0.1)
+
+        request_cost, register_cost = model.get_costs(1)
+        self.assertAlmostEqual(200, request_cost, places=3)
+        self.assertAlmostEqual(0.5, register_cost, places=5)
+        self.assertEqual(MobuPlanner.MAX_REGISTERS, model.get_max_gap(1))
+
+        request_cost, register_cost = model.get_costs(240)
+        self.assertAlmostEqual(5, request_cost, places=3)
+        self.assertAlmostEqual(50, model.get_max_gap(240), delta=1)
+
+    def test_learn_min_samples(self):
+        model = MobuLatencyModel(request_cost=50, register_cost=2)
+        self.observe(model, 1, 200, 0.5, count=MobuLatencyModel.MIN_SAMPLES - 1)
+        self.assertEqual((50, 2), model.get_costs(1))
+
+    def test_learn_constant_request_size(self):
+        model = MobuLatencyModel(request_cost=50, register_cost=2)
+        for _ in range(20):
+            model.observe(1, 10, 0.1)
+
+        request_cost, register_cost = model.get_costs(1)
+        self.assertEqual(2, register_cost)  # configured
+        self.assertAlmostEqual(80, request_cost, places=6)
+
+    def test_planner_adapts(self):
+        model = MobuLatencyModel(request_cost=10, register_cost=1)
+        planner = MobuPlanner(max_gap=0, cost_model=model, sparse=True)
+
+        self.assertEqual(3, len(planner.plan([FronmodConfig.MPPT_BATCH])))
+
+        self.observe(model, 1, 300, 0.2)
+        self.assertEqual(1, len(planner.plan([FronmodConfig.MPPT_BATCH])))
+        self.assertEqual(2, len(planner.plan([FronmodConfig.INVERTER_BATCH, FronmodConfig.MPPT_BATCH])))
+
+        self.observe(model, 1, 1, 1, count=200)
+        self.assertEqual(5, len(planner.plan([FronmodConfig.MPPT_BATCH])))
+
+    def test_plan_cache_bounded(self):
+        model = MobuLatencyModel(request_cost=10, register_cost=1)
+        planner = MobuPlanner(max_gap=0, cost_model=model)
+        batches = [FronmodConfig.MPPT_BATCH, FronmodConfig.STORAGE_BATCH]
+        ranges = planner.plan(batches)
+
+        meter_gaps = itertools.count()
+        model.get_max_gap = lambda unit_id: next(meter_gaps) if unit_id == 240 else 10  # learning model
+        for _ in range(MobuPlanner.MAX_PLANS * 2):
+            planner.plan(batches)
+            planner.plan([FronmodConfig.METER_BATCH])
+
+        self.assertEqual(MobuPlanner.MAX_PLANS, len(planner._plans))
+        self.assertIs(ranges, planner.plan(batches))  # recently used
+
+    def test_reader_observes(self):
+        config = {**MockFronmodReader.DUMMY_CONFIG, FronmodConfKey.READ_COST_AUTO: True}
+        reader = FronmodReader(config)
+
+        def read_holding_registers(pos, length, unit):
+            return SimpleNamespace(registers=[0] * length, isError=lambda: False)
+
+        reader._client = SimpleNamespace(read_holding_registers=read_holding_registers, is_socket_open=lambda: True)
+        for _ in range(MobuLatencyModel.MIN_SAMPLES):
+            reader.read(FronmodConfig.METER_BATCH)
+
+        request_cost, register_cost = reader._latency_model.get_costs(FronmodConfig.METER_BATCH.unit_id)
+        self.assertLess(request_cost, FronmodReader.DEFAULT_READ_COST_REQUEST)
+
+
+class TestFronmodReaderPrefetch(unittest.TestCase):
+
+    STORAGE_REGISTERS = [
+        124, 24, 3328, 100, 100, 0, 65535, 0, 2400, 65535, 65535, 3, 10000, 10000, 65535, 65535, 65535, 1, 0, 0,
+        32768, 65534, 65534, 65534, 65534, 65534
+    ]
+
+    def test_prefetch_processed_unchanged(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        reader.set_mock_read(FronmodConfig.STORAGE_BATCH, self.STORAGE_REGISTERS)
+        reader.set_mock_registers(1, FronmodConfig.MPPT_START + len(MPPT_REGISTERS), [0, 0])  # gap
+
+        processor = FronmodProcessor(reader)
+        reader.prefetch([FronmodConfig.MPPT_BATCH, FronmodConfig.STORAGE_BATCH])
+        processor.process_mppt_model()
+        processor.process_storage_model()
+
+        self.assertEqual([(1, FronmodConfig.MPPT_START, 76)], reader.remote_reads)
+
+        send_slow = processor.get_send_data(MobuFlag.Q_SLOW)
+        self.assertEqual(24.0, send_slow[FronmodItem.BAT_FILL_LEVEL])
+        send_medium = processor.get_send_data(MobuFlag.Q_MEDIUM)
+        self.assertEqual(4, send_medium[FronmodItem.MPPT_BAT_STATE_CODE])
+
+        # prefetched registers are used once
+        processor.process_mppt_model()
+        self.assertEqual(2, len(reader.remote_reads))
+
+    def test_prefetch_single_batch_is_read_on_demand(self):
+        reader = MockFronmodReader()
+        reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+
+        reader.prefetch([FronmodConfig.MPPT_BATCH])
+        self.assertEqual([], reader.remote_reads)
+        reader.read(FronmodConfig.MPPT_BATCH)
+        self.assertEqual([(1, FronmodConfig.MPPT_START, 48)], reader.remote_reads)
+
+
+class TestFronmodReaderSparse(unittest.TestCase):
+
+    CONFIG = {
+        **MockFronmodReader.DUMMY_CONFIG,
+        FronmodConfKey.SPARSE_READS: True,
+        FronmodConfKey.READ_COST_REQUEST: 10,
+        FronmodConfKey.READ_COST_REGISTER: 1,
+    }
+
+    def process_mppt(self, reader):
+        reader.set_mock_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+        reader.set_mock_registers(1, FronmodConfig.INVERTER_START, INVERTER_SUN_REGISTERS)
+
+        processor = FronmodProcessor(reader)
+        processor.process_inverter_model()
+        processor.process_mppt_model()
+        return processor.get_send_data(MobuFlag.Q_QUICK), processor.get_send_data(MobuFlag.Q_MEDIUM)
+
+    def test_sparse_equals_full_read(self):
+        reader_full = MockFronmodReader()
+        reader_sparse = MockFronmodReader(self.CONFIG)
+
+        self.assertEqual(self.process_mppt(reader_full), self.process_mppt(reader_sparse))
+
+        self.assertEqual(2, len(reader_full.remote_reads))
+        self.assertEqual([(1, FronmodConfig.MPPT_START + 3, 2), (1, FronmodConfig.MPPT_START + 20, 8),
+                          (1, FronmodConfig.MPPT_START + 41, 7)], reader_sparse.remote_reads[-3:])
+
+        stats = reader_sparse.pop_read_stats()
+        self.assertEqual(2 + 8 + 7 + 28, stats.registers)  # inverter: offsets 21..48
+        self.assertEqual(0, reader_sparse.pop_read_stats().requests)
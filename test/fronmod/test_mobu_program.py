@@ -0,0 +1,64 @@
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig
+from src.fronmod.fronmod_exception import FronmodException
+from src.fronmod.mobu import MobuBatch, MobuFlag, MobuItem
+from src.fronmod.mobu_program import MobuFormula, MobuProgram, MobuSlots
+
+
+BATCH_A = MobuBatch(1, "a", 100, 4, [
+    MobuItem(1, MobuFlag.INT16, "a1"),
+    MobuItem(2, MobuFlag.INT16, "a2"),
+    MobuItem(None, MobuFlag.Q_QUICK, "sum"),
+])
+
+BATCH_B = MobuBatch(1, "b", 200, 2, [
+    MobuItem(1, MobuFlag.INT16, "b1"),
+    MobuItem(None, MobuFlag.Q_QUICK, "sum"),
+    MobuItem(None, MobuFlag.Q_QUICK, "ratio"),
+])
+
+
+class TestMobuProgram(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = []
+
+    def on_error(self, name, ex):
+        self.errors.append((name, type(ex)))
+
+    def test_run(self):
+        slots = MobuSlots([BATCH_A, BATCH_B])
+        program_a = MobuProgram(slots, BATCH_A, [MobuFormula("sum", lambda x, y: x + y, ["a1", "a2"])])
+        program_b = MobuProgram(slots, BATCH_B, [
+            MobuFormula("sum", lambda x, y: x + y, ["a1", "b1"]),  # "a1" of batch "a"
+            MobuFormula("ratio", lambda x, y: x / y, ["sum", "a2"]),  # own "sum"
+        ])
+
+        program_a.run(slots.values, [1, 2, None], self.on_error)
+        self.assertEqual([1, 2, 3], slots.values[0:3])
+
+        program_b.run(slots.values, [5, None, None], self.on_error)
+        self.assertEqual([5, 6, 3.0], slots.values[3:6])
+
+        program_a.run(slots.values, [1, 0, None], self.on_error)
+        program_b.run(slots.values, [5, None, None], self.on_error)
+        self.assertEqual([5, 6, None], slots.values[3:6])
+        self.assertEqual([("ratio", ZeroDivisionError)], self.errors)
+
+    def test_wrong_configuration(self):
+        slots = MobuSlots([BATCH_A, BATCH_B])
+        with self.assertRaises(FronmodException):
+            MobuProgram(slots, BATCH_A, [MobuFormula("a1", abs, ["a2"])])  # read item
+        with self.assertRaises(FronmodException):
+            MobuProgram(slots, BATCH_A, [MobuFormula("sum", abs, ["unknown"])])
+        with self.assertRaises(FronmodException):
+            MobuProgram(slots, BATCH_A, [MobuFormula("sum", abs, ["ratio"])])  # derived by another batch
+
+    def test_config(self):
+        slots = MobuSlots(FronmodConfig.get_batches())
+        formulas = FronmodConfig.get_formulas()
+        for batch in FronmodConfig.get_batches():
+            program = MobuProgram(slots, batch, formulas[batch.name])
+            derived = [item.name for item in batch.items if item.offset is None]
+            self.assertEqual(sorted(derived), sorted(program.targets))
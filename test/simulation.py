@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import selectors
+import struct
+from typing import Callable, Dict, List, Optional
+
+from src.fronmod.fronmod_config import FronmodConfig
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.fronmod.mobu import MobuBatch, MobuFlag
+from src.runner import Runner
+from src.runner_config import RunnerConfKey
+from src.utils.clock import VirtualClock
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+
+
+class VirtualSelector(selectors.SelectSelector):
+    """
+    Instead of blocking, the selector moves the virtual clock to the next timer. There is no I/O within a simulation
+    (the self-pipe of the loop is never polled), so nothing is ever ready.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("simulation is stuck - nothing scheduled!")
+        if timeout > 0:
+            self._clock.advance(timeout)
+        return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop running on virtual time; only usable without threads (no executors)."""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__(VirtualSelector(clock))
+        self._virtual_clock = clock
+
+    def time(self) -> float:
+        return self._virtual_clock.monotonic()
+
+
+class SimFronmodReader(MockFronmodReader):
+    """
+    Serves scripted registers, which are a function of the simulated time (seconds since start). Each remote request
+    takes `read_seconds` (virtual time); reads are serialized like the reads of the single Modbus worker thread.
+    """
+
+    def __init__(self, clock: VirtualClock, config=None):
+        super().__init__(config, clock=clock)
+        self.read_seconds = 0.0
+        self._scripts = {}  # type: Dict[MobuBatch, Callable[[float], List[int]]]
+        self._script_registers = {}  # type: Dict[MobuBatch, List[int]]
+        self._read_lock = None  # type: Optional[asyncio.Lock]
+
+    def set_script(self, batch: MobuBatch, script: Callable[[float], List[int]]):
+        self._scripts[batch] = script
+
+    @classmethod
+    def encode(cls, batch: MobuBatch, registers: List[int], values: Dict[str, float]) -> List[int]:
+        """:return: copy of registers with the given (raw) item values"""
+        registers = list(registers)
+        items = {item.name: item for item in batch.items}
+        for name, value in values.items():
+            item = items[name]
+            if item.flags & MobuFlag.FLOAT32:
+                registers[item.offset:item.offset + 2] = struct.unpack(">2H", struct.pack(">f", value))
+            elif item.flags & MobuFlag.INT16:
+                registers[item.offset] = value & 0xffff
+            else:
+                registers[item.offset] = value
+        return registers
+
+    def _read_remote_registers(self, read):
+        now = self._clock.monotonic()
+        for batch, script in self._scripts.items():
+            registers = script(now)
+            if registers != self._script_registers.get(batch):
+                self._script_registers[batch] = registers
+                self.set_mock_registers(batch.unit_id, batch.pos, registers)
+
+        return super()._read_remote_registers(read)
+
+    async def _run_in_executor(self, func, *args):
+        if not self.read_seconds:
+            return func(*args)  # instant reads: nothing to serialize
+        if self._read_lock is None:
+            self._read_lock = asyncio.Lock()
+        async with self._read_lock:
+            remote_reads = len(self.remote_reads)
+            result = func(*args)
+            await asyncio.sleep(self.read_seconds * (len(self.remote_reads) - remote_reads))
+            return result
+
+
+class RecordingMqttClient:
+    """Fake `MqttClient`, records the published messages with their (virtual) time."""
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self.published = []  # (monotonic seconds, topic, payload)
+        self.encoders = {}
+
+    def set_last_will(self, topic, last_will):
+        pass
+
+    def set_state_event(self, loop, event):
+        loop.call_soon(event.set)  # connected
+
+    def set_encoder(self, topic, encoder):
+        self.encoders[topic] = encoder
+
+    def connect(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def ensure_connection(self):
+        pass
+
+    def publish(self, topic, payload, retain=None):
+        self.published.append((self._clock.monotonic(), topic, payload))
+
+    def get_payloads(self, topic) -> List[dict]:
+        return [payload for _, t, payload in self.published if t == topic]
+
+
+class Simulation:
+    """Runs the `Runner` with processor, (scripted) reader and MQTT client on virtual time."""
+
+    TOPIC_QUICK = "quick"
+    TOPIC_MEDIUM = "medium"
+    TOPIC_SLOW = "slow"
+
+    START = datetime.datetime(2021, 6, 21, tzinfo=datetime.timezone.utc)
+
+    def __init__(self, runner_config: Optional[dict] = None, fronmod_config: Optional[dict] = None):
+        self.clock = VirtualClock(self.START)
+        self.loop = VirtualEventLoop(self.clock)
+        asyncio.set_event_loop(self.loop)
+
+        self.reader = SimFronmodReader(self.clock, fronmod_config)
+        self.processor = FronmodProcessor(self.reader, clock=self.clock)
+        self.mqtt_client = RecordingMqttClient(self.clock)
+
+        config = {
+            RunnerConfKey.TOPIC_QUICK: self.TOPIC_QUICK,
+            RunnerConfKey.TOPIC_MEDIUM: self.TOPIC_MEDIUM,
+            RunnerConfKey.TOPIC_SLOW: self.TOPIC_SLOW,
+        }
+        config.update(runner_config or {})
+        self.runner = Runner(config, self.mqtt_client, self.processor, clock=self.clock)
+
+        # zero registers (incl. gaps between batches, which may be read by coalesced requests)
+        for unit_id in set(batch.unit_id for batch in FronmodConfig.get_batches()):
+            batches = [batch for batch in FronmodConfig.get_batches() if batch.unit_id == unit_id]
+            pos = min(batch.pos for batch in batches)
+            end = max(batch.pos + batch.length for batch in batches)
+            self.reader.set_mock_registers(unit_id, pos, [0] * (end - pos))
+
+    def run(self, seconds: float):
+        """Runs the service for the simulated time (single use)."""
+        self.loop.call_at(self.loop.time() + seconds, self.runner.shutdown)
+        self.runner.run()
+
+    def close(self):
+        self.processor.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfKey, FronmodDelivery, FronmodItem
+from src.fronmod.mobu_capture import MobuCaptureReader
+from src.runner_config import RunnerConfKey
+
+try:
+    import numpy as np
+    from src.backfill import Backfill
+except ImportError:  # optional dependency
+    np = None
+
+from src.replay import Replay
+from test.test_replay import record_simulation
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "registers.cap")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_continuity(self):
+        """Backfilled file by file (in parallel), the results equal a replay of all files in one go."""
+        runner_config = {
+            RunnerConfKey.TOPIC_QUICK: FronmodDelivery.QUICK.value,
+            RunnerConfKey.TOPIC_MEDIUM: FronmodDelivery.MEDIUM.value,
+            RunnerConfKey.TOPIC_SLOW: FronmodDelivery.SLOW.value,
+        }
+        record_simulation(6 * 3600, runner_config, {FronmodConfKey.CAPTURE_FILE: self.path, FronmodConfKey.CAPTURE_MAX_BYTES: 50000})
+
+        paths = MobuCaptureReader.get_rotated_paths(self.path)
+        self.assertGreater(len(paths), 4)
+        with open(os.path.join(self.temp_dir.name, "readme.txt"), "w") as file:
+            file.write("no capture")
+
+        backfill = Backfill(Backfill.find_paths(self.temp_dir.name), workers=2)
+        self.assertEqual(paths, backfill.paths)  # by time, without other files
+        columns = backfill.run()
+
+        rows = {delivery.value: [] for delivery in FronmodDelivery}
+        Replay(paths, runner_config, output=lambda topic, values: rows[topic].append(values), flush=True, serialize=False).run()
+        expected = {}
+        for delivery_name, delivery_rows in rows.items():
+            expected.update(Backfill.get_columns(delivery_name, delivery_rows))
+
+        # quick values are the same
+        self.assertIn(f"quick.{FronmodItem.MPPT_BAT_POWER}", columns)  # depends on static (cached) scale factors
+        for name in [name for name in expected if name.startswith("quick.")]:
+            np.testing.assert_array_equal(expected[name], columns[name])
+        self.assertEqual(6 * 360, len(columns["quick.time"]))
+
+        # energy flows are continuous (other publishing windows at file boundaries)
+        for name in [FronmodItem.EFLOW_INV_AC_OUT, FronmodItem.EFLOW_INV_DC_OUT, FronmodItem.EFLOW_MOD_OUT]:
+            energy = np.nansum(columns[f"medium.{name}"])
+            self.assertGreater(energy, 0)
+            self.assertAlmostEqual(np.nansum(expected[f"medium.{name}"]), energy, delta=energy * 1e-9)
+
+        self.assertEqual(np.str_, columns[f"medium.{FronmodItem.INV_STATE_TEXT}"].dtype.type)
+
+        output_path = os.path.join(self.temp_dir.name, "backfill.npz")
+        Backfill.save(columns, output_path)
+        with np.load(output_path) as loaded:
+            np.testing.assert_array_equal(columns["medium.time"], loaded["medium.time"])
@@ -0,0 +1,123 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodConfKey
+from src.fronmod.fronmod_replay_reader import FronmodReplayReader
+from src.fronmod.mobu_capture import MobuCaptureReader, MobuCaptureRecord, MobuCaptureWriter
+from src.fronmod.mobu_planner import MobuRange
+from src.replay import Replay
+from src.runner_config import RunnerConfKey
+from src.utils.clock import VirtualClock
+from src.utils.json_utils import JsonUtils
+from test.benchmark import benchmark
+from test.fronmod.test_fronmod_processor import METER_REGISTERS, MPPT_REGISTERS, STORAGE_REGISTERS
+from test.simulation import Simulation
+from test.test_simulation import inverter_script
+
+
+RPI_SLOWDOWN = 10.0  # single-threaded CPython: Raspberry Pi 3 (Cortex-A53, 1.2 GHz) vs. a x86 desktop core
+RPI_TICK_BUDGET = 0.05  # seconds CPU per tick on the target, 0.5% of the quick cycle
+
+
+class TestFronmodReplayReader(unittest.TestCase):
+
+    def test_image(self):
+        reader = FronmodReplayReader()
+        reader.apply(MobuCaptureRecord(0, 1, 100, b"\x00\x01\x00\x02"))
+        reader.apply(MobuCaptureRecord(0, 1, 101, b"\x00\x03"))
+
+        ranges = [MobuRange(1, 99, 4, []), MobuRange(240, 100, 1, [])]
+        self.assertEqual([b"\x00\x00\x00\x01\x00\x03\x00\x00", b"\x00\x00"], reader._read_remote_ranges(ranges))
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "registers.cap")
+        self.messages = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_message(self, topic, payload):
+        self.messages.append((topic, payload))
+
+    def test_rederive_simulation(self):
+        """A replay of the captured registers publishes exactly the messages of the simulated service."""
+        runner_config = {
+            RunnerConfKey.TOPIC_QUICK: Simulation.TOPIC_QUICK,
+            RunnerConfKey.TOPIC_MEDIUM: Simulation.TOPIC_MEDIUM,
+            RunnerConfKey.TOPIC_SLOW: Simulation.TOPIC_SLOW,
+        }
+        fronmod_config = {FronmodConfKey.CAPTURE_FILE: self.path, FronmodConfKey.CAPTURE_MAX_BYTES: 100000}
+
+        sim = record_simulation(6 * 3600, runner_config, fronmod_config)  # morning: rising power
+        expected = [(topic, JsonUtils.dumps(payload)) for _, topic, payload in sim.mqtt_client.published]
+
+        paths = MobuCaptureReader.get_rotated_paths(self.path)
+        self.assertGreater(len(paths), 1)
+        stats = Replay(paths, runner_config, output=self.add_message, tz=datetime.timezone.utc).run()
+
+        self.assertEqual(6 * 360, stats.ticks)
+        self.assertEqual(len(expected), stats.messages)
+        self.assertEqual(expected, self.messages)
+        self.assertGreater(stats.ticks_per_second, 0)
+
+    def test_speed(self):
+        clock = VirtualClock()
+        writer = MobuCaptureWriter(self.path, clock=clock)
+        for seconds in [0.0, 0.5, 10.0, 20.0]:  # 3 ticks
+            write_inverter(writer, seconds)
+        writer.close()
+
+        replay = Replay([self.path], speed=100)
+        time_start = time.monotonic()
+        stats = replay.run()
+        self.assertGreaterEqual(time.monotonic() - time_start, 0.2)
+        self.assertEqual(3, stats.ticks)
+        self.assertEqual(20.0, stats.replayed_seconds)
+
+        stats = Replay([self.path], tick_gap=0.1).run()
+        self.assertEqual(4, stats.ticks)
+
+    @benchmark
+    def test_benchmark_tick(self):
+        """CPU time per tick (read, evaluate, publish), projected to a Raspberry Pi class target."""
+        fronmod_config = {FronmodConfKey.CAPTURE_FILE: self.path, FronmodConfKey.CAPTURE_MAX_BYTES: 1000000}
+        record_simulation(3600, {}, fronmod_config)
+        paths = MobuCaptureReader.get_rotated_paths(self.path)
+
+        seconds_per_tick = None
+        for _ in range(3):  # best of
+            time_start = time.process_time()
+            stats = Replay(paths, output=lambda topic, payload: None).run()
+            seconds = (time.process_time() - time_start) / stats.ticks
+            seconds_per_tick = seconds if seconds_per_tick is None else min(seconds_per_tick, seconds)
+
+        target_seconds = seconds_per_tick * RPI_SLOWDOWN
+        self.assertLess(target_seconds, RPI_TICK_BUDGET, "tick: {:.0f}us CPU; Raspberry Pi profile: {:.1f}ms".format(
+            seconds_per_tick * 1e6, target_seconds * 1e3))
+
+
+def record_simulation(seconds: float, runner_config: dict, fronmod_config: dict) -> Simulation:
+    """:return: simulation, which has run and recorded the register captures (see `fronmod_config`)"""
+    fronmod_config = {**FronmodReplayReader.REPLAY_CONFIG, FronmodConfKey.CAPTURE_BACKUPS: 100, **fronmod_config}
+    sim = Simulation(runner_config, fronmod_config)
+    try:
+        sim.reader.set_script(FronmodConfig.INVERTER_BATCH, inverter_script)
+        sim.reader.set_mock_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+        sim.reader.set_mock_registers(1, FronmodConfig.STORAGE_START, STORAGE_REGISTERS)
+        sim.reader.set_mock_registers(240, FronmodConfig.METER_START, METER_REGISTERS)
+        sim.run(seconds)
+    finally:
+        sim.close()
+    return sim
+
+
+def write_inverter(writer: MobuCaptureWriter, seconds: float):
+    batch = FronmodConfig.INVERTER_BATCH
+    writer.write(round(seconds * 1e9), batch.unit_id, batch.pos, bytes(batch.length * 2))
@@ -1,6 +1,19 @@
+import asyncio
+import copy
+import threading
+import timeit
 import unittest
 
+from src.fronmod.fronmod_config import FronmodConfig, FronmodItem
+from src.fronmod.fronmod_processor import FronmodProcessor
+from src.mqtt_client import MqttException
 from src.runner import Runner
+from src.runner_config import RunnerConfKey
+from src.utils.json_utils import JsonKeyEncoder
+from src.utils.payload_encoder import CborKeyEncoder, MsgpackKeyEncoder
+from test.benchmark import benchmark
+from test.fronmod.mock_fronmod_reader import MockFronmodReader
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, METER_REGISTERS, MPPT_REGISTERS, STORAGE_REGISTERS
 
 
 class TestRunner(unittest.TestCase):
@@ -19,3 +32,223 @@ class TestRunner(unittest.TestCase):
 
         values_out = Runner.round_floats(values_in)
         self.assertEqual(values_out, values_exp)
+
+
+class FakeMqttClient:
+
+    def __init__(self):
+        self.published = []
+        self.connected = True
+        self.ensure_connection_calls = 0
+        self._state_loop = None
+        self._state_event = None
+        self.encoders = {}
+
+    def connect(self):
+        pass
+
+    def is_connected(self):
+        return self.connected
+
+    def set_state_event(self, loop, event):
+        self._state_loop = loop
+        self._state_event = event
+
+    def set_encoder(self, topic, encoder):
+        self.encoders[topic] = encoder
+
+    def ensure_connection(self):
+        self.ensure_connection_calls += 1
+        if not self.connected:
+            raise MqttException("MQTT is not connected!")
+
+    def disconnect_from_thread(self):
+        """like the paho network thread"""
+        def disconnect():
+            self.connected = False
+            self._state_loop.call_soon_threadsafe(self._state_event.set)
+        threading.Thread(target=disconnect).start()
+
+    def publish(self, topic, payload, retain=None):
+        self.published.append((topic, payload))
+
+
+class RunnerTestCase(unittest.TestCase):
+
+    CONFIG = {
+        RunnerConfKey.TOPIC_QUICK: "quick",
+        RunnerConfKey.TOPIC_MEDIUM: "medium",
+        RunnerConfKey.TOPIC_SLOW: "slow",
+    }
+
+    def setUp(self):
+        self.mock_reader = MockFronmodReader()
+        self.mock_reader.set_mock_read(FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS)
+        self.mock_reader.set_mock_read(FronmodConfig.MPPT_BATCH, MPPT_REGISTERS)
+        self.mock_reader.set_mock_read(FronmodConfig.STORAGE_BATCH, STORAGE_REGISTERS)
+        self.mock_reader.set_mock_read(FronmodConfig.METER_BATCH, METER_REGISTERS)
+
+        self.processor = FronmodProcessor(self.mock_reader)
+        self.processor.open()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.runner = Runner(self.CONFIG, FakeMqttClient(), self.processor)
+
+    def tearDown(self):
+        self.processor.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+
+class TestRunnerCycle(RunnerTestCase):
+
+    def run_cycle(self, now):
+        jobs = self.runner._scheduler.start_cycle(now)
+        return self.loop.run_until_complete(self.runner._process_cycle(jobs))
+
+    def test_cycles(self):
+        now = self.loop.time()
+        results = self.run_cycle(now)
+        self.assertEqual(["quick", "medium", "slow"], [result.topic for result in results])
+        self.assertIn(FronmodItem.SELF_CONSUMPTION, results[0].values)
+        self.assertIn(FronmodItem.MPPT_BAT_POWER, results[0].values)
+        self.assertIn(FronmodItem.INV_STATE_TEXT, results[1].values)
+        self.assertIn(FronmodItem.BAT_FILL_LEVEL, results[2].values)
+
+        self.mock_reader.remote_reads.clear()
+        results = self.run_cycle(now + Runner.DEFAULT_DELIVERY_TIME_QUICK + 1)
+        self.assertEqual(["quick"], [result.topic for result in results])
+        read_units = set(unit_id for unit_id, _, _ in self.mock_reader.remote_reads)
+        self.assertEqual({1, 240}, read_units)
+        self.assertNotIn((1, FronmodConfig.STORAGE_START, FronmodConfig.STORAGE_BATCH.length), self.mock_reader.remote_reads)
+
+    def test_publish_result(self):
+        results = self.run_cycle(self.loop.time())
+        self.runner._publish_result(results[0])
+
+        topic, payload = self.runner._mqtt_client.published[0]
+        self.assertEqual("quick", topic)
+        self.assertEqual("ok", payload[Runner.JSON_STATUS])
+
+    def test_encoders(self):
+        config = dict(self.CONFIG)
+        config.update({RunnerConfKey.FORMAT_QUICK: Runner.FORMAT_CBOR, RunnerConfKey.FORMAT_MEDIUM: Runner.FORMAT_MSGPACK})
+        self.runner = Runner(config, FakeMqttClient(), self.processor)
+        encoders = self.runner._mqtt_client.encoders
+        self.assertEqual(
+            [CborKeyEncoder, MsgpackKeyEncoder, JsonKeyEncoder], [type(encoders[topic]) for topic in ["quick", "medium", "slow"]]
+        )
+
+        for result in self.run_cycle(self.loop.time()):  # known key sets (no fallback)
+            keys = set(key for key, _ in encoders[result.topic]._fragments)
+            self.assertLessEqual(set(result.values), keys)
+
+    def test_last_will_encoded(self):
+        config = dict(self.CONFIG)
+        config.update({RunnerConfKey.FORMAT_QUICK: Runner.FORMAT_MSGPACK, RunnerConfKey.MESSAGE_LAST_WILL: '{"status": "offline"}'})
+        self.runner = Runner(config, FakeMqttClient(), self.processor)
+        mqtt_client = self.runner._mqtt_client
+        self.runner.close()
+
+        self.assertEqual([
+            ("quick", b"\x81\xa6status\xa7offline"),
+            ("medium", '{"status": "offline"}'),
+            ("slow", '{"status": "offline"}'),
+        ], mqtt_client.published)
+
+    def test_build_payload(self):
+        self.runner._hide_items = {"hidden"}
+        payload = self.runner._build_payload(iter([("f", 1.1234567890123456), ("hidden", 1), ("t", "text")]))
+        self.assertEqual({"f", "t", Runner.JSON_TIMESTAMP, Runner.JSON_STATUS}, set(payload))
+        self.assertEqual(1.1234568, payload["f"])
+
+        self.assertIsNone(self.runner._build_payload(iter([])))
+        self.assertEqual({Runner.JSON_TIMESTAMP, Runner.JSON_STATUS}, set(self.runner._build_payload(iter([("hidden", 1)]))))
+
+    def test_build_payload_hide_timestamp(self):
+        self.runner._hide_items = {Runner.JSON_TIMESTAMP}
+        payload = self.runner._build_payload(iter([("f", 1.0), (Runner.JSON_TIMESTAMP, "2021-06-21T12:00:00+00:00")]))
+        self.assertEqual({"f": 1.0, Runner.JSON_STATUS: "ok"}, payload)
+
+        self.runner._hide_items = {Runner.JSON_STATUS}
+        self.assertEqual({"f", Runner.JSON_TIMESTAMP}, set(self.runner._build_payload(iter([("f", 1.0)]))))
+
+    def get_former_publish(self):
+        """:return: queue of a cycle, former payload assembly (queue copy, deepcopy of round_floats)"""
+        results = self.run_cycle(self.loop.time())
+        queue = {
+            key: value for result in results for key, value in result.values.items()
+            if key not in (Runner.JSON_TIMESTAMP, Runner.JSON_STATUS)
+        }
+        now = self.runner._clock.now(True).isoformat()
+
+        def publish_former():
+            values = {}
+            for key, value in queue.items():
+                values[key] = value
+            values = copy.deepcopy(values)
+            for key, value in values.items():
+                if isinstance(value, float):
+                    values[key] = round(value, Runner.ROUND_FLOAT)
+            if not values.get(Runner.JSON_TIMESTAMP):
+                values[Runner.JSON_TIMESTAMP] = now
+            if not values.get(Runner.JSON_STATUS):
+                values[Runner.JSON_STATUS] = "ok"
+            for hide_item in self.runner._hide_items:
+                values.pop(hide_item, None)
+            return values
+
+        return queue, publish_former
+
+    def test_build_payload_like_former(self):
+        queue, publish_former = self.get_former_publish()
+        self.assertEqual(
+            {key: value for key, value in publish_former().items() if key != Runner.JSON_TIMESTAMP},
+            {key: value for key, value in self.runner._build_payload(iter(queue.items())).items() if key != Runner.JSON_TIMESTAMP},
+        )
+
+    @benchmark
+    def test_benchmark_payload(self):
+        """single pass payload builder vs. the former copies"""
+        queue, publish_former = self.get_former_publish()
+
+        number = 2000
+        time_former = timeit.timeit(publish_former, number=number)
+        time_builder = timeit.timeit(lambda: self.runner._build_payload(iter(queue.items())), number=number)
+        self.assertLess(time_builder, time_former, "publish ({} items): former={:.1f}us; builder={:.1f}us".format(
+            len(queue), time_former / number * 1e6, time_builder / number * 1e6))
+
+
+class TestRunnerPeriodic(RunnerTestCase):
+
+    CONFIG = dict(RunnerTestCase.CONFIG, **{
+        RunnerConfKey.DELIVERY_TIME_QUICK: 0.2,
+    })
+
+    def run_periodic(self, seconds, on_started=None):
+        async def run():
+            self.runner._init_mqtt_client()
+            task = asyncio.ensure_future(self.runner._periodic())
+            await asyncio.sleep(0.01)
+            if on_started:
+                on_started()
+            done, _ = await asyncio.wait([task], timeout=seconds)
+            task.cancel()
+            return task.result() if done else None
+
+        return self.loop.run_until_complete(run())
+
+    def test_sleeps_until_deadline(self):
+        self.run_periodic(0.5)
+
+        topics = [topic for topic, _ in self.runner._mqtt_client.published]
+        self.assertEqual(3, topics.count("quick"))  # at 0, 0.2s and 0.4s
+        self.assertEqual(1, topics.count("slow"))
+        # one wakeup per deadline and one per cycle result (instead of polling every 0.1s)
+        self.assertLessEqual(self.runner._mqtt_client.ensure_connection_calls, 7)
+
+    def test_wakeup_on_mqtt_state_change(self):
+        self.runner._quick_delivery.period = 60
+
+        with self.assertRaises(MqttException):
+            self.run_periodic(2, on_started=self.runner._mqtt_client.disconnect_from_thread)
@@ -0,0 +1,71 @@
+import unittest
+
+from src.runner_changes import RunnerChangeFilter, RunnerDelta
+
+
+class TestRunnerChangeFilter(unittest.TestCase):
+
+    def create_filter(self, keyframe_cycles=3, deadbands=None):
+        return RunnerChangeFilter(keyframe_cycles, deadbands, always_keys=["energy"], meta_keys=["timestamp"])
+
+    def test_changes(self):
+        change_filter = self.create_filter()
+        payload = {"a": 1.0, "b": "text", "c": True, "timestamp": "t0"}
+        self.assertEqual(payload, change_filter.filter(payload))  # keyframe
+
+        self.assertIsNone(change_filter.filter({"a": 1.0, "b": "text", "c": True, "timestamp": "t1"}))
+        self.assertEqual({"c": 1, "timestamp": "t2"}, change_filter.filter({"a": 1.0, "c": 1, "timestamp": "t2"}))
+
+        keyframe = {"a": 1.0, "b": "text", "c": 1, "timestamp": "t3"}
+        self.assertEqual(keyframe, change_filter.filter(keyframe))
+        self.assertEqual({"energy": 5, "timestamp": "t4"}, change_filter.filter({"a": 1.0, "energy": 5, "timestamp": "t4"}))
+        self.assertEqual({"energy": 5, "timestamp": "t5"}, change_filter.filter({"a": 1.0, "energy": 5, "timestamp": "t5"}))
+
+        self.assertIsNone(change_filter.filter(None))
+
+    def test_deadbands(self):
+        change_filter = self.create_filter(keyframe_cycles=100, deadbands={"abs": 0.5, "rel": "10%", "text": 1})
+        change_filter.filter({"abs": 10.0, "rel": 100, "text": "a"})
+
+        self.assertIsNone(change_filter.filter({"abs": 10.5, "rel": 110, "text": "a"}))
+        self.assertEqual({"abs": 10.6}, change_filter.filter({"abs": 10.6, "rel": 91}))
+        self.assertIsNone(change_filter.filter({"abs": 10.2}))  # relative to the last published value (10.6)
+        self.assertEqual({"rel": 89, "text": "b"}, change_filter.filter({"rel": 89, "text": "b"}))
+        self.assertEqual({"abs": None}, change_filter.filter({"abs": None}))
+        self.assertEqual({"abs": 10.0}, change_filter.filter({"abs": 10.0}))
+
+        self.assertEqual((0.0, 0.015), RunnerChangeFilter.parse_deadband("1.5%"))
+        with self.assertRaises(ValueError):
+            RunnerChangeFilter.parse_deadband("1.5")
+
+    def test_reset(self):
+        change_filter = self.create_filter()
+        change_filter.filter({"a": 1})
+        self.assertIsNone(change_filter.filter({"a": 1}))
+        change_filter.reset()
+        self.assertEqual({"a": 1}, change_filter.filter({"a": 1}))
+
+
+class TestRunnerDelta(unittest.TestCase):
+
+    def test_deltas(self):
+        delta = RunnerDelta(keyframe_deltas=2, meta_keys=["timestamp"])
+        seq = RunnerDelta.SEQUENCE_KEY
+
+        self.assertEqual(
+            ({"a": 1, "b": "x", "timestamp": "t0", seq: 1}, {"a": 1, "b": "x", "timestamp": "t0", seq: 1}),
+            delta.next({"a": 1, "b": "x", "timestamp": "t0"})
+        )
+        self.assertEqual((None, None), delta.next({"a": 1, "b": "x", "timestamp": "t1"}))
+        self.assertEqual(
+            ({"a": 2.0, "timestamp": "t2", seq: 2}, {"a": 2.0, "b": "x", "timestamp": "t2", seq: 2}),
+            delta.next({"a": 2.0, "timestamp": "t2"})  # keyframe: state as last published
+        )
+        self.assertEqual(({"a": 2, "timestamp": "t3", seq: 3}, None), delta.next({"a": 2, "b": "x", "timestamp": "t3"}))
+
+        delta.reset()
+        self.assertEqual((None, None), delta.next(None))
+        self.assertEqual(
+            ({"b": "y", seq: 4}, {"a": 2, "b": "y", seq: 4}), delta.next({"b": "y"})
+        )
+        self.assertEqual(4, delta.sequence)
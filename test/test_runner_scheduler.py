@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from src.runner_scheduler import RunnerCadence, RunnerJob, RunnerScheduler
+
+
+class TestRunnerScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.quick = RunnerCadence(10)
+        self.slow = RunnerCadence(300)
+
+    def fetch(self, name, delay=0.0, fail=False):
+        async def fetch():
+            self.events.append(f"fetch-start-{name}")
+            await asyncio.sleep(delay)
+            if fail:
+                raise ValueError(name)
+            self.events.append(f"fetch-done-{name}")
+            return name
+        return fetch
+
+    def evaluate(self, name):
+        def evaluate(data):
+            self.events.append(f"evaluate-{name}")
+            return data
+        return evaluate
+
+    def create_scheduler(self, fail_fetch=None):
+        scheduler = RunnerScheduler()
+        scheduler.add_job(RunnerJob("a", self.quick, fetch=self.fetch("a", 0.05, fail_fetch == "a"), evaluate=self.evaluate("a")))
+        scheduler.add_job(RunnerJob("b", self.quick, ["a"], fetch=self.fetch("b"), evaluate=self.evaluate("b")))
+        scheduler.add_job(RunnerJob("c", self.slow, fetch=self.fetch("c", fail=fail_fetch == "c"), evaluate=self.evaluate("c")))
+        scheduler.add_job(RunnerJob("publish", self.quick, ["a", "b"], evaluate=self.evaluate("publish")))
+        return scheduler
+
+    def test_add_job_checks_inputs(self):
+        scheduler = RunnerScheduler()
+        with self.assertRaises(ValueError):
+            scheduler.add_job(RunnerJob("b", self.quick, ["a"]))
+        scheduler.add_job(RunnerJob("a", self.quick))
+        with self.assertRaises(ValueError):
+            scheduler.add_job(RunnerJob("a", self.quick))
+
+    def test_due_jobs(self):
+        scheduler = self.create_scheduler()
+        now = 0.0
+        self.assertEqual(["a", "b", "c", "publish"], [job.name for job in scheduler.start_cycle(now)])
+
+        # only quick due
+        now = now + 11
+        self.assertEqual(["a", "b", "publish"], [job.name for job in scheduler.get_due_jobs(now)])
+
+        # slow input of a quick job is due with it
+        scheduler.add_job(RunnerJob("publish-c", self.quick, ["c"]))
+        self.assertEqual(["a", "b", "c", "publish", "publish-c"], [job.name for job in scheduler.get_due_jobs(now)])
+
+    def test_start_cycle_retriggers(self):
+        scheduler = self.create_scheduler()
+        now = 0.0
+        scheduler.start_cycle(now)
+        self.assertFalse(scheduler.is_due(now))
+        self.assertEqual(now + 10, scheduler.get_next_deadline())
+        self.assertTrue(scheduler.is_due(now + 11))
+
+        scheduler.start_cycle(now + 11)
+        self.assertEqual(now + 21, scheduler.get_next_deadline())
+        scheduler.start_cycle(now + 21)
+        scheduler.start_cycle(now + 31)
+        self.assertEqual(now + 41, scheduler.get_next_deadline())
+
+    def test_run_fetches_parallel_evaluates_in_order(self):
+        scheduler = self.create_scheduler()
+        jobs = scheduler.start_cycle(0.0)
+        results = asyncio.new_event_loop().run_until_complete(scheduler.run_async(jobs))
+
+        self.assertEqual({"a": "a", "b": "b", "c": "c", "publish": None}, results)
+        # all fetches start at once, "b" is fetched before "a", but evaluated after it
+        self.assertEqual(["fetch-start-a", "fetch-start-b", "fetch-start-c"], self.events[:3])
+        self.assertLess(self.events.index("fetch-done-b"), self.events.index("fetch-done-a"))
+        self.assertLess(self.events.index("evaluate-c"), self.events.index("evaluate-a"))
+        self.assertEqual(["evaluate-a", "evaluate-b", "evaluate-publish"], [e for e in self.events if e in (
+            "evaluate-a", "evaluate-b", "evaluate-publish"
+        )])
+
+    def test_run_failure(self):
+        scheduler = self.create_scheduler(fail_fetch="a")
+        jobs = scheduler.start_cycle(0.0)
+        with self.assertRaises(ValueError):
+            asyncio.new_event_loop().run_until_complete(scheduler.run_async(jobs))
+
+        self.assertNotIn("evaluate-b", self.events)
+        self.assertNotIn("evaluate-publish", self.events)
@@ -0,0 +1,173 @@
+import asyncio
+import math
+import timeit
+import unittest
+
+from src.fronmod.fronmod_config import FronmodConfig, FronmodItem
+from src.runner import Runner
+from src.runner_changes import RunnerDelta
+from src.runner_config import RunnerConfKey
+from src.utils.json_utils import JsonUtils
+from test.fronmod.test_fronmod_processor import INVERTER_SUN_REGISTERS, METER_REGISTERS, MPPT_REGISTERS, STORAGE_REGISTERS
+from test.benchmark import benchmark
+from test.simulation import SimFronmodReader, Simulation
+
+
+DAY = 24 * 3600
+PEAK_POWER = 5000.0  # W
+
+
+def inverter_script(seconds: float):
+    """sunny day: sine from 0 to 24h"""
+    power = max(0.0, PEAK_POWER * math.sin(math.pi * (seconds % DAY) / DAY))
+    return SimFronmodReader.encode(FronmodConfig.INVERTER_BATCH, INVERTER_SUN_REGISTERS, {
+        FronmodItem.INV_AC_POWER: power,
+        FronmodItem.INV_DC_POWER: power,
+    })
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = None
+
+    def tearDown(self):
+        if self.sim is not None:
+            self.sim.close()
+
+    def create_simulation(self, runner_config=None):
+        self.sim = Simulation(runner_config)
+        self.sim.reader.set_script(FronmodConfig.INVERTER_BATCH, inverter_script)
+        self.sim.reader.set_mock_registers(1, FronmodConfig.MPPT_START, MPPT_REGISTERS)
+        self.sim.reader.set_mock_registers(1, FronmodConfig.STORAGE_START, STORAGE_REGISTERS)
+        self.sim.reader.set_mock_registers(240, FronmodConfig.METER_START, METER_REGISTERS)
+        return self.sim
+
+    def test_day(self):
+        sim = self.create_simulation()
+        sim.run(DAY)
+
+        mqtt = sim.mqtt_client
+        self.assertEqual(DAY // 10, len(mqtt.get_payloads(Simulation.TOPIC_QUICK)))  # at 0s, 10s, ... 24h - 10s
+        self.assertEqual(DAY // 60, len(mqtt.get_payloads(Simulation.TOPIC_MEDIUM)))
+        self.assertEqual(DAY // 300, len(mqtt.get_payloads(Simulation.TOPIC_SLOW)))
+        self.assertEqual(0, sim.runner._error_count_fetch_too_long)
+
+        # publishing times follow the deliveries exactly
+        quick_times = [t for t, topic, _ in mqtt.published if topic == Simulation.TOPIC_QUICK]
+        self.assertEqual([10.0] * 5, [b - a for a, b in zip(quick_times, quick_times[1:6])])
+
+        # energy: integral of the sine (no power within the last minute, which is not published)
+        energy = sum(payload.get(FronmodItem.EFLOW_INV_AC_OUT, 0) for payload in mqtt.get_payloads(Simulation.TOPIC_MEDIUM))
+        expected = PEAK_POWER * 2 * DAY / math.pi / 3600  # Wh
+        self.assertAlmostEqual(expected, energy, delta=expected * 1e-4)
+
+        # per topic encoders: byte-identical to `JsonUtils.dumps`
+        for _, topic, payload in mqtt.published[:5000]:
+            self.assertEqual(JsonUtils.dumps(payload), mqtt.encoders[topic].dumps(payload))
+
+    @benchmark
+    def test_benchmark_day(self):
+        sim = self.create_simulation()
+        time_used = timeit.timeit(lambda: sim.run(DAY), number=1)
+        # no real-time waits; about 4s, the asyncio overhead of the runner dominates
+        self.assertLess(time_used, 10.0, "simulated day: {:.1f}s".format(time_used))
+
+    def test_changes_only(self):
+        sim = self.create_simulation()
+        sim.run(6 * 3600)
+        full = sim.mqtt_client.published
+        sim.close()
+
+        deadbands = {FronmodItem.INV_AC_POWER: 10.0, FronmodItem.INV_DC_POWER: "1%"}
+        sim = self.create_simulation({RunnerConfKey.CHANGES_ONLY: True, RunnerConfKey.DEADBANDS: deadbands})
+        sim.run(6 * 3600)
+        changes = sim.mqtt_client.published
+
+        # rebuilt state follows the full payloads within the deadbands, keyframes are identical
+        states = {}
+        changes_by_time = {(t, topic): payload for t, topic, payload in changes}
+        for t, topic, payload in full:
+            state = states.setdefault(topic, {})
+            state.update(changes_by_time.get((t, topic), {}))
+            if topic == Simulation.TOPIC_MEDIUM:
+                continue  # energy flows of a period
+            for key, value in payload.items():
+                if key == FronmodItem.INV_AC_POWER:
+                    self.assertAlmostEqual(value, state[key], delta=10.0)
+                elif key == FronmodItem.INV_DC_POWER:
+                    self.assertAlmostEqual(value, state[key], delta=abs(value) * 0.011)
+                elif key not in (Runner.JSON_TIMESTAMP, Runner.JSON_STATUS):
+                    self.assertEqual(value, state[key], key)
+
+        energy = [
+            sum(payload.get(FronmodItem.EFLOW_INV_AC_OUT, 0) for _, _, payload in published) for published in (full, changes)
+        ]
+        self.assertEqual(energy[0], energy[1])
+
+        quick = [(t, payload) for t, topic, payload in full if topic == Simulation.TOPIC_QUICK]
+        for t, payload in quick[::Runner.DEFAULT_KEYFRAME_CYCLES]:
+            self.assertEqual(payload, changes_by_time[(t, Simulation.TOPIC_QUICK)])
+
+        items = [sum(len(payload) for _, _, payload in published) for published in (full, changes)]
+        self.assertLess(items[1], items[0] * 0.7, "changes only: messages={}/{}; items={}/{}".format(
+            len(changes), len(full), items[1], items[0]
+        ))
+
+    def test_delta_quick(self):
+        sim = self.create_simulation()
+        sim.run(3 * 3600)
+        full = sim.mqtt_client.get_payloads(Simulation.TOPIC_QUICK)
+        sim.close()
+
+        sim = self.create_simulation({RunnerConfKey.DELTA_QUICK: True, RunnerConfKey.KEYFRAME_DELTAS: 10})
+        sim.loop.call_at(sim.loop.time() + 3605, sim.runner._sent_failure)  # between cycles
+        sim.run(3 * 3600)
+        mqtt = sim.mqtt_client
+        keyframe_topic = Simulation.TOPIC_QUICK + Runner.TOPIC_SUFFIX_KEYFRAME
+        deltas = [payload for payload in mqtt.get_payloads(Simulation.TOPIC_QUICK) if payload[Runner.JSON_STATUS] == "ok"]
+        keyframes = {payload[RunnerDelta.SEQUENCE_KEY]: payload for payload in mqtt.get_payloads(keyframe_topic)}
+
+        self.assertEqual(list(range(1, len(deltas) + 1)), [delta[RunnerDelta.SEQUENCE_KEY] for delta in deltas])
+        self.assertIn(len(deltas) // 10 * 10, keyframes)
+        self.assertIn(1, keyframes)
+        self.assertEqual(len(deltas) // 10 + 2, len(keyframes))  # every 10 deltas, first one, after the failure
+
+        # deltas rebuild the state exactly, it matches the keyframes and the full payloads
+        state = {}
+        deltas_by_time = {delta[Runner.JSON_TIMESTAMP]: delta for delta in deltas}
+        for payload in full:
+            delta = deltas_by_time.get(payload[Runner.JSON_TIMESTAMP])
+            if delta is None:
+                continue  # unchanged (or failure)
+            state.update(delta)
+            self.assertEqual(payload, {key: value for key, value in state.items() if key != RunnerDelta.SEQUENCE_KEY})
+            if delta[RunnerDelta.SEQUENCE_KEY] in keyframes:
+                self.assertEqual(keyframes[delta[RunnerDelta.SEQUENCE_KEY]], state)
+
+        items = [sum(len(payload) for payload in published) for published in (full, deltas)]
+        self.assertLess(items[1], items[0], "delta quick: messages={}/{}; items={}/{}".format(
+            len(deltas), len(full), items[1], items[0]
+        ))
+
+    def test_overrun(self):
+        sim = self.create_simulation({RunnerConfKey.FETCH_TIMEOUT: 20})
+        sim.reader.read_seconds = 4.0  # 3 reads => 12s per 10s cycle
+
+        sim.run(3600)
+
+        quick_times = [t for t, topic, _ in sim.mqtt_client.published if topic == Simulation.TOPIC_QUICK]
+        self.assertEqual(12.0, quick_times[2] - quick_times[1])
+        self.assertAlmostEqual(3600 / 12, len(quick_times), delta=2)
+        self.assertEqual(len(quick_times), sim.runner._error_count_fetch_too_long)
+
+    def test_timeout(self):
+        sim = self.create_simulation({RunnerConfKey.FETCH_TIMEOUT: 5})
+        sim.reader.read_seconds = 4.0
+
+        with self.assertRaises(asyncio.TimeoutError):
+            sim.run(3600)
+
+        self.assertEqual(5.0, sim.clock.monotonic())
+        for topic in [Simulation.TOPIC_QUICK, Simulation.TOPIC_MEDIUM, Simulation.TOPIC_SLOW]:
+            self.assertEqual(["error"], [payload["status"] for payload in sim.mqtt_client.get_payloads(topic)])
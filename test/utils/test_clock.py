@@ -0,0 +1,36 @@
+import datetime
+import unittest
+
+from src.utils.clock import Clock, VirtualClock
+
+
+class TestClock(unittest.TestCase):
+
+    def test_clock(self):
+        clock = Clock()
+        monotonic = clock.monotonic()
+        self.assertLessEqual(monotonic, clock.monotonic())
+        self.assertIsNotNone(clock.now().tzinfo)
+        self.assertEqual(0, clock.now(no_ms=True).microsecond)
+
+    def test_virtual_clock(self):
+        start = datetime.datetime(2021, 3, 28, 0, 30, tzinfo=datetime.timezone.utc)
+        clock = VirtualClock(start)
+        self.assertEqual(0, clock.monotonic_ns())
+        self.assertEqual(start, clock.now())
+
+        clock.advance(1.5)
+        self.assertEqual(1.5, clock.monotonic())
+        self.assertEqual(start + datetime.timedelta(seconds=1.5), clock.now())
+        self.assertEqual(start + datetime.timedelta(seconds=1), clock.now(no_ms=True))
+
+        clock.set_monotonic(1.0)  # no way back
+        self.assertEqual(1.5, clock.monotonic())
+        with self.assertRaises(ValueError):
+            clock.advance(-1)
+
+    def test_virtual_clock_timezone(self):
+        tz = datetime.timezone(datetime.timedelta(hours=2))
+        clock = VirtualClock(datetime.datetime(2021, 3, 28, 2, 0), tz=tz)
+        self.assertEqual(tz, clock.now().tzinfo)
+        self.assertEqual("2021-03-28T02:00:00+02:00", clock.now().isoformat())
@@ -0,0 +1,88 @@
+import datetime
+import timeit
+import unittest
+
+from src.utils.json_utils import JsonKeyEncoder, JsonUtils
+from test.benchmark import benchmark
+
+
+PAYLOAD = {
+    "ac_power": 2345.1234567,
+    "dc_power": 2412.7654321,
+    "bat_power": -312.5,
+    "bat_fill_state": 87.3,
+    "inv_efficiency": 97.2012345,
+    "self_consumption": 423.0000001,
+    "met_ac_power": -1612.25,
+    "met_ac_freq": 50.01,
+    "mppt_mod_power": 2400.0,
+    "mppt_bat_power": -312.5,
+    "inv_state": "MPPT",
+    "bat_state": "charging",
+    "mppt_mod_state": "mppt",
+    "inv_state_code": 4,
+    "bat_state_code": 3,
+    "inv_temperature": 45,
+    "bat_temperature": 28,
+    "met_ac_energy_in": 1234567,
+    "met_ac_energy_out": 7654321,
+    "timestamp": "2021-06-21T12:00:00+02:00",
+    "status": "ok",
+}
+
+
+def get_changing_payloads():
+    """:return: `PAYLOAD` with changing powers and timestamp"""
+    payloads = []
+    for index in range(10):
+        payload = dict(PAYLOAD)
+        for key in ["ac_power", "dc_power", "met_ac_power", "self_consumption", "inv_efficiency"]:
+            payload[key] += index * 0.1234567
+        payload["timestamp"] = f"2021-06-21T12:00:{index:02d}+02:00"
+        payloads.append(payload)
+    return payloads
+
+
+class TestJsonKeyEncoder(unittest.TestCase):
+
+    def test_identical(self):
+        values = [
+            None, True, False, 0, -1, 2 ** 70, 0.1, -0.0, 1e16, 1.5e-7, 123456.7890123, float("nan"), float("inf"),
+            float("-inf"), "", "ok", 'quote " and \\ backslash', "tab\t\n", "ümlaut €", "\U0001F600",
+        ]
+        encoder = JsonKeyEncoder(["a", "b", "ä", "z\""])
+
+        for value in values:
+            for data in [{"a": value}, {"z\"": value, "a": 1}, {"b": value, "ä": value}, {}]:
+                self.assertEqual(JsonUtils.dumps(data), encoder.dumps(data))
+
+    def test_fallback(self):
+        encoder = JsonKeyEncoder(["a", "b"])
+        time = datetime.datetime(2021, 6, 21, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+        for data in [{"a": 1, "c": 2}, {"a": [1, 2.5]}, {"b": {"c": None}}, {"a": time}, {"a": 1.5, "b": (1, 2)}]:
+            self.assertEqual(JsonUtils.dumps(data), encoder.dumps(data))
+        self.assertEqual(JsonUtils.dumps([1, "a"]), encoder.dumps([1, "a"]))
+        self.assertEqual('"2021-06-21T12:00:00+00:00"', encoder.dumps(time))
+
+    def test_reuse_items(self):
+        encoder = JsonKeyEncoder(["a", "b"])
+        for data in [{"a": 1.0, "b": 0.0}, {"a": 1, "b": -0.0}, {"a": True, "b": 0.0}, {"a": 1.0, "b": 0}, {"a": 1.0}]:
+            self.assertEqual(JsonUtils.dumps(data), encoder.dumps(data))
+
+    def test_changing_payloads(self):
+        encoder = JsonKeyEncoder(PAYLOAD.keys())
+        for payload in get_changing_payloads():
+            self.assertEqual(JsonUtils.dumps(payload), encoder.dumps(payload))
+
+    @benchmark
+    def test_benchmark(self):
+        encoder = JsonKeyEncoder(PAYLOAD.keys())
+        payloads = get_changing_payloads()
+
+        number = 200
+        time_dumps = timeit.timeit(lambda: [JsonUtils.dumps(payload) for payload in payloads], number=number) / 10
+        time_encoder = timeit.timeit(lambda: [encoder.dumps(payload) for payload in payloads], number=number) / 10
+        self.assertLess(time_encoder, time_dumps, "json ({} items): dumps={:.1f}us; encoder={:.1f}us".format(
+            len(PAYLOAD), time_dumps / number * 1e6, time_encoder / number * 1e6
+        ))
@@ -0,0 +1,92 @@
+import timeit
+import unittest
+
+from src.utils.json_utils import JsonKeyEncoder, JsonUtils
+from src.utils.payload_encoder import BinaryKeyEncoder, CborKeyEncoder, MsgpackKeyEncoder
+from test.benchmark import benchmark
+from test.utils.test_json_utils import PAYLOAD, get_changing_payloads
+
+
+TIMESTAMP = "2013-03-21T20:04:00+00:00"  # 1363896240
+
+
+class TestBinaryKeyEncoder(unittest.TestCase):
+
+    def test_abstract(self):
+        class IncompleteEncoder(BinaryKeyEncoder):
+            def encode_str(self, value: str) -> bytes:
+                return value.encode()
+
+        with self.assertRaises(TypeError):
+            IncompleteEncoder(["a"])
+
+
+class TestCborKeyEncoder(unittest.TestCase):
+
+    def test_values(self):
+        encoder = CborKeyEncoder([])
+        vectors = [  # RFC 8949, appendix A (floats: 32 bit if lossless)
+            (0, "00"), (23, "17"), (24, "1818"), (100, "1864"), (1000, "1903e8"), (1000000, "1a000f4240"),
+            (1000000000000, "1b000000e8d4a51000"), (-1, "20"), (-1000, "3903e7"), (1.5, "fa3fc00000"),
+            (1.1, "fb3ff199999999999a"), (100000.0, "fa47c35000"), (float("inf"), "fa7f800000"), (False, "f4"),
+            (True, "f5"), (None, "f6"), ("", "60"), ("a", "6161"), ("ü", "62c3bc"), ([1, [2, 3]], "8201820203"),
+            ({"a": 1, "b": [2, 3]}, "a26161016162820203"),
+        ]
+        for value, expected in vectors:
+            self.assertEqual(expected, encoder.dumps(value).hex(), value)
+
+    def test_payload(self):
+        encoder = CborKeyEncoder(["a", "timestamp"], timestamp_key="timestamp")
+        self.assertEqual("a261610a6974696d657374616d70c11a514b67b0", encoder.dumps({"timestamp": TIMESTAMP, "a": 10}).hex())
+        self.assertEqual("a1617801", encoder.dumps({"x": 1}).hex())  # unknown key
+        self.assertEqual("a16974696d657374616d7063616263", encoder.dumps({"timestamp": "abc"}).hex())
+        self.assertEqual(
+            "a16974696d657374616d70c1fb41d452d9ec200000", encoder.dumps({"timestamp": "2013-03-21T20:04:00.5+00:00"}).hex()
+        )
+
+
+class TestMsgpackKeyEncoder(unittest.TestCase):
+
+    def test_values(self):
+        encoder = MsgpackKeyEncoder([])
+        vectors = [
+            (0, "00"), (127, "7f"), (128, "cc80"), (256, "cd0100"), (65536, "ce00010000"), (2 ** 32, "cf0000000100000000"),
+            (-1, "ff"), (-32, "e0"), (-33, "d0df"), (-129, "d1ff7f"), (-32769, "d2ffff7fff"), (1.5, "ca3fc00000"),
+            (1.1, "cb3ff199999999999a"), (False, "c2"), (True, "c3"), (None, "c0"), ("a", "a161"),
+            ("x" * 32, "d920" + "78" * 32), ([1, 2], "920102"), ({"a": 1}, "81a16101"),
+        ]
+        for value, expected in vectors:
+            self.assertEqual(expected, encoder.dumps(value).hex(), value)
+
+    def test_payload(self):
+        encoder = MsgpackKeyEncoder(["a", "timestamp"], timestamp_key="timestamp")
+        self.assertEqual("82a1610aa974696d657374616d70d6ff514b67b0", encoder.dumps({"timestamp": TIMESTAMP, "a": 10}).hex())
+        self.assertEqual(
+            "81a974696d657374616d70d7ff77359400514b67b0",
+            encoder.dumps({"timestamp": "2013-03-21T20:04:00.5+00:00"}).hex()
+        )
+
+    def test_size(self):
+        payload = get_changing_payloads()[0]
+        size_json = len(JsonKeyEncoder(PAYLOAD.keys()).dumps(payload))
+        for encoder in [CborKeyEncoder(PAYLOAD.keys(), timestamp_key="timestamp"),
+                        MsgpackKeyEncoder(PAYLOAD.keys(), timestamp_key="timestamp")]:
+            self.assertLess(len(encoder.dumps(payload)), size_json * 0.8, encoder.CONTENT_TYPE)
+
+    @benchmark
+    def test_benchmark(self):
+        encoders = [
+            JsonKeyEncoder(PAYLOAD.keys()),
+            CborKeyEncoder(PAYLOAD.keys(), timestamp_key="timestamp"),
+            MsgpackKeyEncoder(PAYLOAD.keys(), timestamp_key="timestamp"),
+        ]
+        payloads = get_changing_payloads()
+
+        number = 200
+        time_dumps = timeit.timeit(lambda: [JsonUtils.dumps(payload) for payload in payloads], number=number) / 10
+        for encoder in encoders:
+            time_encoder = timeit.timeit(lambda: [encoder.dumps(payload) for payload in payloads], number=number) / 10
+            # pure Python: the gain is the size (and decoding)
+            self.assertLess(time_encoder, time_dumps * 1.5, "{} ({} items): dumps={:.1f}us; encoder={:.1f}us".format(
+                encoder.CONTENT_TYPE, len(PAYLOAD), time_dumps / number * 1e6, time_encoder / number * 1e6
+            ))